@@ -0,0 +1,72 @@
+"""Предупреждения о погоде для списка мест из командной строки, без Streamlit.
+
+Места читаются так же, как в batch.py (CSV или JSONL: name, либо lat и lon;
+id по желанию - он и будет ключом места в событиях). Названия геокодируются
+один раз при старте. Дальше раз в --interval секунд прогнозы всех мест
+проверяются движком weather_core/alerts.py, и события дописываются в JSONL.
+
+    python alerts.py places.csv -o alerts.jsonl --interval 600
+    python alerts.py places.jsonl --cycles 1          # один проход, события в stdout
+"""
+import argparse
+import sys
+import time
+
+from batch import read_locations, resolve
+from weather_core.alerts import AlertEngine, FileSink
+from weather_core.api import BATCH_SIZE
+
+
+def load_subscriptions(path, lang="en", errors=sys.stderr):
+    """Места из файла -> [(ключ, (lat, lon))]; ненайденные пропускаются с сообщением"""
+    subscriptions = []
+    for n, row in enumerate(read_locations(path)):
+        try:
+            lat, lon, label = resolve(row, lang)
+        except Exception as e:
+            errors.write(f"row {n}: {e}\n")
+            continue
+        subscriptions.append((row.get("id") or label or str(n), (lat, lon)))
+    return subscriptions
+
+
+def run(engine, subscriptions, sink, interval=600.0, cycles=0, chunk_size=BATCH_SIZE, log=sys.stderr):
+    """Циклы проверки; cycles=0 - пока не прервут"""
+    n = 0
+    while True:
+        started = time.monotonic()
+        events = engine.check(subscriptions, sink, chunk_size=chunk_size)
+        n += 1
+        elapsed = time.monotonic() - started
+        log.write(f"cycle {n}: {len(subscriptions)} locations, {len(events)} events, {elapsed:.2f}s, {engine.stats}\n")
+        log.flush()
+        if cycles and n >= cycles:
+            return n
+        time.sleep(max(0.0, interval - elapsed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check weather alert rules for many locations")
+    parser.add_argument("input", help="CSV or JSONL with name or lat/lon (and optional id)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file to append events to, '-' for stdout")
+    parser.add_argument("--interval", type=float, default=600.0, help="seconds between checks")
+    parser.add_argument("--cycles", type=int, default=0, help="stop after this many checks (0 - run forever)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE, help="locations per upstream request")
+    parser.add_argument("--lang", default="en", help="geocoding language")
+    args = parser.parse_args(argv)
+
+    subscriptions = load_subscriptions(args.input, args.lang)
+    if not subscriptions:
+        sys.exit("no locations to check")
+    sink = FileSink(args.output)
+    try:
+        run(AlertEngine(), subscriptions, sink, args.interval, args.cycles, args.chunk_size)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,52 @@
+import math
+import os
+import time
+
 import requests
-import pandas as pd
-import pytz
-from datetime import datetime
 import streamlit as st
-import pydeck as pdk
+
+# pandas и pydeck импортируются там, где рисуются таблицы и карты: так
+# первая отрисовка не ждёт их загрузки, если до этих секций дело не дошло
+from weather_core import freshness, refresher
+from weather_core.api import fetch_weather, fetch_weather_batch, geocode, get_location_from_ip
+from weather_core.fetcher import FetchGroup, submit
+from weather_core.gazetteer import load_gazetteer
+from weather_core.labels import WEATHER_DESCRIPTIONS_EN, WEATHER_DESCRIPTIONS_RU, WEATHER_EMOJI, deg_to_compass
+from weather_core.metrics import Trace, registry
+from weather_core.ratelimit import RateLimited, background
+from weather_core.refresher import hot_locations
+from weather_core.units import convert_temp, convert_wind
+from weather_core.viewmodel import memo
 
 st.set_page_config(page_title="Weather", page_icon="⛅", layout="centered")
 
+# Сколько мест из выпадающего списка подгружать заранее, пока пользователь выбирает
+PREFETCH_PLACES = int(os.getenv("WEATHER_PREFETCH_PLACES", "3"))
+# Сколько точек истории рисовать: длинный ряд прореживается LTTB (см. transforms.lttb_indices)
+HISTORY_POINTS = int(os.getenv("WEATHER_HISTORY_POINTS", "1000"))
+# Панель с временем этапов в боковой панели: WEATHER_DEBUG_PANEL=1 или ?debug=1 в адресе
+DEBUG_PANEL = os.getenv("WEATHER_DEBUG_PANEL", "0") == "1" or st.query_params.get("debug") == "1"
+
+# Замеры этого прогона скрипта (см. weather_core/metrics.py)
+trace = Trace()
+
 # ----------------------- Определение локации по IP -----------------------
-def get_location_from_ip():
-    """Определяем локацию пользователя по IP. Неточно, но работает как разумный дефолт"""
+def client_ip():
+    """IP посетителя: Streamlit обычно стоит за прокси, который кладёт его в X-Forwarded-For"""
     try:
-        resp = requests.get("https://ipapi.co/json/", timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        return {
-            "city": data.get("city"),
-            "country": data.get("country_name"),
-            "lat": data.get("latitude"),
-            "lon": data.get("longitude"),
-        }
+        headers = st.context.headers
     except Exception:
         return None
+    forwarded = headers.get("X-Forwarded-For") or headers.get("X-Real-Ip")
+    if not forwarded:
+        return None
+    return forwarded.split(",")[0].strip() or None
+
+
+# Фоновое обновление популярных мест и прогрев кэша (один поток на процесс)
+refresher.start(fetch_weather, geocode, poll=freshness.poll)
+# Справочник городов читается один раз на процесс, до первого поиска
+load_gazetteer()
 
 
 # ----------------------- Боковая панель -----------------------
@@ -30,7 +55,22 @@ with st.sidebar:
     lang_label = st.radio("Language / Язык", options=["Русский", "English"], index=0)
     lang = "ru" if lang_label == "Русский" else "en"
 
-auto_loc = get_location_from_ip()
+# Фоновые запросы этой сессии (см. weather_core/fetcher.py)
+fetches = st.session_state.setdefault("fetches", FetchGroup())
+fetches.new_run()
+
+# Если пользователь уже что-то ввёл, геокодинг стартует сразу и идёт
+# параллельно с определением локации по IP
+typed_query = st.session_state.get("city_query")
+if typed_query:
+    fetches.reset((typed_query, lang))
+    fetches.submit(("geocode", typed_query, lang), geocode, typed_query, lang)
+
+# Скрипт перезапускается на каждый клик, а локация за сессию не меняется
+if "auto_loc" not in st.session_state:
+    with trace.span("ip_location"):
+        st.session_state["auto_loc"] = get_location_from_ip(client_ip())
+auto_loc = st.session_state["auto_loc"]
 if auto_loc and auto_loc["city"]:
     default_city = f"{auto_loc['city']}, {auto_loc.get('country', '')}".strip().strip(", ")
 else:
@@ -41,6 +81,7 @@ with st.sidebar:
     city_query = st.text_input(
         "Город или место" if lang == "ru" else "City or place",
         value=default_city,
+        key="city_query",
     )
     if lang == "ru":
         units_label = st.radio(
@@ -57,17 +98,83 @@ with st.sidebar:
             index=0,
         )
 
-    show_hourly = st.toggle(
-        "Показать почасовой прогноз" if lang == "ru" else "Show hourly forecast",
-        value=True,
+    # Переключатели почасового прогноза и истории - в своих секциях (фрагментах):
+    # клик по ним перезапускает только секцию, а не всю страницу
+    compare_mode = st.toggle(
+        "Сравнить несколько мест" if lang == "ru" else "Compare several places",
+        value=False,
     )
+    if compare_mode:
+        compare_text = st.text_area(
+            "Места, по одному в строке (название или «широта, долгота»)"
+            if lang == "ru"
+            else "Places, one per line (name or 'lat, lon')",
+            value="Москва\nСанкт-Петербург\nКазань\nНовосибирск"
+            if lang == "ru"
+            else "London\nParis\nBerlin\nMadrid",
+            height=160,
+        )
 
-# Для API задаю единицы измерения температуры
+    debug_box = st.empty() if DEBUG_PANEL else None
+
+# Единицы измерения для отображения (в API всегда метрические)
 if lang == "ru":
     temp_system = "Fahrenheit" if units_label == "Фаренгейт" else "Celsius"
 else:
     temp_system = "Fahrenheit" if units_label == "Fahrenheit" else "Celsius"
 
+# ----------------------- Замеры -----------------------
+def finish_run():
+    """Закрывает замеры прогона и, если панель включена, показывает их"""
+    trace.finish(lang=lang, query=city_query, compare=compare_mode)
+    if debug_box is None:
+        return
+    c = trace.counters
+    if lang == "ru":
+        lines = ["**🛠 Замеры прогона**", "", "| Этап | мс |", "|---|---:|"]
+    else:
+        lines = ["**🛠 Run timings**", "", "| Stage | ms |", "|---|---:|"]
+    lines += [f"| {stage} | {seconds * 1000:.1f} |" for stage, seconds in trace.stages().items()]
+    lines.append(f"| **total** | **{trace.total * 1000:.1f}** |")
+    with debug_box.container(border=True):
+        st.markdown("\n".join(lines))
+        st.caption(
+            f"cache: {c['cache_hits']} hit / {c['cache_stale']} stale / {c['cache_misses']} miss · "
+            f"upstream: {c['upstream_requests']} req, {c['upstream_bytes'] / 1024:.1f} KiB"
+        )
+        for host, (requests_n, errors, nbytes, seconds) in sorted(registry.upstream.items()):
+            st.caption(f"{host}: {requests_n} req, {errors} err, {nbytes / 1024:.1f} KiB, {seconds:.2f} s")
+
+
+def section_trace():
+    """Замеры секции-фрагмента: в полном прогоне - общий trace, а при
+    перезапуске одного фрагмента (клик внутри него) - отдельный"""
+    return trace if trace.total is None else Trace()
+
+
+def finish_section(section_trace, name):
+    """Закрывает замеры перезапуска одного фрагмента"""
+    if section_trace is not trace:
+        section_trace.finish(lang=lang, query=city_query, fragment=name)
+
+
+def stop():
+    """st.stop(), но сначала закрываем замеры прогона"""
+    finish_run()
+    st.stop()
+
+
+def rate_limited(e):
+    """Сообщение, когда квота API исчерпана, а сохранённых данных нет"""
+    if lang == "ru":
+        wait = f"{e.retry_after:.0f} с" if e.retry_after else "минуту"
+        st.warning(f"Слишком много запросов к сервису погоды. Попробуйте через {wait}.")
+    else:
+        wait = f"{e.retry_after:.0f}s" if e.retry_after else "a minute"
+        st.warning(f"Too many requests to the weather service. Please try again in {wait}.")
+    stop()
+
+
 # ----------------------- Заголовок страницы -----------------------
 if lang == "ru":
     st.title("Прогноз погоды")
@@ -77,217 +184,201 @@ else:
     st.caption("Data source: Open-Meteo")
 
 
-# ----------------------- Вспомогательные функции -----------------------
-# Функция нужна для корректной работы всплывающего списка
-@st.cache_data(ttl=3600)
-def geocode(query: str, lang_code: str):
-    """Возвращает список совпадений с координатами по названию места"""
-    if not query:
-        return []
-    url = "https://geocoding-api.open-meteo.com/v1/search"
-    r = requests.get(
-        url,
-        params={"name": query, "count": 5, "language": lang_code, "format": "json"},
-        timeout=15,
-    )
-    r.raise_for_status()
-    data = r.json().get("results", []) or []
-    places = []
-    for p in data:
-        label_parts = [p.get("name")]
-        if p.get("admin1"):
-            label_parts.append(p["admin1"])
-        if p.get("country"):
-            label_parts.append(p["country"])
-        label = ", ".join([x for x in label_parts if x])
-        places.append(
+# ----------------------- Сравнение мест -----------------------
+def resolve_place(line: str, lang_code: str):
+    """Строка из списка сравнения -> место: «широта, долгота» или первый результат геокодера"""
+    parts = [x.strip() for x in line.split(",")]
+    if len(parts) == 2:
+        try:
+            lat, lon = float(parts[0]), float(parts[1])
+            return {"label": line, "lat": lat, "lon": lon, "tz": "UTC"}
+        except ValueError:
+            pass
+    found = geocode(line, lang_code)
+    return found[0] if found else None
+
+
+if compare_mode:
+    import pandas as pd
+    import pydeck as pdk
+
+    lines = [x.strip() for x in compare_text.splitlines() if x.strip()]
+    # Геокодинг строк независим - запускаем все разом
+    futures = [submit(resolve_place, line, lang) for line in lines]
+    sites = []
+    not_found = []
+    with trace.span("compare_geocode"):
+        for line, future in zip(lines, futures):
+            try:
+                site = future.result()
+            except Exception:
+                site = None
+            if site:
+                sites.append(site)
+            else:
+                not_found.append(line)
+    if not_found:
+        st.warning(("Не найдено: " if lang == "ru" else "Not found: ") + ", ".join(not_found))
+    if not sites:
+        stop()
+
+    try:
+        with trace.span("compare_forecast"):
+            batch = fetch_weather_batch([(s["lat"], s["lon"]) for s in sites])
+    except Exception as e:
+        if lang == "ru":
+            st.error(f"Ошибка API погоды: {e}")
+        else:
+            st.error(f"Weather API error: {e}")
+        stop()
+
+    temp_unit_symbol = "°F" if temp_system == "Fahrenheit" else "°C"
+    wind_unit_symbol = "mph" if temp_system == "Fahrenheit" else ("км/ч" if lang == "ru" else "km/h")
+    desc_dict = WEATHER_DESCRIPTIONS_RU if lang == "ru" else WEATHER_DESCRIPTIONS_EN
+    rows = []
+    for site, item in zip(sites, batch):
+        cur = item.current
+        code = cur.get("weather_code", 0)
+        # Пустые значения у места не должны ронять всю таблицу, как и у температуры
+        ws, wd = cur.get("wind_speed_10m"), cur.get("wind_direction_10m")
+        wind = "—" if ws is None else f"{convert_wind(ws, temp_system):.0f} {wind_unit_symbol}"
+        if ws is not None and wd is not None:
+            wind += f" {deg_to_compass(wd)}"
+        rows.append(
             {
-                "label": label,
-                "lat": p.get("latitude"),
-                "lon": p.get("longitude"),
-                "tz": p.get("timezone", "UTC"),
+                "label": site["label"],
+                "lat": site["lat"],
+                "lon": site["lon"],
+                "weather": f"{WEATHER_EMOJI.get(code, '🌡️')} {desc_dict.get(code, '—')}",
+                "temp": cur.get("temperature_2m"),
+                "feels_like": cur.get("apparent_temperature"),
+                "wind": wind,
+                "humidity": cur.get("relative_humidity_2m"),
             }
         )
-    return places
-
-
-@st.cache_data(ttl=900)
-def fetch_weather(lat: float, lon: float, temp_unit: str):
-    """Получает текущую погоду, почасовой и недельный прогноз."""
-    is_f = temp_unit == "Fahrenheit"
-    temp_unit_param = "fahrenheit" if is_f else "celsius"
-    wind_unit_param = "mph" if is_f else "kmh"
-
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current": [
-            "temperature_2m",
-            "apparent_temperature",
-            "wind_speed_10m",
-            "wind_direction_10m",
-            "relative_humidity_2m",
-            "weather_code",
-        ],
-        "hourly": [
-            "temperature_2m",
-            "apparent_temperature",
-            "precipitation",
-            "relative_humidity_2m",
-        ],
-        "daily": [
-            "weather_code",
-            "temperature_2m_max",
-            "temperature_2m_min",
-            "sunrise",
-            "sunset",
-            "precipitation_sum",
-            "wind_speed_10m_max",
-        ],
-        "temperature_unit": temp_unit_param,
-        "wind_speed_unit": wind_unit_param,
-        "timezone": "auto",
-    }
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    return r.json()
-
-
-# Описания погодных кодов на двух языках, взято на основе данных API
-WEATHER_DESCRIPTIONS_RU = {
-    0: "Ясно",
-    1: "Преимущественно ясно",
-    2: "Переменная облачность",
-    3: "Пасмурно",
-    45: "Туман",
-    48: "Туман с изморозью",
-    51: "Слабая морось",
-    53: "Умеренная морось",
-    55: "Сильная морось",
-    61: "Слабый дождь",
-    63: "Умеренный дождь",
-    65: "Сильный дождь",
-    71: "Слабый снег",
-    73: "Умеренный снег",
-    75: "Сильный снег",
-    80: "Кратковременные дожди",
-    81: "Ливень",
-    82: "Сильный ливень",
-    95: "Гроза",
-    96: "Гроза с небольшим градом",
-    97: "Гроза с сильным градом",
-}
-
-WEATHER_DESCRIPTIONS_EN = {
-    0: "Clear sky",
-    1: "Mainly clear",
-    2: "Partly cloudy",
-    3: "Overcast",
-    45: "Fog",
-    48: "Depositing rime fog",
-    51: "Light drizzle",
-    53: "Moderate drizzle",
-    55: "Dense drizzle",
-    61: "Slight rain",
-    63: "Moderate rain",
-    65: "Heavy rain",
-    71: "Slight snow",
-    73: "Moderate snow",
-    75: "Heavy snow",
-    80: "Rain showers (slight)",
-    81: "Rain showers (moderate)",
-    82: "Rain showers (violent)",
-    95: "Thunderstorm",
-    96: "Thunderstorm with slight hail",
-    97: "Thunderstorm with heavy hail",
-}
-
-WEATHER_EMOJI = {
-    0: "☀️",
-    1: "🌤️",
-    2: "⛅",
-    3: "☁️",
-    45: "🌫️",
-    48: "🌫️",
-    51: "🌦️",
-    53: "🌦️",
-    55: "🌧️",
-    61: "🌧️",
-    63: "🌧️",
-    65: "🌧️",
-    71: "🌨️",
-    73: "🌨️",
-    75: "❄️",
-    80: "🌧️",
-    81: "🌧️",
-    82: "⛈️",
-    95: "⛈️",
-    96: "⛈️",
-    97: "⛈️",
-}
-
-
-def deg_to_compass(deg):
-    # Для компаса
-    dirs = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
-    ix = int((deg / 45) + 0.5) % 8
-    return dirs[ix]
-
-
-def nice_time(ts, tz_str, lang_code: str):
-    """Функция, цель которой привести время в нормальный и понятный для человека формат"""
-    try:
-        tz = pytz.timezone(tz_str)
-        dt = datetime.fromisoformat(ts.replace("Z", "+00:00")).astimezone(tz)
-        if lang_code == "ru":
-            return dt.strftime("%d.%m %H:%M")
-        else:
-            return dt.strftime("%Y-%m-%d %H:%M")
-    except Exception:
-        return ts
+    cdf = pd.DataFrame(rows)
+    cdf[["temp", "feels_like"]] = convert_temp(cdf[["temp", "feels_like"]].astype(float), temp_system).round(1)
+
+    if lang == "ru":
+        st.markdown("### Сравнение мест (сейчас)")
+        columns = {
+            "label": "Место",
+            "weather": "Погода",
+            "temp": f"Темп. ({temp_unit_symbol})",
+            "feels_like": f"Ощущается ({temp_unit_symbol})",
+            "wind": "Ветер",
+            "humidity": "Влажность (%)",
+        }
+    else:
+        st.markdown("### Places compared (now)")
+        columns = {
+            "label": "Place",
+            "weather": "Weather",
+            "temp": f"Temp ({temp_unit_symbol})",
+            "feels_like": f"Feels ({temp_unit_symbol})",
+            "wind": "Wind",
+            "humidity": "Humidity (%)",
+        }
+    st.dataframe(cdf[list(columns)].rename(columns=columns), use_container_width=True, hide_index=True)
+
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        cdf[["label", "lat", "lon", "temp"]],
+        get_position="[lon, lat]",
+        get_radius=20000,
+        radius_min_pixels=5,
+        get_fill_color="[255, 140, 0, 180]",
+        pickable=True,
+    )
+    with trace.span("compare_map"):
+        st.pydeck_chart(
+            pdk.Deck(
+                layers=[layer],
+                initial_view_state=pdk.data_utils.compute_view(cdf[["lon", "lat"]].values.tolist()),
+                tooltip={"text": f"{{label}}\n{{temp}}{temp_unit_symbol}"},
+            )
+        )
+    stop()
 
 
 # ----------------------- Основной код -----------------------
-places = geocode(city_query, lang) # получаем список мест от пользователя
+# Новый ввод - отменяем ещё не начатые запросы для старого
+fetches.reset((city_query, lang))
+try:
+    with trace.span("geocode"):
+        places = fetches.result(("geocode", city_query, lang), geocode, city_query, lang) # получаем список мест от пользователя
+except RateLimited as e:
+    rate_limited(e)
+except Exception as e:
+    if lang == "ru":
+        st.error(f"Ошибка поиска места: {e}")
+    else:
+        st.error(f"Place search failed: {e}")
+    stop()
 if not places:
     if lang == "ru":
         st.warning("Город не найден. Попробуйте другой запрос, например: «Париж, Франция».")
     else:
         st.warning("No places found. Try a different search, e.g. 'Paris, France'.")
-    st.stop()
+    stop()
 
 labels = [p["label"] for p in places]
 choice_label = "Выберите местоположение" if lang == "ru" else "Choose a location"
 choice = st.selectbox(choice_label, options=labels, index=0) # кладем список мест в окно выбора
 place = places[labels.index(choice)]
+hot_locations.record(place["lat"], place["lon"])
+
+# Выбранное место - первым, остальные кандидаты подгружаются в фоне и
+# уступают квоту API запросам пользователей
+fetches.submit(("forecast", place["lat"], place["lon"]), fetch_weather, place["lat"], place["lon"])
+with background():
+    for p in places[:PREFETCH_PLACES]:
+        if p is not place:
+            fetches.submit(("forecast", p["lat"], p["lon"]), fetch_weather, p["lat"], p["lon"])
 
 try:
-    data = fetch_weather(place["lat"], place["lon"], temp_system) # пробуем достать данные по погоде
+    with trace.span("forecast"):
+        data = fetches.result(
+            ("forecast", place["lat"], place["lon"]), fetch_weather, place["lat"], place["lon"]
+        ) # пробуем достать данные по погоде
+except RateLimited as e:
+    rate_limited(e)
 except requests.HTTPError as e:
     if lang == "ru":
         st.error(f"Ошибка API погоды: {e}")
     else:
         st.error(f"Weather API error: {e}")
-    st.stop()
+    stop()
 except Exception as e:
     if lang == "ru":
         st.error(f"Произошла ошибка: {e}")
     else:
         st.error(f"Something went wrong: {e}")
-    st.stop()
+    stop()
+
+# API не ответил, и показан последний сохранённый прогноз (см. cached(fallback_ttl=...)):
+# запись в кэше только на случай отказа, и на экране именно она
+last_good = fetch_weather.fallback(place["lat"], place["lon"])
+if fetch_weather.expired(place["lat"], place["lon"]) and getattr(last_good, "version", None) == data.version:
+    forecast_age = time.time() - (data.downloaded or time.time())
+    if lang == "ru":
+        st.warning(f"⚠️ Сервис погоды сейчас недоступен — показан прогноз, полученный {forecast_age / 60:.0f} мин назад.")
+    else:
+        st.warning(f"⚠️ The weather service is unavailable — showing the forecast from {forecast_age / 60:.0f} min ago.")
 
-tz = data.get("timezone", place["tz"]) 
-current = data.get("current", {})
-daily = data.get("daily", {})
-hourly = data.get("hourly", {})
+# Forecast: current - словарь, hourly/daily - типизированные массивы (см. forecast.py)
+tz = data.timezone or place["tz"]
+current = data.current
+daily = data.daily
+hourly = data.hourly
 
 desc_dict = WEATHER_DESCRIPTIONS_RU if lang == "ru" else WEATHER_DESCRIPTIONS_EN #словарь с описаниями погоды
 
 # ----------------------- Текущие условия -----------------------
-c_temp = current.get("temperature_2m")
-c_feels = current.get("apparent_temperature")
-c_ws = current.get("wind_speed_10m")
+# Прогноз хранится в °C и км/ч, в выбранные единицы переводим здесь
+c_temp = convert_temp(current.get("temperature_2m"), temp_system)
+c_feels = convert_temp(current.get("apparent_temperature"), temp_system)
+c_ws = convert_wind(current.get("wind_speed_10m"), temp_system)
 c_wd = current.get("wind_direction_10m")
 c_rh = current.get("relative_humidity_2m")
 c_code = current.get("weather_code", 0)
@@ -313,78 +404,169 @@ else:
 
 
 # ----------------------- Почасовой прогноз -----------------------
-if show_hourly and "time" in hourly:
-    today_date = daily.get("time", [None])[0]
-    hdf = pd.DataFrame(
-        {
-            "time": hourly.get("time", []),
-            "temp": hourly.get("temperature_2m", []),
-            "feels_like": hourly.get("apparent_temperature", []),
-            "humidity": hourly.get("relative_humidity_2m", []),
-            "precip": hourly.get("precipitation", []),
-        }
+@st.fragment
+def hourly_section(data, place, tz, today_date):
+    show_hourly = st.toggle(
+        "Показать почасовой прогноз" if lang == "ru" else "Show hourly forecast",
+        value=True,
+        key="show_hourly",
     )
-    if today_date:
-        hdf = hdf[hdf["time"].str.startswith(today_date)]
-    hdf["local_time"] = hdf["time"].apply(lambda x: nice_time(x, tz, lang))
-
-    if lang == "ru":
-        st.markdown("### Почасовой прогноз (сегодня)")
-        table = hdf[["local_time", "temp", "feels_like", "humidity", "precip"]].rename(
-            columns={
+    if not show_hourly or "time" not in data.hourly:
+        return
+    from weather_core.transforms import hourly_frame
+
+    def build():
+        hdf = hourly_frame(data.hourly, tz, lang, day=today_date, temp_unit=temp_system)
+        if lang == "ru":
+            columns = {
                 "local_time": "Время",
                 "temp": f"Темп. ({temp_unit_symbol})",
                 "feels_like": f"Ощущается ({temp_unit_symbol})",
                 "humidity": "Влажность (%)",
                 "precip": "Осадки (мм)",
             }
-        )
-    else:
-        st.markdown("### Hourly forecast (today)")
-        table = hdf[["local_time", "temp", "feels_like", "humidity", "precip"]].rename(
-            columns={
+        else:
+            columns = {
                 "local_time": "Time",
                 "temp": f"Temp ({temp_unit_symbol})",
                 "feels_like": f"Feels ({temp_unit_symbol})",
                 "humidity": "Humidity (%)",
                 "precip": "Precip (mm)",
             }
-        )
+        return hdf[list(columns)].rename(columns=columns), hdf.set_index("local_time")[["temp"]]
+
+    t = section_trace()
+    with t.span("hourly_frame"):
+        table, chart = memo(st.session_state, "hourly", data, (tz, lang, temp_system, today_date), build)
+
+    st.markdown("### Почасовой прогноз (сегодня)" if lang == "ru" else "### Hourly forecast (today)")
+    with t.span("hourly_render"):
+        st.dataframe(table, use_container_width=True)
+        st.line_chart(chart, height=220)
+    show_ensemble = st.toggle(
+        "Сравнить модели прогноза" if lang == "ru" else "Compare forecast models",
+        value=False,
+        key="show_ensemble",
+    )
+    if show_ensemble:
+        ensemble_band(place, tz, today_date, t)
+    finish_section(t, "hourly")
+
 
-    st.dataframe(table, use_container_width=True)
-    st.line_chart(hdf.set_index("local_time")[["temp"]], height=220)
+def ensemble_band(place, tz, today_date, t):
+    """Температура по нескольким моделям: полоса min-max и среднее"""
+    import altair as alt
+
+    from weather_core.ensemble import ensemble_stats, fetch_ensemble
+    from weather_core.transforms import ensemble_frame
+
+    try:
+        with t.span("ensemble_fetch"):
+            ensemble = fetch_ensemble(place["lat"], place["lon"])
+    except Exception as e:
+        if lang == "ru":
+            st.warning(f"Прогнозы моделей сейчас недоступны: {e}")
+        else:
+            st.warning(f"Model forecasts are unavailable right now: {e}")
+        return
+    members = ensemble["members"]
+
+    def build():
+        with t.span("ensemble_stats"):
+            stats = ensemble_stats(members.values())
+        return ensemble_frame(stats, tz, lang, day=today_date, temp_unit=temp_system)
+
+    # Прогнозы моделей сравниваются по метке содержимого: новый ответ API - новая модель
+    params = (tuple(m.version for m in members.values()), tz, lang, temp_system, today_date)
+    with t.span("ensemble_frame"):
+        edf = memo(st.session_state, "ensemble", None, params, build)
+    if edf.empty:
+        return
+    title = "Модели" if lang == "ru" else "Models"
+    base = alt.Chart(edf).encode(x=alt.X("time:T", title=None, axis=alt.Axis(format="%H:%M")))
+    band = base.mark_area(opacity=0.3).encode(
+        y=alt.Y("min:Q", title=temp_unit_symbol, scale=alt.Scale(zero=False)),
+        y2="max:Q",
+        tooltip=[
+            alt.Tooltip("local_time:N", title="Время" if lang == "ru" else "Time"),
+            alt.Tooltip("min:Q", title="Мин" if lang == "ru" else "Min"),
+            alt.Tooltip("max:Q", title="Макс" if lang == "ru" else "Max"),
+        ],
+    )
+    line = base.mark_line().encode(y="mean:Q")
+    with t.span("ensemble_render"):
+        st.altair_chart((band + line).properties(height=220, title=title), use_container_width=True)
+    names = ", ".join(members)
+    spread = edf["spread"].max()
+    if lang == "ru":
+        st.caption(f"Среднее и разброс моделей {names}: до {spread:.1f}{temp_unit_symbol} за день.")
+    else:
+        st.caption(f"Mean and range of {names}: up to {spread:.1f}{temp_unit_symbol} today.")
+    if ensemble["failed"]:
+        failed = ", ".join(ensemble["failed"])
+        st.caption(f"Не загрузились: {failed}." if lang == "ru" else f"Failed to load: {failed}.")
+
+
+hourly_section(data, place, tz, daily["time"][0] if daily.get("time") else None)
 
 # ----------------------- Карта осадков (сегодня) -----------------------
 if "time" in daily and daily["time"]:
-    precip_today = (daily.get("precipitation_sum") or [0])[0] or 0.0
+    import pydeck as pdk
+
+    from weather_core.regional import GRID_RADIUS, GRID_STEP, TILE, heatmap_points, precip_grid
+
+    precip_today = (daily.get("precipitation_sum") or [0.0])[0]
+    precip_today = 0.0 if math.isnan(precip_today) else round(precip_today, 1)
+    # Окно карты - целые плитки, см. regional.tiles_around
+    size = -(-(2 * GRID_RADIUS + 1) // TILE) * TILE
+    span_km = round((size - 1) * GRID_STEP * 111)
 
     if lang == "ru":
         st.markdown("### Карта осадков (сегодня)")
-        st.caption("Размер маркера отражает количество осадков (мм).")
+        st.caption(f"Осадки за сегодня по сетке {size}×{size} точек, около {span_km} км вокруг места (мм).")
     else:
         st.markdown("### Precipitation map (today)")
-        st.caption("Marker size reflects today's total precipitation (mm).")
-
-    df_map = pd.DataFrame(
-        {
-            "lat": [place["lat"]],
-            "lon": [place["lon"]],
-            "precip_today_mm": [precip_today],
-            "label": [place["label"]],
-        }
-    )
+        st.caption(f"Today's precipitation on a {size}×{size} grid, about {span_km} km around the place (mm).")
 
-    radius_base = 8000
-    radius_scale = 4000
-
-    layer = pdk.Layer(
+    # Место - маркером с подсказкой; одна точка, DataFrame тут не нужен
+    marker = pdk.Layer(
         "ScatterplotLayer",
-        df_map,
+        [{"lat": place["lat"], "lon": place["lon"], "precip_today_mm": precip_today, "label": place["label"]}],
         get_position="[lon, lat]",
-        get_radius=f"precip_today_mm * {radius_scale} + {radius_base}",
-        get_fill_color="[30, 144, 255, 160]",
+        get_radius=6000,
+        radius_min_pixels=4,
+        get_fill_color="[30, 144, 255, 200]",
         pickable=True,
     )
+    layers = [marker]
+    try:
+        with trace.span("precip_grid"):
+            grid = precip_grid(place["lat"], place["lon"])
+    except Exception:
+        grid = None
+        st.caption(
+            "Осадки по региону сейчас недоступны, показано только место."
+            if lang == "ru"
+            else "Regional precipitation is unavailable right now; showing the place only."
+        )
+    if grid is not None:
+        if grid["failed"]:
+            st.caption(
+                f"Часть карты не загрузилась ({grid['failed']} из {grid['tiles']} плиток)."
+                if lang == "ru"
+                else f"Part of the map failed to load ({grid['failed']} of {grid['tiles']} tiles)."
+            )
+        layers.insert(
+            0,
+            pdk.Layer(
+                "HeatmapLayer",
+                heatmap_points(grid),
+                get_position="[lon, lat]",
+                get_weight="mm",
+                radius_pixels=40,
+                opacity=0.7,
+            ),
+        )
 
     tooltip_text = (
         "{label}\nОсадки: {precip_today_mm} мм"
@@ -392,71 +574,134 @@ if "time" in daily and daily["time"]:
         else "{label}\nPrecipitation: {precip_today_mm} mm"
     )
 
-    st.pydeck_chart(
-        pdk.Deck(
-            layers=[layer],
-            initial_view_state=pdk.ViewState(
-                latitude=place["lat"],
-                longitude=place["lon"],
-                zoom=6,
-                pitch=0,
-            ),
-            tooltip={"text": tooltip_text},
+    with trace.span("map"):
+        st.pydeck_chart(
+            pdk.Deck(
+                layers=layers,
+                initial_view_state=pdk.ViewState(
+                    latitude=place["lat"],
+                    longitude=place["lon"],
+                    zoom=6,
+                    pitch=0,
+                ),
+                tooltip={"text": tooltip_text},
+            )
         )
-    )
 
 # ----------------------- 7-дневный прогноз -----------------------
 if "time" in daily and daily["time"]:
-    fdf = pd.DataFrame(
-        {
-            "date": daily["time"],
-            "code": daily.get("weather_code", []),
-            "tmax": daily.get("temperature_2m_max", []),
-            "tmin": daily.get("temperature_2m_min", []),
-            "precip": daily.get("precipitation_sum", []),
-            "windmax": daily.get("wind_speed_10m_max", []),
-            "sunrise": daily.get("sunrise", []),
-            "sunset": daily.get("sunset", []),
-        }
-    )
-    fdf["desc"] = fdf["code"].map(lambda c: desc_dict.get(c, "—"))
-    fdf["emoji"] = fdf["code"].map(lambda c: WEATHER_EMOJI.get(c, "🌡️"))
-
-    if lang == "ru":
-        st.markdown("### Прогноз на 7 дней")
-    else:
-        st.markdown("### 7-day forecast")
+    from weather_core.transforms import daily_frame
 
-    for _, row in fdf.iterrows():
-        with st.container(border=True):
+    def daily_rows():
+        """Строки прогноза по дням: (заголовок, подпись с восходом и закатом)"""
+        fdf = daily_frame(daily, tz, lang, desc_dict, WEATHER_EMOJI, temp_unit=temp_system)
+        rows = []
+        for row in fdf.to_dict("records"):
             date_str = row["date"]
-            sunrise_str = nice_time(row["sunrise"], tz, lang)
-            sunset_str = nice_time(row["sunset"], tz, lang)
-
+            sunrise_str = row["sunrise_str"]
+            sunset_str = row["sunset_str"]
             if lang == "ru":
-                st.markdown(
-                    f"**{date_str}**  {row['emoji']} {row['desc']}  "
-                    f"| Макс: **{row['tmax']:.1f}{temp_unit_symbol}**  "
-                    f"| Мин: **{row['tmin']:.1f}{temp_unit_symbol}**  "
-                    f"| Осадки: **{row['precip']:.1f} мм**  "
-                    f"| Ветер до: **{row['windmax']:.0f} {wind_unit_symbol}**"
+                rows.append(
+                    (
+                        f"**{date_str}**  {row['emoji']} {row['desc']}  "
+                        f"| Макс: **{row['tmax']:.1f}{temp_unit_symbol}**  "
+                        f"| Мин: **{row['tmin']:.1f}{temp_unit_symbol}**  "
+                        f"| Осадки: **{row['precip']:.1f} мм**  "
+                        f"| Ветер до: **{row['windmax']:.0f} {wind_unit_symbol}**",
+                        f"🌅 Восход: {sunrise_str} · 🌇 Закат: {sunset_str}",
+                    )
                 )
-                st.caption(f"🌅 Восход: {sunrise_str} · 🌇 Закат: {sunset_str}")
             else:
-                st.markdown(
-                    f"**{date_str}**  {row['emoji']} {row['desc']}  "
-                    f"| High: **{row['tmax']:.1f}{temp_unit_symbol}**  "
-                    f"| Low: **{row['tmin']:.1f}{temp_unit_symbol}**  "
-                    f"| Precip: **{row['precip']:.1f} mm**  "
-                    f"| Max wind: **{row['windmax']:.0f} {wind_unit_symbol}**"
+                rows.append(
+                    (
+                        f"**{date_str}**  {row['emoji']} {row['desc']}  "
+                        f"| High: **{row['tmax']:.1f}{temp_unit_symbol}**  "
+                        f"| Low: **{row['tmin']:.1f}{temp_unit_symbol}**  "
+                        f"| Precip: **{row['precip']:.1f} mm**  "
+                        f"| Max wind: **{row['windmax']:.0f} {wind_unit_symbol}**",
+                        f"🌅 Sunrise: {sunrise_str} · 🌇 Sunset: {sunset_str}",
+                    )
                 )
-                st.caption(f"🌅 Sunrise: {sunrise_str} · 🌇 Sunset: {sunset_str}")
+        return rows
+
+    with trace.span("daily_frame"):
+        rows = memo(st.session_state, "daily", data, (tz, lang, temp_system), daily_rows)
+
+    if lang == "ru":
+        st.markdown("### Прогноз на 7 дней")
+    else:
+        st.markdown("### 7-day forecast")
+
+    with trace.span("daily_render"):
+        for head, sun in rows:
+            with st.container(border=True):
+                st.markdown(head)
+                st.caption(sun)
 else:
     if lang == "ru":
         st.info("Нет данных прогноза для этого местоположения.")
     else:
         st.info("No daily forecast available for this location.")
 
+# ----------------------- История за несколько лет -----------------------
+@st.fragment
+def history_section(place, tz):
+    show_history = st.toggle(
+        "Показать историю за несколько лет" if lang == "ru" else "Show multi-year history",
+        value=False,
+        key="show_history",
+    )
+    if not show_history:
+        return
+    from datetime import date
+
+    from weather_core.archive import load_history
+    from weather_core.transforms import downsample, history_frame
+
+    history_years = st.slider("Лет истории" if lang == "ru" else "Years of history", 1, 10, 5, key="history_years")
+    if lang == "ru":
+        years_word = "год" if history_years == 1 else "года" if history_years < 5 else "лет"
+        st.markdown(f"### Температура за {history_years} {years_word}")
+    else:
+        st.markdown(f"### Temperature over {history_years} years")
+    # С начала месяца: начало файла не сдвигается каждый день, и догружается только хвост
+    today = date.today()
+    start = date(today.year - history_years, today.month, 1)
+    t = section_trace()
+
+    def build():
+        with t.span("history_load"):
+            table = load_history(place["lat"], place["lon"], start)
+        if table is None or not table.num_rows:
+            return None
+        with t.span("history_frame"):
+            hist = history_frame(table, tz, temp_unit=temp_system)
+            points = downsample(hist, "time", "temp", HISTORY_POINTS)
+        return points.set_index("time")[["temp"]], len(hist), f"{hist['time'].iloc[-1]:%Y-%m-%d}"
+
+    # Архив за прошлые дни не меняется: модель живёт, пока те же место, годы и день
+    try:
+        params = (place["lat"], place["lon"], start, today, tz, temp_system)
+        model = memo(st.session_state, "history", None, params, build)
+    except Exception as e:
+        model = None
+        if lang == "ru":
+            st.warning(f"История сейчас недоступна: {e}")
+        else:
+            st.warning(f"History is unavailable right now: {e}")
+    if model is not None:
+        chart, values, last_day = model
+        with t.span("history_render"):
+            st.line_chart(chart, height=240)
+        if lang == "ru":
+            st.caption(f"Почасовой архив Open-Meteo по {last_day}: {values:,} значений, на графике {len(chart):,}.")
+        else:
+            st.caption(f"Hourly Open-Meteo archive up to {last_day}: {values:,} values, {len(chart):,} plotted.")
+    finish_section(t, "history")
+
+
+history_section(place, tz)
+
 # ----------------------- Подсказка -----------------------
 if lang == "ru":
     st.caption(
@@ -468,3 +713,5 @@ else:
         "💡 Tip: use the sidebar to change city, language and units. "
         "Results are cached for faster loading."
     )
+
+finish_run()
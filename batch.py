@@ -0,0 +1,228 @@
+"""Пакетная выгрузка прогнозов из командной строки, без Streamlit.
+
+Читает места из CSV или JSONL (колонки/поля name, либо lat и lon; id по
+желанию), получает прогнозы пачками через fetch_weather_batch с ограниченным
+числом параллельных пачек и общим кэшем, и сразу пишет результаты в JSONL или
+Parquet. Входной файл читается потоково, в памяти одновременно только пачки
+в работе.
+
+    python batch.py places.csv -o forecasts.jsonl
+    python batch.py places.jsonl -o forecasts.parquet --concurrency 4 --chunk-size 100
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from weather_core.api import BATCH_SIZE, fetch_weather_batch, forecast_params, geocode
+from weather_core.cache import cache_stats
+from weather_core.gazetteer import load_gazetteer
+from weather_core.singleflight import flight
+
+
+def read_locations(path):
+    """Построчно отдаёт словари мест из CSV или JSONL (по расширению файла)"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def chunks(iterable, size):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def resolve(row, lang):
+    """Строка входа -> (lat, lon, label) или исключение, если место не найдено"""
+    if row.get("lat") not in (None, "") and row.get("lon") not in (None, ""):
+        return float(row["lat"]), float(row["lon"]), row.get("name") or ""
+    name = (row.get("name") or "").strip()
+    places = geocode(name, lang) if name else []
+    if not places:
+        raise LookupError(f"place not found: {name!r}")
+    return places[0]["lat"], places[0]["lon"], places[0]["label"]
+
+
+def process_chunk(numbered_rows, lang):
+    """Пачка строк -> записи результата. Ошибки отдельных мест не валят пачку"""
+    records = []
+    points = []
+    for n, row in numbered_rows:
+        record = {"row": n, "id": row.get("id"), "query": row.get("name")}
+        try:
+            lat, lon, label = resolve(row, lang)
+            record.update(label=label, lat=lat, lon=lon)
+            points.append((lat, lon))
+        except Exception as e:
+            record["error"] = str(e)
+        records.append(record)
+
+    ok = [r for r in records if "error" not in r]
+    try:
+        forecasts = fetch_weather_batch(points)
+    except Exception as e:
+        for r in ok:
+            r["error"] = f"forecast failed: {e}"
+        return records
+    for r, forecast in zip(ok, forecasts):
+        data = forecast.to_json()
+        r["timezone"] = data["timezone"]
+        r["current"] = data["current"]
+        r["hourly"] = data["hourly"]
+        r["daily"] = data["daily"]
+    return records
+
+
+class JSONLWriter:
+    def __init__(self, path):
+        self._f = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+    def write(self, records):
+        for r in records:
+            self._f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self):
+        if self._f is not sys.stdout:
+            self._f.close()
+
+
+class ParquetWriter:
+    """Плоская схема: current_* - числа, hourly_*/daily_* - списки. Пишется группами строк по пачкам.
+
+    Время (time, sunrise, sunset) - секунды Unix, как в запросе прогноза.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            sys.exit("Parquet output needs pyarrow: pip install pyarrow")
+        self._pa = pa
+        params = forecast_params()
+        time_fields = {"time", "sunrise", "sunset"}
+        fields = [
+            ("row", pa.int64()),
+            ("id", pa.string()),
+            ("query", pa.string()),
+            ("label", pa.string()),
+            ("lat", pa.float64()),
+            ("lon", pa.float64()),
+            ("error", pa.string()),
+            ("timezone", pa.string()),
+            ("current_time", pa.int64()),
+        ]
+        fields += [(f"current_{v}", pa.float64()) for v in params["current"]]
+        for section in ("hourly", "daily"):
+            for v in ["time"] + params[section]:
+                kind = pa.int64() if v in time_fields else pa.float64()
+                fields.append((f"{section}_{v}", pa.list_(kind)))
+        self._schema = pa.schema(fields)
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _flatten(self, r):
+        flat = {k: r.get(k) for k in ("row", "id", "query", "label", "lat", "lon", "error", "timezone")}
+        for section in ("current", "hourly", "daily"):
+            for k, v in (r.get(section) or {}).items():
+                flat[f"{section}_{k}"] = v
+        return flat
+
+    def write(self, records):
+        rows = [self._flatten(r) for r in records]
+        columns = {f.name: [row.get(f.name) for row in rows] for f in self._schema}
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path, fmt):
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "jsonl")
+    return ParquetWriter(path) if fmt == "parquet" else JSONLWriter(path)
+
+
+class Progress:
+    """Строка прогресса в stderr не чаще раза в секунду"""
+
+    def __init__(self, stream=sys.stderr, every=1.0):
+        self.stream = stream
+        self.every = every
+        self.started = time.monotonic()
+        self._last = 0.0
+        self.done = 0
+        self.errors = 0
+
+    def update(self, records, force=False):
+        self.done += len(records)
+        self.errors += sum(1 for r in records if "error" in r)
+        now = time.monotonic()
+        if force or now - self._last >= self.every:
+            self._last = now
+            self.stream.write(f"\r{self.summary()}")
+            self.stream.flush()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        return f"{self.done} locations, {self.errors} errors, {elapsed:.1f}s, {rate:.1f} loc/s"
+
+
+def run(rows, writer, concurrency=4, chunk_size=BATCH_SIZE, lang="en", progress=None):
+    """Гоняет строки через пул: не больше concurrency пачек в работе, результаты пишутся по готовности"""
+    progress = progress or Progress()
+    numbered = enumerate(rows)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="weather-batch") as pool:
+        pending = set()
+        for chunk in chunks(numbered, chunk_size):
+            pending.add(pool.submit(process_chunk, chunk, lang))
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    records = future.result()
+                    writer.write(records)
+                    progress.update(records)
+        for future in pending:
+            records = future.result()
+            writer.write(records)
+            progress.update(records)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream weather forecasts for many locations")
+    parser.add_argument("input", help="CSV or JSONL with name or lat/lon (and optional id)")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout (JSONL only)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="default: by output extension")
+    parser.add_argument("--concurrency", type=int, default=4, help="chunks fetched in parallel")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE, help="locations per upstream request")
+    parser.add_argument("--lang", default="en", help="geocoding language")
+    args = parser.parse_args(argv)
+
+    load_gazetteer()
+    writer = open_writer(args.output, args.format)
+    try:
+        progress = run(
+            read_locations(args.input),
+            writer,
+            concurrency=args.concurrency,
+            chunk_size=args.chunk_size,
+            lang=args.lang,
+        )
+    finally:
+        writer.close()
+    sys.stderr.write(f"\r{progress.summary()}\n")
+    sys.stderr.write(f"cache: {cache_stats()}, single-flight: {flight.stats()}\n")
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,504 @@
+"""Замеры производительности на записанных ответах Open-Meteo.
+
+Что меряется (на прогнозах от 1 до 16 дней):
+    json_decode    разбор ответа API
+    forecast_decode  разбор ответа в Forecast (типизированные массивы)
+    hourly_frame   почасовая таблица для показа
+    daily_frame    дневная таблица для показа
+    nice_time      построчное форматирование времени (и векторное format_times)
+    ensemble_stats  выравнивание и статистика по трём моделям
+    alerts_update  предупреждения для 1000 мест: новый прогон у всех и тот же прогноз
+    app_run        полный прогон app.py через AppTest: первый и повторный
+
+Сеть не нужна: http_client получает сессию, которая отвечает фикстурами из
+benchmarks/fixtures. Каждый прогон дописывается в history.jsonl, и медианы
+сравниваются с предыдущим прогоном, чтобы ловить регрессии.
+
+    python -m benchmarks.bench                      # все замеры
+    python -m benchmarks.bench -k frame --repeat 50 # только таблицы
+    python -m benchmarks.bench --check              # код 1, если что-то замедлилось
+    python -m benchmarks.bench record               # перезаписать фикстуры с живого API
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+FIXTURES = HERE / "fixtures"
+HISTORY = Path(os.getenv("WEATHER_BENCH_HISTORY", HERE / "history.jsonl"))
+
+FORECAST_DAYS = (1, 3, 7, 16)
+GEOCODE_QUERIES = (("Moscow", "ru"), ("Paris", "en"))
+# Место, для которого записаны прогнозы
+SITE = {"name": "Moscow", "lat": 55.75222, "lon": 37.61556, "tz": "Europe/Moscow"}
+# Ответ ipapi.co для прогона страницы
+IP_LOCATION = {"city": "Moscow", "country_name": "Russia", "latitude": SITE["lat"], "longitude": SITE["lon"]}
+
+
+# ----------------------- Фикстуры -----------------------
+def fixture_path(name):
+    return FIXTURES / f"{name}.json"
+
+
+def forecast_fixture(days):
+    return fixture_path(f"forecast_{days}d")
+
+
+def geocode_fixture(query):
+    return fixture_path(f"geocode_{query.lower()}")
+
+
+def load_raw(path):
+    return Path(path).read_bytes()
+
+
+def record(synthetic=False):
+    """Записывает ответы geocoding и forecast API в benchmarks/fixtures"""
+    from weather_core import http_client
+    from weather_core.api import FORECAST_URL, forecast_params
+
+    FIXTURES.mkdir(exist_ok=True)
+    for query, lang in GEOCODE_QUERIES:
+        if synthetic:
+            body = synthetic_geocode(query)
+        else:
+            r = http_client.get(
+                "https://geocoding-api.open-meteo.com/v1/search",
+                params={"name": query, "count": 5, "language": lang, "format": "json"},
+            )
+            r.raise_for_status()
+            body = r.json()
+        _write(geocode_fixture(query), body)
+    for days in FORECAST_DAYS:
+        if synthetic:
+            body = synthetic_forecast(days)
+        else:
+            params = {"latitude": SITE["lat"], "longitude": SITE["lon"], "forecast_days": days, **forecast_params()}
+            r = http_client.get(FORECAST_URL, params=params)
+            r.raise_for_status()
+            body = r.json()
+        _write(forecast_fixture(days), body)
+
+
+def _write(path, body):
+    # Компактно, как отдаёт API: размер файла совпадает с размером ответа
+    path.write_text(json.dumps(body, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    print(f"{path.relative_to(ROOT)}: {path.stat().st_size} bytes")
+
+
+def synthetic_forecast(days, start=date(2025, 11, 12), seed=0):
+    """Ответ в формате Open-Meteo с правдоподобными значениями (для записи без сети)"""
+    rnd = random.Random(seed * 100 + days)
+    hours = days * 24
+    offset = 10800
+    # timeformat=unixtime: секунды Unix, сутки - от местной полуночи
+    t0 = int(datetime(start.year, start.month, start.day, tzinfo=timezone.utc).timestamp()) - offset
+    times = [t0 + 3600 * h for h in range(hours)]
+    temp = []
+    for h in range(hours):
+        base = 2.0 - 0.3 * (h // 24) + 4.0 * math.sin((h % 24 - 9) / 24 * 2 * math.pi)
+        temp.append(round(base + rnd.gauss(0, 0.6), 1))
+    wind = [round(abs(rnd.gauss(12, 5)), 1) for _ in range(hours)]
+    precip = [round(max(0.0, rnd.gauss(-0.2, 0.4)), 1) for _ in range(hours)]
+    codes = [0, 1, 2, 3, 45, 61, 63, 71, 73, 80]
+    day_list = [start + timedelta(days=d) for d in range(days)]
+    return {
+        "latitude": 55.75,
+        "longitude": 37.625,
+        "generationtime_ms": 0.24,
+        "utc_offset_seconds": offset,
+        "timezone": SITE["tz"],
+        "timezone_abbreviation": "GMT+3",
+        "elevation": 144.0,
+        "current_units": {
+            "time": "unixtime",
+            "interval": "seconds",
+            "temperature_2m": "°C",
+            "apparent_temperature": "°C",
+            "wind_speed_10m": "km/h",
+            "wind_direction_10m": "°",
+            "relative_humidity_2m": "%",
+            "weather_code": "wmo code",
+        },
+        "current": {
+            "time": times[10],
+            "interval": 900,
+            "temperature_2m": temp[10],
+            "apparent_temperature": round(temp[10] - 3.1, 1),
+            "wind_speed_10m": wind[10],
+            "wind_direction_10m": 200,
+            "relative_humidity_2m": 81,
+            "weather_code": 3,
+        },
+        "hourly_units": {
+            "time": "unixtime",
+            "temperature_2m": "°C",
+            "apparent_temperature": "°C",
+            "precipitation": "mm",
+            "relative_humidity_2m": "%",
+        },
+        "hourly": {
+            "time": times,
+            "temperature_2m": temp,
+            "apparent_temperature": [round(t - w / 5, 1) for t, w in zip(temp, wind)],
+            "precipitation": precip,
+            "relative_humidity_2m": [min(100, max(40, int(rnd.gauss(80, 8)))) for _ in range(hours)],
+        },
+        "daily_units": {
+            "time": "unixtime",
+            "weather_code": "wmo code",
+            "temperature_2m_max": "°C",
+            "temperature_2m_min": "°C",
+            "sunrise": "unixtime",
+            "sunset": "unixtime",
+            "precipitation_sum": "mm",
+            "wind_speed_10m_max": "km/h",
+        },
+        "daily": {
+            "time": [t0 + 86400 * i for i in range(days)],
+            "weather_code": [rnd.choice(codes) for _ in day_list],
+            "temperature_2m_max": [max(temp[d * 24:(d + 1) * 24]) for d in range(days)],
+            "temperature_2m_min": [min(temp[d * 24:(d + 1) * 24]) for d in range(days)],
+            "sunrise": [t0 + 86400 * i + 7 * 3600 + 60 * (30 + i % 30) for i in range(days)],
+            "sunset": [t0 + 86400 * i + 16 * 3600 + 60 * (20 - i % 20) for i in range(days)],
+            "precipitation_sum": [round(sum(precip[d * 24:(d + 1) * 24]), 1) for d in range(days)],
+            "wind_speed_10m_max": [max(wind[d * 24:(d + 1) * 24]) for d in range(days)],
+        },
+    }
+
+
+def synthetic_model_meta(now=None):
+    """meta.json модели Open-Meteo: прогон каждый час, доступен в начале часа"""
+    now = int(time.time() if now is None else now)
+    return {
+        "last_run_initialisation_time": now - now % 3600 - 3600,
+        "last_run_availability_time": now - now % 3600,
+        "update_interval_seconds": 3600,
+    }
+
+
+def synthetic_geocode(query):
+    base = {
+        "feature_code": "PPLC",
+        "admin1_id": 524894,
+        "population": 10381222,
+        "postcodes": ["101000", "101001"],
+    }
+    known = {
+        "moscow": [
+            ("Moscow", 55.75222, 37.61556, "RU", "Russia", "Moscow", "Europe/Moscow"),
+            ("Moscow", 46.73239, -117.00017, "US", "United States", "Idaho", "America/Los_Angeles"),
+            ("Moscow", 41.33675, -75.51852, "US", "United States", "Pennsylvania", "America/New_York"),
+        ],
+        "paris": [
+            ("Paris", 48.85341, 2.3488, "FR", "France", "Île-de-France", "Europe/Paris"),
+            ("Paris", 33.66094, -95.55551, "US", "United States", "Texas", "America/Chicago"),
+            ("Paris", 36.302, -88.32671, "US", "United States", "Tennessee", "America/Chicago"),
+        ],
+    }
+    results = []
+    for i, (name, lat, lon, cc, country, admin1, tz) in enumerate(known.get(query.lower(), [])):
+        results.append(
+            {
+                "id": 524901 + i,
+                "name": name,
+                "latitude": lat,
+                "longitude": lon,
+                "elevation": 144.0,
+                "country_code": cc,
+                "timezone": tz,
+                "country_id": 2017370 + i,
+                "country": country,
+                "admin1": admin1,
+                **base,
+            }
+        )
+    return {"results": results, "generationtime_ms": 0.5}
+
+
+# ----------------------- Подмена сети -----------------------
+class FixtureResponse:
+    def __init__(self, raw, status_code=200):
+        self.content = raw
+        self.status_code = status_code
+        self.headers = {"Content-Type": "application/json"}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class FixtureSession:
+    """Вместо requests.Session: отвечает записанными фикстурами"""
+
+    def __init__(self, days=7):
+        self.forecast = load_raw(forecast_fixture(days))
+        # Запросы только daily (сетка осадков) настоящий API отвечает без current и hourly
+        self.daily_forecast = json.dumps(
+            {k: v for k, v in json.loads(self.forecast).items() if k not in ("current", "hourly")}
+        ).encode()
+        self.geocode = {q.lower(): load_raw(geocode_fixture(q)) for q, _ in GEOCODE_QUERIES}
+        self.calls = 0
+
+    def get(self, url, params=None, **kwargs):
+        self.calls += 1
+        params = params or {}
+        if "ipapi.co" in url:
+            return FixtureResponse(json.dumps(IP_LOCATION).encode())
+        if url.endswith("/static/meta.json"):
+            return FixtureResponse(json.dumps(synthetic_model_meta()).encode())
+        if "geocoding" in url:
+            # Страница ищет «Moscow, Russia» - отвечаем по названию до запятой
+            name = str(params.get("name", "")).split(",")[0].strip().lower()
+            raw = self.geocode.get(name, b'{"results":[]}')
+            return FixtureResponse(raw)
+        forecast = self.forecast if "current" in params or "hourly" in params else self.daily_forecast
+        points = str(params.get("latitude", "")).count(",") + 1
+        if points > 1:
+            return FixtureResponse(b"[" + b",".join([forecast] * points) + b"]")
+        return FixtureResponse(forecast)
+
+
+# ----------------------- Замеры -----------------------
+def timeit(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def bench_cases():
+    """Имя замера -> (функция, число повторов по умолчанию)"""
+    from weather_core.ensemble import ensemble_stats
+    from weather_core.forecast import Forecast
+    from weather_core.labels import WEATHER_DESCRIPTIONS_EN, WEATHER_EMOJI, nice_time
+    from weather_core.transforms import daily_frame, format_times, hourly_frame, lttb_indices
+
+    cases = {}
+    for days in FORECAST_DAYS:
+        raw = load_raw(forecast_fixture(days))
+        data = json.loads(raw)
+        forecast = Forecast.from_json(data)
+        tz = forecast.timezone
+        hourly, daily = forecast.hourly, forecast.daily
+        cases[f"json_decode[{days}d]"] = (lambda raw=raw: json.loads(raw), 200)
+        cases[f"forecast_decode[{days}d]"] = (lambda raw=raw: Forecast.from_json(json.loads(raw)), 200)
+        cases[f"hourly_frame[{days}d]"] = (
+            lambda hourly=hourly, tz=tz: hourly_frame(hourly, tz, "en", temp_unit="Fahrenheit"),
+            50,
+        )
+        cases[f"daily_frame[{days}d]"] = (
+            lambda daily=daily, tz=tz: daily_frame(
+                daily, tz, "en", WEATHER_DESCRIPTIONS_EN, WEATHER_EMOJI, temp_unit="Fahrenheit"
+            ),
+            50,
+        )
+        cases[f"nice_time[{days}d]"] = (
+            lambda times=hourly["time"], tz=tz: [nice_time(t, tz, "en") for t in times],
+            20,
+        )
+        cases[f"format_times[{days}d]"] = (lambda times=hourly["time"], tz=tz: format_times(times, tz, "en"), 50)
+        # Три модели с разным шумом, у одной ряд на сутки короче - как у моделей с разной дальностью
+        members = [Forecast.from_json(synthetic_forecast(days, seed=seed)) for seed in (1, 2)]
+        members.append(Forecast.from_json(synthetic_forecast(max(1, days - 1), seed=3)))
+        cases[f"ensemble_stats[{days}d]"] = (lambda members=members: ensemble_stats(members), 200)
+    # Пять лет почасовой истории -> 1000 точек графика
+    hours = 5 * 365 * 24
+    times = [1_500_000_000 + 3600 * i for i in range(hours)]
+    temps = [10 + 10 * math.sin(i / 1400) + 4 * math.sin(i / 3.8) for i in range(hours)]
+    cases["lttb[5y]"] = (lambda: lttb_indices(times, temps, 1000), 20)
+    cases["precip_grid[cached]"] = (precip_grid_cached, 20)
+    runs = [Forecast.from_json(synthetic_forecast(7, seed=seed)) for seed in (1, 2)]
+    cases["alerts_update[1000 new]"] = (alerts_cycle(runs, 1000), 10)
+    cases["alerts_update[1000 same]"] = (alerts_cycle(runs[:1], 1000), 10)
+    cases["app_run[first]"] = (app_run_first, 3)
+    cases["app_run[rerun]"] = (app_run_rerun, 10)
+    return cases
+
+
+def precip_grid_cached():
+    """Сетка осадков вокруг места из закэшированных плиток (их загружает прогрев) и точки для карты"""
+    from weather_core import http_client
+    from weather_core.regional import heatmap_points, precip_grid
+
+    if not isinstance(http_client._session, FixtureSession):
+        http_client.set_session(FixtureSession())
+    heatmap_points(precip_grid(SITE["lat"], SITE["lon"]))
+
+
+def alerts_cycle(runs, locations):
+    """Цикл проверки предупреждений: каждый раз у всех мест следующий прогноз из runs по кругу"""
+    from weather_core.alerts import AlertEngine
+
+    engine = AlertEngine()
+    now = runs[0].hourly["time"][0]
+    cycle = [0]
+
+    def step():
+        forecast = runs[cycle[0] % len(runs)]
+        cycle[0] += 1
+        for n in range(locations):
+            engine.update(n, forecast, now)
+
+    return step
+
+
+def _app_test():
+    from streamlit.testing.v1 import AppTest
+
+    from weather_core import http_client, ratelimit
+    from weather_core.cache import MemoryCache, set_cache
+
+    http_client.set_session(FixtureSession())
+    set_cache(MemoryCache())
+    # Новая сессия - как новый процесс: с полными вёдрами квоты, иначе замер
+    # мерит ожидание ограничителя, а не страницу
+    ratelimit._buckets.clear()
+    return AppTest.from_file(str(ROOT / "app.py"), default_timeout=60)
+
+
+def app_run_first():
+    """Новая сессия с пустым кэшем: геокодинг, прогноз, все таблицы"""
+    at = _app_test()
+    at.run()
+    _check(at)
+
+
+_rerun_app = None
+
+
+def app_run_rerun():
+    """Повторный прогон той же сессии (клик по виджету): данные уже в кэше"""
+    global _rerun_app
+    if _rerun_app is None:
+        _rerun_app = _app_test()
+        _rerun_app.run()
+    _rerun_app.run()
+    _check(_rerun_app)
+
+
+def _check(at):
+    # Без текущих условий на странице замер ничего не говорит
+    if at.exception:
+        raise RuntimeError(f"app.py failed: {at.exception[0].value}")
+    if not at.metric:
+        raise RuntimeError("app.py rendered no forecast")
+
+
+def summarize(samples):
+    return {
+        "min_ms": round(min(samples) * 1000, 4),
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "runs": len(samples),
+    }
+
+
+def run(select=None, repeat=None):
+    results = {}
+    for name, (fn, default_repeat) in bench_cases().items():
+        if select and select not in name:
+            continue
+        results[name] = summarize(timeit(fn, repeat or default_repeat))
+    return results
+
+
+# ----------------------- История -----------------------
+def git_revision():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def load_history(path=HISTORY):
+    path = Path(path)
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def append_history(results, path=HISTORY):
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "results": results,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    return entry
+
+
+def regressions(previous, results, threshold):
+    """Замеры, чья медиана выросла больше чем на threshold (доля) относительно прошлого прогона"""
+    slower = {}
+    for name, r in results.items():
+        before = previous.get(name)
+        if before and before["median_ms"] > 0:
+            change = r["median_ms"] / before["median_ms"] - 1
+            if change > threshold:
+                slower[name] = change
+    return slower
+
+
+def report(results, previous, stream=sys.stdout):
+    width = max(map(len, results), default=0)
+    for name, r in results.items():
+        line = f"{name:<{width}}  median {r['median_ms']:9.3f} ms  min {r['min_ms']:9.3f} ms"
+        before = previous.get(name)
+        if before and before["median_ms"] > 0:
+            line += f"  {r['median_ms'] / before['median_ms'] - 1:+.0%}"
+        stream.write(line + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks on recorded Open-Meteo payloads")
+    parser.add_argument("command", nargs="?", choices=["run", "record"], default="run")
+    parser.add_argument("-k", dest="select", help="run only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, help="timed runs per benchmark (default: per benchmark)")
+    parser.add_argument("--history", default=str(HISTORY), help="JSONL file with previous results")
+    parser.add_argument("--no-save", action="store_true", help="do not append results to history")
+    parser.add_argument("--threshold", type=float, default=0.25, help="median slowdown counted as regression")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any benchmark regressed")
+    parser.add_argument("--synthetic", action="store_true", help="record: generate payloads instead of calling the API")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(synthetic=args.synthetic)
+        return 0
+
+    history = load_history(args.history)
+    previous = history[-1]["results"] if history else {}
+    results = run(args.select, args.repeat)
+    report(results, previous)
+    if not args.no_save:
+        append_history(results, args.history)
+    slower = regressions(previous, results, args.threshold)
+    for name, change in slower.items():
+        sys.stderr.write(f"regression: {name} is {change:.0%} slower than the previous run\n")
+    return 1 if args.check and slower else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
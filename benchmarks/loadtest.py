@@ -0,0 +1,275 @@
+"""Нагрузочный прогон: N одновременных сессий гоняют app.py через AppTest.
+
+Все сессии живут в одном процессе и делят кэш, пул соединений и фоновые
+потоки - как посетители одного экземпляра Streamlit. Каждая сессия делает
+первый прогон, а затем reruns перезапусков со случайными действиями: новый
+город, другие единицы, почасовой прогноз вкл/выкл. Внешние API заменяет
+заглушка (benchmarks/mock_server.py), запущенная здесь же, или внешняя,
+если задан --upstream.
+
+    python -m benchmarks.loadtest --sessions 20 --reruns 10 --latency 0.08
+    python -m benchmarks.loadtest --sessions 50 --upstream http://127.0.0.1:8099 --json
+
+Итог: задержка первого прогона и перезапусков (p50/p90/p95/p99/max),
+пропускная способность, ошибки, число запросов к внешним API по эндпоинтам,
+статистика кэша, single-flight и подстановки соседних точек.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock
+from urllib import parse
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+from .mock_server import MockServer, upstream_env
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+CITIES = (
+    "Moscow", "Paris", "London", "Berlin", "Madrid", "Rome", "Vienna", "Prague",
+    "Warsaw", "Kazan", "Novosibirsk", "Tokyo", "Seoul", "Lima", "Cairo", "Sydney",
+)
+# Модули и атрибуты weather_core, которые читаются из этих переменных при импорте
+URL_SETTINGS = {
+    "WEATHER_IP_API_URL": ("api", "IP_API_URL"),
+    "WEATHER_GEOCODING_URL": ("api", "GEOCODING_URL"),
+    "WEATHER_FORECAST_URL": ("api", "FORECAST_URL"),
+    "WEATHER_ARCHIVE_URL": ("archive", "ARCHIVE_URL"),
+    "WEATHER_MODEL_META_URL": ("freshness", "META_URL"),
+}
+
+
+def point_at(base_url):
+    """Направляет уже импортированное ядро на заглушку по адресу base_url"""
+    from importlib import import_module
+
+    for name, value in upstream_env(base_url).items():
+        module, attr = URL_SETTINGS[name]
+        setattr(import_module(f"weather_core.{module}"), attr, value)
+
+
+class SessionApp(AppTest):
+    """AppTest, который можно гонять из нескольких потоков сразу.
+
+    Обычный AppTest на каждый прогон подменяет глобальный Runtime и сбрасывает
+    его в конце, так что одновременные прогоны ломают друг другу окружение.
+    Здесь окружение ставится один раз на весь прогон нагрузки (shared_runtime),
+    а _run только запускает скрипт. Байткод скрипта, как и на настоящем
+    сервере, общий: AppTest компилирует app.py на каждый прогон, а
+    одновременная компиляция из разных потоков в CPython 3.11 иногда падает
+    с SystemError.
+    """
+
+    script_cache = ScriptCache()
+
+    def _run(self, widget_state=None, timeout=None):
+        runner = LocalScriptRunner(
+            self._script_path,
+            self.session_state,
+            PagesManager(self._script_path, setup_watcher=False),
+            args=self.args,
+            kwargs=self.kwargs,
+        )
+        runner._script_cache = self.script_cache
+        self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        self.query_params = parse.parse_qs(runner.event_data[-1]["client_state"].query_string)
+        return self
+
+
+@contextmanager
+def shared_runtime():
+    """Окружение Streamlit, общее для всех SessionApp (то, что AppTest ставит на каждый прогон)"""
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+    try:
+        with patch_config_options({"global.appTest": True}):
+            yield runtime
+    finally:
+        Runtime._instance = None
+
+
+def percentile(values, q):
+    """q-й перцентиль по ближайшему рангу; 0 для пустого списка"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def latency_summary(seconds):
+    summary = {f"p{q}_ms": round(percentile(seconds, q) * 1000, 1) for q in (50, 90, 95, 99)}
+    summary["max_ms"] = round(max(seconds, default=0.0) * 1000, 1)
+    summary["count"] = len(seconds)
+    return summary
+
+
+def simulate_session(n, cities, reruns, think=0.0, seed=0, timeout=60):
+    """Одна сессия: первый прогон и reruns перезапусков. -> (первый, [перезапуски], исключения, ошибки API)"""
+    rnd = random.Random(seed * 10007 + n)
+    at = SessionApp(APP, default_timeout=timeout)
+    t = time.perf_counter()
+    at.run()
+    first = time.perf_counter() - t
+    exceptions = len(at.exception)
+    api_errors = len(at.error)
+    rerun_times = []
+    for _ in range(reruns):
+        if think:
+            time.sleep(rnd.uniform(0, 2 * think))
+        action = rnd.random()
+        # Переключатель почасового прогноза есть, только если прогноз показан
+        hourly = [w for w in at.toggle if w.key == "show_hourly"]
+        if action < 0.6 or not at.sidebar.radio:
+            at.text_input(key="city_query").set_value(rnd.choice(cities))
+        elif action < 0.85 or not hourly:
+            units = at.sidebar.radio[1]
+            units.set_value(next(o for o in units.options if o != units.value))
+        else:
+            hourly[0].set_value(not hourly[0].value)
+        t = time.perf_counter()
+        at.run()
+        rerun_times.append(time.perf_counter() - t)
+        exceptions += len(at.exception)
+        api_errors += len(at.error)
+    return first, rerun_times, exceptions, api_errors
+
+
+def run(sessions=10, reruns=5, cities=CITIES, think=0.0, ramp=0.0, seed=0, upstream=None, **mock_settings):
+    """Гоняет нагрузку и возвращает отчёт (dict). Без upstream поднимает свою заглушку"""
+    from weather_core import http_client
+    from weather_core.cache import MemoryCache, get_cache, set_cache
+    from weather_core.singleflight import flight
+    from weather_core.spatial import forecast_points
+
+    # Сессии создаются вне потока скрипта, и Streamlit предупреждает об этом на каждую
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    server = None
+    if upstream is None:
+        server = MockServer(seed=seed, **mock_settings).start()
+        upstream = server.url
+    point_at(upstream)
+    set_cache(MemoryCache())
+    http_client.set_session(http_client.make_session(pool_size=max(http_client.POOL_SIZE, sessions)))
+    registry = http_client.registry
+    before = registry.counters()
+    flight_before = flight.stats()
+    if server is None:
+        http_client.get(f"{upstream}/stats", params={"reset": 1})
+
+    started = time.perf_counter()
+    try:
+        with shared_runtime(), ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="weather-load") as pool:
+            futures = []
+            for n in range(sessions):
+                futures.append(pool.submit(simulate_session, n, list(cities), reruns, think, seed))
+                if ramp:
+                    time.sleep(ramp / sessions)
+            results = [f.result() for f in futures]
+        wall = time.perf_counter() - started
+        upstream_stats = server.state.stats() if server else http_client.get(f"{upstream}/stats").json()
+    finally:
+        if server:
+            server.stop()
+
+    after = registry.counters()
+    firsts = [r[0] for r in results]
+    reruns_all = [t for r in results for t in r[1]]
+    flight_after = flight.stats()
+    return {
+        "sessions": sessions,
+        "reruns_per_session": reruns,
+        "wall_s": round(wall, 2),
+        "runs_per_s": round((len(firsts) + len(reruns_all)) / wall, 2) if wall else 0.0,
+        "first_run": latency_summary(firsts),
+        "rerun": latency_summary(reruns_all),
+        "exceptions": sum(r[2] for r in results),
+        "api_errors": sum(r[3] for r in results),
+        "upstream": upstream_stats,
+        "client_upstream_requests": after["upstream_requests"] - before["upstream_requests"],
+        "client_upstream_bytes": after["upstream_bytes"] - before["upstream_bytes"],
+        "cache": {
+            **get_cache().stats(),
+            **{k: after[f"cache_{k}"] - before[f"cache_{k}"] for k in ("hits", "stale", "misses")},
+        },
+        "singleflight": {k: flight_after[k] - flight_before[k] for k in ("executed", "collapsed")},
+        "spatial": forecast_points.stats(),
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{report['sessions']} sessions x {report['reruns_per_session']} reruns in {report['wall_s']} s "
+        f"({report['runs_per_s']} runs/s)",
+    ]
+    for name in ("first_run", "rerun"):
+        s = report[name]
+        lines.append(
+            f"{name:<9} p50 {s['p50_ms']:8.1f} ms  p90 {s['p90_ms']:8.1f}  p95 {s['p95_ms']:8.1f}  "
+            f"p99 {s['p99_ms']:8.1f}  max {s['max_ms']:8.1f}  (n={s['count']})"
+        )
+    lines.append(f"exceptions: {report['exceptions']}, API errors shown: {report['api_errors']}")
+    calls = ", ".join(f"{k}={v}" for k, v in sorted(report["upstream"]["calls"].items())) or "none"
+    errors = sum(report["upstream"]["errors"].values())
+    lines.append(f"upstream calls: {calls} (injected errors: {errors})")
+    lines.append(f"client: {report['client_upstream_requests']} requests, {report['client_upstream_bytes'] / 1024:.1f} KiB")
+    lines.append(f"cache: {report['cache']}, single-flight: {report['singleflight']}")
+    lines.append(f"nearby reuse: {report['spatial']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive concurrent app.py sessions against a mock upstream")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns per session after the first run")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a session's reruns, s")
+    parser.add_argument("--ramp", type=float, default=0.0, help="spread session starts over this many seconds")
+    parser.add_argument("--cities", help="comma-separated cities to search for")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--upstream", help="base URL of a running mock server (default: start one here)")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock: delay per upstream request, s")
+    parser.add_argument("--jitter", type=float, default=0.02, help="mock: +/- spread of the delay, s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock: share of 503 answers")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    mock_settings = {}
+    if args.upstream is None:
+        mock_settings = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate}
+    cities = [c.strip() for c in args.cities.split(",")] if args.cities else CITIES
+    report = run(
+        args.sessions,
+        args.reruns,
+        cities=cities,
+        think=args.think,
+        ramp=args.ramp,
+        seed=args.seed,
+        upstream=args.upstream,
+        **mock_settings,
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 1 if report["exceptions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
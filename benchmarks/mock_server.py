@@ -0,0 +1,258 @@
+"""Локальная заглушка для ipapi.co и Open-Meteo (геокодинг, прогноз и архив).
+
+Отвечает в формате настоящих API, с задержкой и долей ошибок по желанию, и
+считает запросы по эндпоинтам (GET /stats, сброс - GET /stats?reset=1).
+Геокодинг находит любое название: координаты выводятся из самого названия,
+так что одинаковые запросы дают одинаковые места. Прогнозы берутся из
+benchmarks/fixtures (на 1, 3, 7 или 16 дней - по forecast_days), архив -
+синтетический ряд с суточным и годовым ходом температуры. На запрос с
+models=... каждая модель отвечает своим синтетическим рядом. meta.json моделей
+говорит, что прогон выходит в начале каждого часа; прогноз отдаётся с ETag и
+на совпадающий If-None-Match отвечает 304.
+
+    python -m benchmarks.mock_server --port 8099 --latency 0.08 --error-rate 0.02
+
+Приложение направляется на заглушку переменными окружения:
+
+    WEATHER_IP_API_URL=http://127.0.0.1:8099
+    WEATHER_GEOCODING_URL=http://127.0.0.1:8099/v1/search
+    WEATHER_FORECAST_URL=http://127.0.0.1:8099/v1/forecast
+    WEATHER_ARCHIVE_URL=http://127.0.0.1:8099/v1/archive
+    WEATHER_MODEL_META_URL=http://127.0.0.1:8099/data/{model}/static/meta.json
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .bench import FORECAST_DAYS, IP_LOCATION, forecast_fixture, load_raw, synthetic_forecast, synthetic_model_meta
+
+
+class MockState:
+    """Настройки заглушки и счётчики запросов; меняются на лету"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.forecasts = {days: load_raw(forecast_fixture(days)) for days in FORECAST_DAYS}
+        # Ответ без current и hourly - для запросов только daily (сетка осадков)
+        self.daily_forecasts = {
+            days: json.dumps({k: v for k, v in json.loads(raw).items() if k not in ("current", "hourly")}).encode()
+            for days, raw in self.forecasts.items()
+        }
+        # Почасовые ряды отдельных моделей (запрос с models=...), строятся по первому запросу
+        self.model_forecasts = {}
+        self.calls = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            extra = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+            failed = self.random.random() < self.error_rate
+        time.sleep(max(0.0, self.latency + extra))
+        return failed
+
+    def count(self, endpoint, failed):
+        with self._lock:
+            self.calls[endpoint] += 1
+            if failed:
+                self.errors[endpoint] += 1
+
+    def stats(self, reset=False):
+        with self._lock:
+            stats = {"calls": dict(self.calls), "errors": dict(self.errors)}
+            if reset:
+                self.calls.clear()
+                self.errors.clear()
+        return stats
+
+    def forecast(self, days, daily_only=False):
+        forecasts = self.daily_forecasts if daily_only else self.forecasts
+        # Ближайший записанный прогноз не короче запрошенного
+        for n in FORECAST_DAYS:
+            if n >= days:
+                return forecasts[n]
+        return forecasts[FORECAST_DAYS[-1]]
+
+    def model_forecast(self, model, days):
+        """Почасовой прогноз одной модели: у каждой модели свой шум, так что модели расходятся"""
+        with self._lock:
+            body = self.model_forecasts.get((model, days))
+            if body is None:
+                data = synthetic_forecast(days, seed=zlib.crc32(model.encode()) % 1000)
+                data = {k: v for k, v in data.items() if k not in ("current", "current_units", "daily", "daily_units")}
+                body = self.model_forecasts[(model, days)] = json.dumps(data).encode()
+        return body
+
+
+def geocode_results(name):
+    """Ответ геокодера для любого названия: три места с детерминированными координатами"""
+    name = name.split(",")[0].strip()
+    if not name:
+        return {"generationtime_ms": 0.1}
+    seed = zlib.crc32(name.lower().encode())
+    countries = (("Russia", "Europe/Moscow"), ("France", "Europe/Paris"), ("United States", "America/New_York"))
+    results = []
+    for i, (country, tz) in enumerate(countries):
+        h = (seed >> (i * 7)) & 0xFFFF
+        results.append(
+            {
+                "id": seed + i,
+                "name": name.title(),
+                "latitude": round(-60 + (h % 12000) / 100, 5),
+                "longitude": round(-180 + (h * 7 % 36000) / 100, 5),
+                "country": country,
+                "admin1": f"Region {i + 1}",
+                "timezone": tz,
+            }
+        )
+    return {"results": results, "generationtime_ms": 0.4}
+
+
+def archive_results(query):
+    """Почасовой архив за start_date..end_date: время в секундах Unix, как при timeformat=unixtime"""
+    start = datetime.combine(date.fromisoformat(query["start_date"]), datetime.min.time(), timezone.utc)
+    end = datetime.combine(date.fromisoformat(query["end_date"]), datetime.min.time(), timezone.utc)
+    first = int(start.timestamp())
+    times = list(range(first, int(end.timestamp()) + 24 * 3600, 3600))
+    temps, precip = [], []
+    for t in times:
+        day = t / 86400
+        temps.append(round(8 - 12 * math.cos(2 * math.pi * (day - 15) / 365.25) - 4 * math.cos(2 * math.pi * day), 1))
+        precip.append(round(max(0.0, math.sin(day * 2.3) * math.sin(day * 0.7)) * 1.5, 1))
+    return {"hourly": {"time": times, "temperature_2m": temps, "precipitation": precip}}
+
+
+def upstream_env(base_url):
+    """Переменные окружения, которые направляют weather_core на заглушку по адресу base_url"""
+    return {
+        "WEATHER_IP_API_URL": base_url,
+        "WEATHER_GEOCODING_URL": f"{base_url}/v1/search",
+        "WEATHER_FORECAST_URL": f"{base_url}/v1/forecast",
+        "WEATHER_ARCHIVE_URL": f"{base_url}/v1/archive",
+        "WEATHER_MODEL_META_URL": f"{base_url}/data/{{model}}/static/meta.json",
+    }
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих API
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/stats":
+                return self.reply(200, json.dumps(state.stats(reset="reset" in query)).encode())
+            if url.path == "/v1/search":
+                endpoint = "geocode"
+            elif url.path == "/v1/forecast":
+                endpoint = "forecast"
+            elif url.path == "/v1/archive":
+                endpoint = "archive"
+            elif url.path.endswith("/json/"):
+                endpoint = "ip"
+            elif url.path.endswith("/static/meta.json"):
+                endpoint = "meta"
+            else:
+                return self.reply(404, b'{"error": true, "reason": "not found"}')
+
+            failed = state.delay()
+            state.count(endpoint, failed)
+            if failed:
+                return self.reply(503, b'{"error": true, "reason": "injected failure"}')
+            if endpoint == "ip":
+                body = json.dumps(IP_LOCATION).encode()
+            elif endpoint == "geocode":
+                body = json.dumps(geocode_results(query.get("name", ""))).encode()
+            elif endpoint == "archive":
+                body = json.dumps(archive_results(query)).encode()
+            elif endpoint == "meta":
+                body = json.dumps(synthetic_model_meta()).encode()
+            else:
+                days = int(query.get("forecast_days", 7))
+                if "models" in query:
+                    forecast = state.model_forecast(query["models"], days)
+                else:
+                    forecast = state.forecast(days, "current" not in query and "hourly" not in query)
+                points = query.get("latitude", "").count(",") + 1
+                body = forecast if points == 1 else b"[" + b",".join([forecast] * points) + b"]"
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    return self.reply(304, b"", etag=etag)
+                return self.reply(200, body, etag=etag)
+            self.reply(200, body)
+
+        def reply(self, status, body, etag=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class MockServer:
+    """Заглушка в фоновом потоке: with MockServer(latency=0.05) as server: server.url"""
+
+    def __init__(self, host="127.0.0.1", port=0, **settings):
+        self.state = MockState(**settings)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.state))
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="weather-mock", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for ipapi.co and the Open-Meteo APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="added delay per request, s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- spread of the delay, s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--seed", type=int, help="seed for latency jitter and injected errors")
+    args = parser.parse_args(argv)
+
+    server = MockServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    for name, value in upstream_env(server.url).items():
+        print(f"{name}={value}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Пропускная способность server.py: запросов в секунду на одном ядре.
+
+Поднимает заглушку внешних API (mock_server.py) и server.py отдельным
+процессом, привязанным к ядру --cpu (Linux), и гоняет по нему --connections
+постоянных соединений HTTP/1.1 в течение --duration секунд. Запросы - прогноз
+для --points мест вперемешку: часть с Accept-Encoding: gzip, часть условные
+(If-None-Match с прошлым ETag этого места). Генератор нагрузки - этот
+процесс; чтобы он не делил ядро с сервером, оставьте ему другие ядра.
+
+    python -m benchmarks.serverbench --duration 10 --connections 32
+    python -m benchmarks.serverbench --url http://127.0.0.1:8000   # уже запущенный сервер
+
+Итог: запросов в секунду, перцентили задержки, ответы по кодам, байт на
+ответ и запросы к внешним API за прогон (при своей заглушке).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from .loadtest import latency_summary
+from .mock_server import MockServer, upstream_env
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, upstream, cpu=None):
+    """server.py в отдельном процессе (на ядре cpu, если задано); ждёт, пока он начнёт принимать соединения"""
+    env = {**os.environ, **upstream_env(upstream)}
+    preexec = None
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        preexec = lambda: os.sched_setaffinity(0, {cpu})  # noqa: E731
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "server.py"), "--port", str(port)],
+        cwd=ROOT,
+        env=env,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=preexec,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("server.py did not start")
+
+
+async def _request(reader, writer, host, path, headers):
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}"] + [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    status = int(status_line.split()[1])
+    got = {}
+    for line in header_lines:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            got[k.strip().lower()] = v.strip()
+    length = int(got.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return status, got, len(head) + len(body)
+
+
+async def _connection(url, paths, deadline, gzip_share, conditional_share, rnd, out):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port)
+    etags = {}
+    try:
+        while time.monotonic() < deadline:
+            path = rnd.choice(paths)
+            headers = {}
+            if rnd.random() < gzip_share:
+                headers["Accept-Encoding"] = "gzip"
+            if path in etags and rnd.random() < conditional_share:
+                headers["If-None-Match"] = etags[path]
+            t = time.perf_counter()
+            status, got, nbytes = await _request(reader, writer, parts.netloc, path, headers)
+            out["latency"].append(time.perf_counter() - t)
+            out["status"][status] += 1
+            out["bytes"] += nbytes
+            if "etag" in got:
+                etags[path] = got["etag"]
+    finally:
+        writer.close()
+
+
+async def drive(url, paths, duration, connections, gzip_share=0.8, conditional_share=0.3, seed=0):
+    out = {"latency": [], "status": Counter(), "bytes": 0}
+    deadline = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _connection(url, paths, deadline, gzip_share, conditional_share, random.Random(seed * 1000 + n), out)
+            for n in range(connections)
+        )
+    )
+    out["wall"] = time.perf_counter() - started
+    return out
+
+
+def forecast_paths(points, seed=0):
+    """Пути /v1/forecast для points мест: разные координаты, язык и единицы"""
+    rnd = random.Random(seed)
+    paths = []
+    for _ in range(points):
+        query = {
+            "lat": round(rnd.uniform(-60, 70), 3),
+            "lon": round(rnd.uniform(-180, 180), 3),
+            "lang": rnd.choice(["en", "ru"]),
+            "units": rnd.choice(["metric", "imperial"]),
+        }
+        paths.append(f"/v1/forecast?{urlencode(query)}")
+    return paths
+
+
+def run(duration=10.0, connections=32, points=200, cpu=0, url=None, seed=0, warmup=True):
+    """Прогон нагрузки -> отчёт (dict). Без url поднимает заглушку и server.py сами"""
+    mock = proc = None
+    if url is None:
+        mock = MockServer(seed=seed).start()
+        port = free_port()
+        proc = start_server(port, mock.url, cpu)
+        url = f"http://127.0.0.1:{port}"
+    paths = forecast_paths(points, seed)
+    try:
+        if warmup:
+            # Первый запрос каждого места идёт во внешний API - в замер это не входит
+            asyncio.run(drive(url, paths, min(duration, 2.0), min(connections, points), seed=seed + 1))
+        if mock:
+            mock.state.stats(reset=True)
+        result = asyncio.run(drive(url, paths, duration, connections, seed=seed))
+        upstream = mock.state.stats()["calls"] if mock else None
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(5)
+        if mock:
+            mock.stop()
+    total = sum(result["status"].values())
+    return {
+        "connections": connections,
+        "points": points,
+        "cpu": cpu,
+        "wall_s": round(result["wall"], 2),
+        "requests": total,
+        "requests_per_s": round(total / result["wall"], 1) if result["wall"] else 0.0,
+        "latency": latency_summary(result["latency"]),
+        "status": {str(k): v for k, v in sorted(result["status"].items())},
+        "bytes_per_response": round(result["bytes"] / total) if total else 0,
+        "upstream": upstream,
+    }
+
+
+def format_report(report):
+    s = report["latency"]
+    statuses = ", ".join(f"{k}={v}" for k, v in report["status"].items())
+    return "\n".join(
+        [
+            f"{report['requests']} requests over {report['connections']} connections in {report['wall_s']} s: "
+            f"{report['requests_per_s']} req/s",
+            f"latency p50 {s['p50_ms']} ms  p90 {s['p90_ms']}  p99 {s['p99_ms']}  max {s['max_ms']}",
+            f"status: {statuses}, {report['bytes_per_response']} bytes per response",
+            f"upstream calls during the run: {report['upstream']}",
+        ]
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure server.py requests/s on one core")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--points", type=int, default=200, help="distinct forecast locations")
+    parser.add_argument("--cpu", type=int, default=0, help="core to pin server.py to (-1: no pinning)")
+    parser.add_argument("--url", help="base URL of a running server.py (default: start one here)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.duration,
+        args.connections,
+        args.points,
+        cpu=None if args.cpu < 0 else args.cpu,
+        url=args.url,
+        seed=args.seed,
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""HTTP API поверх weather_core: те же данные, что показывает страница, в JSON.
+
+    GET /v1/geocode?q=Paris&lang=en
+    GET /v1/forecast?lat=55.75&lon=37.62&lang=ru&units=imperial
+    GET /healthz
+    GET /metrics          счётчики в формате Prometheus (metrics.py)
+
+    python server.py --port 8000
+
+Сервер на Tornado (он ставится вместе со Streamlit): один поток событий, а
+блокирующие вызовы ядра (requests, SQLite) уходят в свой пул из
+WEATHER_API_CONCURRENCY потоков (общий пул fetcher.py остаётся фоновым
+обновлениям). Вызовов в пуле не больше, чем в нём потоков, так что внутри
+пула очереди нет: кто не дождался свободного потока за
+WEATHER_API_QUEUE_TIMEOUT секунд, получает 503. При кэше в памяти
+(MemoryCache) прогноз, который уже есть в кэше, берётся прямо в потоке
+событий через fetch_weather.lookup; с SQLite чтение - файловый ввод-вывод, и
+весь вызов уходит в пул.
+
+Готовый ответ (JSON и его gzip) запоминается вместе с версией данных, из
+которых построен (Forecast.version, у прочего - сами данные через ==): пока
+кэш ядра отдаёт тот же прогноз, повторный запрос не сериализуется и не
+сжимается заново, в том числе при SQLite-кэше, где каждое чтение - новый
+объект. ETag - хеш тела, на совпавший If-None-Match отвечаем 304;
+Cache-Control: max-age - сколько прогноз ещё свеж в кэше ядра. Кэш ядра
+общий со страницей и между процессами, если выбран SQLite
+(WEATHER_CACHE_BACKEND=sqlite, см. cache.py).
+
+Настройка через переменные окружения:
+    WEATHER_API_CONCURRENCY     потоков в пуле сервера (вызовов ядра одновременно)
+    WEATHER_API_QUEUE_TIMEOUT   сколько ждать места, с
+    WEATHER_API_RESPONSES       сколько готовых ответов помнить
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import sys
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import tornado.locks
+import tornado.web
+from tornado.util import TimeoutError as QueueTimeout
+
+from weather_core import freshness, refresher
+from weather_core.api import fetch_weather, geocode, round_coords
+from weather_core.cache import MISSING, MemoryCache, get_cache
+from weather_core.gazetteer import load_gazetteer
+from weather_core.labels import WEATHER_DESCRIPTIONS_EN, WEATHER_DESCRIPTIONS_RU, WEATHER_EMOJI, deg_to_compass
+from weather_core.metrics import registry
+from weather_core.ratelimit import RateLimited
+from weather_core.refresher import hot_locations
+from weather_core.units import convert_temp, convert_wind
+
+CONCURRENCY = int(os.getenv("WEATHER_API_CONCURRENCY", "32"))
+QUEUE_TIMEOUT = float(os.getenv("WEATHER_API_QUEUE_TIMEOUT", "5"))
+RESPONSES = int(os.getenv("WEATHER_API_RESPONSES", "2000"))
+# Меньше этого не сжимаем: заголовки gzip съедят выигрыш
+GZIP_MIN_BYTES = 1024
+
+UNITS = {"metric": "Celsius", "imperial": "Fahrenheit"}
+
+
+# ----------------------- Ответы -----------------------
+def _round(values, convert, temp_unit, digits=1):
+    return [None if v is None else round(convert(v, temp_unit), digits) for v in values]
+
+
+def forecast_payload(forecast, lang="en", units="metric", stale=False):
+    """Forecast -> словарь для JSON: подписи и единицы как на странице, ряды колонками.
+
+    Время - секунды Unix, как в кэше; timezone - пояс места для показа.
+    """
+    temp_unit = UNITS[units]
+    descriptions = WEATHER_DESCRIPTIONS_RU if lang == "ru" else WEATHER_DESCRIPTIONS_EN
+    data = forecast.to_json()
+    current, hourly, daily = data["current"], data["hourly"], data["daily"]
+    code = current.get("weather_code")
+    codes = daily.get("weather_code", [])
+    return {
+        "latitude": data["latitude"],
+        "longitude": data["longitude"],
+        "timezone": data["timezone"],
+        "units": {
+            "temperature": "°F" if temp_unit == "Fahrenheit" else "°C",
+            "wind_speed": "mph" if temp_unit == "Fahrenheit" else "km/h",
+            "precipitation": "mm",
+        },
+        "stale": stale,
+        "current": {
+            "time": current.get("time"),
+            "temperature": _round([current.get("temperature_2m")], convert_temp, temp_unit)[0],
+            "feels_like": _round([current.get("apparent_temperature")], convert_temp, temp_unit)[0],
+            "wind_speed": _round([current.get("wind_speed_10m")], convert_wind, temp_unit)[0],
+            "wind_direction": current.get("wind_direction_10m"),
+            "wind_compass": deg_to_compass(current.get("wind_direction_10m")),
+            "humidity": current.get("relative_humidity_2m"),
+            "weather_code": code,
+            "description": descriptions.get(code, "—"),
+            "emoji": WEATHER_EMOJI.get(code, "🌡️"),
+        },
+        "hourly": {
+            "time": hourly.get("time", []),
+            "temperature": _round(hourly.get("temperature_2m", []), convert_temp, temp_unit),
+            "feels_like": _round(hourly.get("apparent_temperature", []), convert_temp, temp_unit),
+            "humidity": hourly.get("relative_humidity_2m", []),
+            "precipitation": hourly.get("precipitation", []),
+        },
+        "daily": {
+            "time": daily.get("time", []),
+            "weather_code": codes,
+            "description": [descriptions.get(c, "—") for c in codes],
+            "emoji": [WEATHER_EMOJI.get(c, "🌡️") for c in codes],
+            "temperature_max": _round(daily.get("temperature_2m_max", []), convert_temp, temp_unit),
+            "temperature_min": _round(daily.get("temperature_2m_min", []), convert_temp, temp_unit),
+            "precipitation": daily.get("precipitation_sum", []),
+            "wind_speed_max": _round(daily.get("wind_speed_10m_max", []), convert_wind, temp_unit),
+            "sunrise": daily.get("sunrise", []),
+            "sunset": daily.get("sunset", []),
+        },
+    }
+
+
+# version - из чего построен (см. version_of), body - JSON в байтах,
+# gzipped - сжатый лениво при первом запросе с gzip
+Response = namedtuple("Response", "version body etag gzipped")
+
+
+def version_of(source):
+    """Метка данных для сравнения через ==: Forecast.version или сами данные
+    (список мест геокодера сравнивается по содержимому)"""
+    return getattr(source, "version", source)
+
+
+class ResponseCache:
+    """Готовые ответы по ключу запроса, LRU на limit записей.
+
+    Запись годится, пока версия source та же (version_of): новый ответ
+    API - новая версия, и тело строится заново. Работает в потоке событий,
+    блокировки не нужны.
+    """
+
+    def __init__(self, limit=RESPONSES):
+        self.limit = limit
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, source, build):
+        entry = self._entries.get(key)
+        version = version_of(source)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode()
+        entry = Response(version, body, f'"{zlib.crc32(body):08x}-{len(body):x}"', None)
+        self._put(key, entry)
+        return entry
+
+    def gzipped(self, key, entry):
+        if entry.gzipped is None:
+            compressed = entry._replace(gzipped=gzip.compress(entry.body, compresslevel=6))
+            # Пока сжимали, запись могли заменить более новым ответом - его не трогаем
+            if self._entries.get(key) is entry:
+                self._entries[key] = compressed
+            entry = compressed
+        return entry.gzipped
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.limit:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def lookup_forecast(lat, lon):
+    """Прогноз из кэша ядра без похода в API: (прогноз, устарел, сколько ещё свеж) или None"""
+    forecast = fetch_weather.lookup(lat, lon)
+    if forecast is MISSING:
+        return None
+    return forecast, False, fetch_weather.fresh_for(lat, lon) or 0
+
+
+def load_forecast(lat, lon):
+    """Прогноз после промаха lookup_forecast; stale - API недоступен, и ядро
+    отдало последний удачный ответ"""
+    forecast = fetch_weather.load(lat, lon)
+    if fetch_weather.expired(lat, lon):
+        return forecast, True, 0
+    return forecast, False, fetch_weather.fresh_for(lat, lon) or 0
+
+
+def get_forecast(lat, lon):
+    return lookup_forecast(lat, lon) or load_forecast(lat, lon)
+
+
+class ApiError(tornado.web.HTTPError):
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(status, reason=None)
+        self.message = message
+        self.retry_after = retry_after
+
+
+# ----------------------- Обработчики -----------------------
+class Handler(tornado.web.RequestHandler):
+    """Общее для эндпоинтов: вызовы ядра в пуле с ограничением, ответы в JSON"""
+
+    def initialize(self, service):
+        self.service = service
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+
+    def compute_etag(self):
+        # ETag готового ответа ставится в send(); хешировать тело на каждый запрос незачем
+        return None
+
+    def query(self, name, default=None):
+        value = self.get_query_argument(name, default)
+        if value is None:
+            raise ApiError(400, f"missing parameter: {name}")
+        return value
+
+    def choice(self, name, default, options):
+        value = self.query(name, default)
+        if value not in options:
+            raise ApiError(400, f"{name} must be one of: {', '.join(options)}")
+        return value
+
+    def number(self, name, low, high):
+        try:
+            value = float(self.query(name))
+        except ValueError:
+            raise ApiError(400, f"{name} must be a number")
+        if not low <= value <= high:  # NaN сюда тоже попадает
+            raise ApiError(400, f"{name} must be between {low} and {high}")
+        return value
+
+    async def call(self, fn, *args):
+        """fn(*args) в пуле сервера; ждёт свободный поток не дольше queue_timeout"""
+        try:
+            await self.service.limit.acquire(timeout=timedelta(seconds=self.service.queue_timeout))
+        except QueueTimeout:
+            self.service.rejected += 1
+            raise ApiError(503, "server is busy", retry_after=1)
+        try:
+            return await asyncio.wrap_future(self.service.executor.submit(fn, *args))
+        except RateLimited as e:
+            raise ApiError(429, str(e), retry_after=math.ceil(e.retry_after or 1))
+        except Exception as e:
+            raise ApiError(502, f"upstream failed: {e}")
+        finally:
+            self.service.limit.release()
+
+    def send(self, key, entry, max_age=0):
+        self.set_header("ETag", entry.etag)
+        self.set_header("Cache-Control", f"public, max-age={max(0, int(max_age))}")
+        self.set_header("Vary", "Accept-Encoding")
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        body = entry.body
+        if len(body) >= GZIP_MIN_BYTES and "gzip" in self.request.headers.get("Accept-Encoding", ""):
+            body = self.service.responses.gzipped(key, entry)
+            self.set_header("Content-Encoding", "gzip")
+        self.finish(body)
+
+    def write_error(self, status_code, **kwargs):
+        error = kwargs.get("exc_info", (None, None))[1]
+        message = getattr(error, "message", None) or self._reason
+        if getattr(error, "retry_after", None):
+            self.set_header("Retry-After", str(error.retry_after))
+        self.clear_header("Content-Encoding")
+        self.finish(json.dumps({"error": message}))
+
+    def on_finish(self):
+        registry.observe_http(self.endpoint, self.request.request_time())
+
+    endpoint = "other"
+
+
+class ForecastHandler(Handler):
+    endpoint = "forecast"
+
+    async def get(self):
+        lat = self.number("lat", -90, 90)
+        lon = self.number("lon", -180, 180)
+        lang = self.choice("lang", "en", ("en", "ru"))
+        units = self.choice("units", "metric", tuple(UNITS))
+        lat, lon = round_coords(lat, lon)
+        hot_locations.record(lat, lon)
+        if isinstance(get_cache(), MemoryCache):
+            # Кэш в памяти: прогноз из кэша - сразу, без пула
+            found = lookup_forecast(lat, lon) or await self.call(load_forecast, lat, lon)
+        else:
+            # SQLite и прочие читают файл - в цикле событий это остановило бы все соединения
+            found = await self.call(get_forecast, lat, lon)
+        forecast, stale, max_age = found
+        key = ("forecast", lat, lon, lang, units, stale)
+        entry = self.service.responses.get(key, forecast, lambda: forecast_payload(forecast, lang, units, stale))
+        self.send(key, entry, max_age)
+
+
+class GeocodeHandler(Handler):
+    endpoint = "geocode"
+
+    async def get(self):
+        q = self.query("q").strip()
+        lang = self.choice("lang", "en", ("en", "ru"))
+        if not q:
+            raise ApiError(400, "q must not be empty")
+        places = await self.call(geocode, q, lang)
+        key = ("geocode", q, lang)
+        entry = self.service.responses.get(key, places, lambda: {"results": places})
+        self.send(key, entry, 3600)
+
+
+class NotFoundHandler(Handler):
+    def prepare(self):
+        raise ApiError(404, "not found")
+
+
+class HealthHandler(Handler):
+    endpoint = "healthz"
+
+    def get(self):
+        self.finish({"ok": True, "responses": len(self.service.responses)})
+
+
+class MetricsHandler(Handler):
+    endpoint = "metrics"
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        s = self.service
+        lines = [
+            "# TYPE weather_api_responses_cached gauge",
+            f"weather_api_responses_cached {len(s.responses)}",
+            "# TYPE weather_api_response_hits_total counter",
+            f"weather_api_response_hits_total {s.responses.hits}",
+            "# TYPE weather_api_response_misses_total counter",
+            f"weather_api_response_misses_total {s.responses.misses}",
+            "# TYPE weather_api_rejected_total counter",
+            f"weather_api_rejected_total {s.rejected}",
+        ]
+        self.finish(registry.prometheus() + "\n".join(lines) + "\n")
+
+
+class Service:
+    """Общее для обработчиков одного процесса: пул для вызовов ядра и готовые ответы.
+
+    Семафор на столько же мест, сколько потоков в пуле: вызов либо сразу
+    получает поток, либо ждёт у семафора, где работает queue_timeout.
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, queue_timeout=QUEUE_TIMEOUT, responses=RESPONSES):
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix="weather-api")
+        self.limit = tornado.locks.Semaphore(concurrency)
+        self.queue_timeout = queue_timeout
+        self.responses = ResponseCache(responses)
+        self.rejected = 0
+
+
+def make_app(service=None):
+    service = service or Service()
+    kwargs = {"service": service}
+    return tornado.web.Application(
+        [
+            (r"/v1/forecast", ForecastHandler, kwargs),
+            (r"/v1/geocode", GeocodeHandler, kwargs),
+            (r"/healthz", HealthHandler, kwargs),
+            (r"/metrics", MetricsHandler, kwargs),
+        ],
+        default_handler_class=NotFoundHandler,
+        default_handler_args=kwargs,
+    )
+
+
+async def serve(port, host="127.0.0.1"):
+    # Справочник городов читается до первого запроса, а не в нём
+    load_gazetteer()
+    make_app().listen(port, host, xheaders=True)
+    # Популярные места (hot_locations) обновляются заранее, как для страницы
+    refresher.start(fetch_weather, geocode, poll=freshness.poll)
+    await asyncio.Event().wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON HTTP API over the weather core")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    sys.stderr.write(f"listening on http://{args.host}:{args.port}\n")
+    try:
+        asyncio.run(serve(args.port, args.host))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
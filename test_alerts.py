@@ -0,0 +1,154 @@
+import json
+import pickle
+import queue
+
+import pytest
+
+import alerts
+from weather_core import alerts as engine_module
+from weather_core.alerts import AlertEngine, FileSink, QueueSink, changed_hours, match_times
+from weather_core.forecast import Forecast
+
+T0 = 1_762_894_800  # 2025-11-12 00:00 в Москве
+NOW = T0
+
+
+def forecast(temps, rain=None, wind=None):
+    hours = len(temps)
+    return Forecast.from_json(
+        {
+            "hourly": {
+                "time": [T0 + 3600 * i for i in range(hours)],
+                "temperature_2m": temps,
+                "precipitation": rain or [0.0] * hours,
+            },
+            "daily": {"time": [T0], "precipitation_sum": [sum(rain or [0.0])], "wind_speed_10m_max": [wind or 10.0]},
+        }
+    )
+
+
+def by_rule(events):
+    return {(e["rule"], e["state"]): e for e in events}
+
+
+# ---------------------------
+# Сравнение прогнозов
+# ---------------------------
+def test_changed_hours_aligns_by_time():
+    import numpy as np
+
+    old_t = np.array([0, 3600, 7200])
+    old_v = np.array([1.0, np.nan, 3.0])
+    new_t = np.array([3600, 7200, 10800])
+    new_v = np.array([np.nan, 4.0, 5.0])
+    pos, known = match_times(old_t, new_t)
+    assert known.tolist() == [True, True, False]
+    # пропуск остался пропуском, 7200 изменился, 10800 новый
+    assert changed_hours(old_v, new_v, pos, known).tolist() == [False, True, True]
+    assert changed_hours(old_v[:0], new_v, *match_times(old_t[:0], new_t)).all()
+
+
+# ---------------------------
+# Движок
+# ---------------------------
+def test_raise_and_clear_only_changed_hours():
+    engine = AlertEngine()
+    events = engine.update("msk", forecast([1.0, -2.0, -3.5, 2.0], rain=[0, 8.0, 0, 0], wind=60.0), now=NOW)
+    got = by_rule(events)
+    assert got["frost", "raised"]["times"] == [T0 + 3600, T0 + 7200]
+    assert got["frost", "raised"]["peak"] == -3.5
+    assert got["heavy_rain", "raised"]["times"] == [T0 + 3600]
+    assert got["high_wind", "raised"]["times"] == [T0]
+    assert ("heavy_rain_day", "raised") not in got
+    assert engine.stats["hours_checked"] == 4 + 4 + 1 + 1
+
+    # Новый прогон: изменились два часа - только они и проверяются
+    events = engine.update("msk", forecast([1.0, -2.0, 0.5, -1.0], rain=[0, 8.0, 0, 0], wind=60.0), now=NOW)
+    got = by_rule(events)
+    assert set(got) == {("frost", "cleared"), ("frost", "raised")}
+    assert got["frost", "cleared"]["times"] == [T0 + 7200]
+    assert got["frost", "raised"]["times"] == [T0 + 10800]
+    assert engine.stats["hours_checked"] == 10 + 2
+    assert engine.active("msk") == {"frost": [T0 + 3600, T0 + 10800], "heavy_rain": [T0 + 3600], "high_wind": [T0]}
+
+
+def test_same_forecast_version_is_skipped():
+    engine = AlertEngine()
+    f = forecast([-1.0, -1.0])
+    assert engine.update("a", f, now=NOW)
+    assert engine.update("a", f, now=NOW) == []
+    # копия из SQLite-кэша - другой объект с той же меткой
+    assert engine.update("a", pickle.loads(pickle.dumps(f)), now=NOW) == []
+    assert engine.stats["unchanged"] == 2
+    # равный, но новый объект: сравнение есть, событий нет
+    assert engine.update("a", forecast([-1.0, -1.0]), now=NOW) == []
+    assert engine.stats["hours_checked"] == 2 + 2 + 1 + 1
+
+
+def test_past_hours_are_forgotten():
+    engine = AlertEngine()
+    engine.update("a", forecast([-1.0, -1.0, -1.0]), now=NOW)
+    # через два часа прошедшие часы пропадают без событий "cleared"
+    assert engine.update("a", forecast([-1.0, -1.0, -1.0, 5.0]), now=NOW + 2 * 3600) == []
+    assert engine.active("a") == {"frost": [T0 + 7200]}
+    engine.forget("a")
+    assert engine.active("a") == {} and len(engine) == 0
+
+
+def test_custom_rules():
+    rules = (engine_module.Rule("hot", "hourly", "temperature_2m", 30.0, True, 3600),)
+    events = AlertEngine(rules).update("a", forecast([29.0, 31.5]), now=NOW)
+    assert [(e["rule"], e["times"], e["peak"]) for e in events] == [("hot", [T0 + 3600], 31.5)]
+
+
+def test_check_many_locations(monkeypatch):
+    calls = []
+
+    def fake_batch(points):
+        calls.append(len(points))
+        if (99, 0) in points:
+            raise RuntimeError("upstream down")
+        return [forecast([lat, 5.0]) for lat, lon in points]
+
+    monkeypatch.setattr(engine_module, "fetch_weather_batch", fake_batch)
+    locations = [(f"loc{i}", (-1.0 if i % 2 else 1.0, 0.0)) for i in range(5)] + [("down", (99, 0))]
+    q = queue.Queue()
+    engine = AlertEngine()
+    events = engine.check(locations, QueueSink(q), chunk_size=2, now=NOW)
+    assert calls == [2, 2, 2]
+    # пачка с упавшей точкой пропускает цикл целиком
+    assert engine.stats["failed"] == 2 and len(engine) == 4
+    assert sorted(e["location"] for e in events) == ["loc1", "loc3"]
+    assert q.qsize() == 2
+
+
+# ---------------------------
+# Командная строка
+# ---------------------------
+def test_main_appends_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine_module, "fetch_weather_batch", lambda points: [forecast([-5.0] * 48) for _ in points])
+    monkeypatch.setattr(engine_module.time, "time", lambda: NOW)
+    src = tmp_path / "places.csv"
+    src.write_text("id,name,lat,lon\na,,1,2\nb,,3,4\n", encoding="utf-8")
+    out = tmp_path / "alerts.jsonl"
+    for _ in range(2):
+        assert alerts.main([str(src), "-o", str(out), "--cycles", "2", "--interval", "0"]) == 0
+    events = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    # каждый запуск начинает с чистого состояния, второй цикл ничего не добавляет
+    assert [(e["location"], e["rule"]) for e in events] == [("a", "frost"), ("b", "frost")] * 2
+    assert len(events[0]["times"]) == 48
+
+
+def test_file_sink_to_stdout(capsys):
+    sink = FileSink("-")
+    sink.emit([{"rule": "frost"}])
+    sink.close()
+    assert json.loads(capsys.readouterr().out) == {"rule": "frost"}
+
+
+def test_unknown_places_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr("batch.geocode", lambda query, lang: [])
+    src = tmp_path / "places.csv"
+    src.write_text("id,name\nx,Atlantis\n", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        alerts.main([str(src)])
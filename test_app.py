@@ -3,20 +3,22 @@ import pytest
 import pandas as pd
 from types import SimpleNamespace
 
-# Импортирую функции из моего приложения
-from app import (
+# Импортирую функции из ядра приложения: оно не тянет Streamlit и не ходит в сеть при импорте
+from weather_core import (
     get_location_from_ip,
     geocode,
     fetch_weather,
+    fetch_weather_batch,
     deg_to_compass,
     nice_time,
 )
 
-# Простой MockResponse для подмены requests.get
+# Простой MockResponse для подмены http_client.get
 class MockResponse:
     def __init__(self, json_data=None, status_code=200, raise_exc=False):
         self._json = json_data or {}
         self.status_code = status_code
+        self.headers = {}
         self._raise_exc = raise_exc
 
     def json(self):
@@ -36,9 +38,9 @@ def test_get_location_from_ip_success(monkeypatch):
         "latitude": 55.75,
         "longitude": 37.6167,
     }
-    def fake_get(url, timeout):
+    def fake_get(url, timeout=None):
         return MockResponse(json_data=sample, status_code=200)
-    monkeypatch.setattr("app.requests.get", fake_get)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
 
     loc = get_location_from_ip()
     assert loc["city"] == "Moscow"
@@ -47,9 +49,9 @@ def test_get_location_from_ip_success(monkeypatch):
     assert abs(loc["lon"] - 37.6167) < 1e-6
 
 def test_get_location_from_ip_error(monkeypatch):
-    def fake_get(url, timeout):
+    def fake_get(url, timeout=None):
         raise Exception("network error")
-    monkeypatch.setattr("app.requests.get", fake_get)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
 
     loc = get_location_from_ip()
     assert loc is None
@@ -71,42 +73,126 @@ def test_geocode_parsing(monkeypatch):
             }
         ]
     }
-    def fake_get(url, params, timeout):
+    def fake_get(url, params, timeout=None):
         # проверим, что query передан
         assert "name" in params
         return MockResponse(json_data=payload, status_code=200)
 
-    monkeypatch.setattr("app.requests.get", fake_get)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
     places = geocode("Moscow", "ru")
     assert isinstance(places, list)
 
 def test_geocode_empty_query():
     assert geocode("", "en") == []
 
+def test_geocode_prefers_local_gazetteer(monkeypatch):
+    local = [{"label": "Paris, France", "lat": 48.85, "lon": 2.35, "tz": "Europe/Paris"}]
+    gazetteer = SimpleNamespace(search=lambda q: local if q.startswith("Par") else [])
+    monkeypatch.setattr("weather_core.api.get_gazetteer", lambda: gazetteer)
+    def fake_get(url, params, timeout=None):
+        return MockResponse(json_data={"results": []}, status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
+
+    assert geocode("Paris", "en") == local
+    # промах в справочнике - идём в API
+    assert geocode("Zzyzx", "en") == []
+    # подписи в справочнике английские - на других языках спрашиваем API
+    assert geocode("Paris", "ru") == []
+
 # ---------------------------
 # fetch_weather тесты
 # ---------------------------
 def test_fetch_weather_success(monkeypatch):
     sample_weather = {"timezone": "UTC", "current": {"temperature_2m": 10}}
     captured = {}
-    def fake_get(url, params, timeout):
+    def fake_get(url, params, timeout=None):
         # проверим, что параметры содержат latitude/longitude
         assert "latitude" in params
         assert "longitude" in params
         captured['params'] = params
         return MockResponse(json_data=sample_weather, status_code=200)
-    monkeypatch.setattr("app.requests.get", fake_get)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
 
-    res = fetch_weather(55.75, 37.61, "Celsius")
-    assert res["current"]["temperature_2m"] == 10
-    assert captured['params']["temperature_unit"] in ("celsius", "fahrenheit")
+    res = fetch_weather(55.75, 37.61)
+    assert res.timezone == "UTC"
+    assert res.current["temperature_2m"] == 10
+    # прогноз всегда в метрических единицах, °F считаются при отрисовке
+    assert captured['params']["temperature_unit"] == "celsius"
+    assert captured['params']["wind_speed_unit"] == "kmh"
 
 def test_fetch_weather_http_error(monkeypatch):
-    def fake_get(url, params, timeout):
+    def fake_get(url, params, timeout=None):
         return MockResponse(json_data={}, status_code=500, raise_exc=True)
-    monkeypatch.setattr("app.requests.get", fake_get)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
     with pytest.raises(Exception):
-        fetch_weather(0, 0, "Celsius")
+        fetch_weather(0, 0)
+
+def test_fetch_weather_reuses_nearby_point(monkeypatch):
+    calls = []
+    def fake_get(url, params, timeout=None):
+        calls.append(params)
+        return MockResponse(json_data={"latitude": params["latitude"]}, status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
+
+    # две IP-локации в паре сотен метров - один запрос прогноза
+    assert fetch_weather(41.3851, 2.1734).latitude == 41.385
+    assert fetch_weather(41.3869, 2.1701).latitude == 41.385
+    assert len(calls) == 1
+    # и в пачке та же точка берётся из кэша
+    fetch_weather_batch([(41.3840, 2.1750)])
+    assert len(calls) == 1
+
+# ---------------------------
+# fetch_weather_batch тесты
+# ---------------------------
+def test_fetch_weather_batch_packs_points(monkeypatch):
+    calls = []
+    def fake_get(url, params, timeout=None, cost=1):
+        calls.append(params)
+        assert cost == len(params["latitude"].split(","))
+        lats = params["latitude"].split(",")
+        return MockResponse(json_data=[{"latitude": float(x)} for x in lats], status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
+
+    points = [(11.5, 1.0), (12.5, 2.0), (13.5, 3.0)]
+    res = fetch_weather_batch(points)
+    assert [r.latitude for r in res] == [11.5, 12.5, 13.5]
+    assert len(calls) == 1
+    assert calls[0]["longitude"] == "1.0,2.0,3.0"
+
+    # каждая точка закэширована отдельно: и для пачки, и для одиночного запроса
+    fetch_weather_batch(points[:2])
+    assert fetch_weather(13.5, 3.0).latitude == 13.5
+    assert len(calls) == 1
+
+def test_fetch_weather_batch_only_missing(monkeypatch):
+    def fake_single(url, params, timeout=None):
+        return MockResponse(json_data={"latitude": params["latitude"]}, status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_single)
+    fetch_weather(21.5, 1.0)
+
+    calls = []
+    def fake_get(url, params, timeout=None, cost=1):
+        calls.append(params)
+        # на одну точку API отвечает объектом, а не списком
+        return MockResponse(json_data={"latitude": float(params["latitude"])}, status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
+    res = fetch_weather_batch([(21.5, 1.0), (22.5, 2.0)])
+    assert [r.latitude for r in res] == [21.5, 22.5]
+    assert calls[0]["latitude"] == "22.5"
+
+def test_fetch_weather_batch_dedupes_points(monkeypatch):
+    calls = []
+    def fake_get(url, params, timeout=None, cost=1):
+        calls.append(params)
+        lats = params["latitude"].split(",")
+        return MockResponse(json_data=[{"latitude": float(x)} for x in lats], status_code=200)
+    monkeypatch.setattr("weather_core.api.http_client.get", fake_get)
+
+    res = fetch_weather_batch([(31.5, 1.0), (32.5, 2.0), (31.5, 1.0)])
+    assert calls[0]["latitude"] == "31.5,32.5"
+    assert [r.latitude for r in res] == [31.5, 32.5, 31.5]
+    assert res[0] is res[2]
 
 # ---------------------------
 # deg_to_compass тесты
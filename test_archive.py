@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+
+import pytest
+
+from benchmarks.mock_server import MockServer
+from weather_core import archive
+
+
+@pytest.fixture
+def server(monkeypatch):
+    with MockServer() as server:
+        monkeypatch.setattr(archive, "ARCHIVE_URL", f"{server.url}/v1/archive")
+        yield server
+
+
+def archive_calls(server):
+    return server.state.stats(reset=True)["calls"].get("archive", 0)
+
+
+# ---------------------------
+# Диапазоны дат
+# ---------------------------
+def test_split_range():
+    chunks = archive.split_range(date(2020, 1, 1), date(2020, 1, 10), days=4)
+    assert chunks == [
+        (date(2020, 1, 1), date(2020, 1, 4)),
+        (date(2020, 1, 5), date(2020, 1, 8)),
+        (date(2020, 1, 9), date(2020, 1, 10)),
+    ]
+    assert archive.split_range(date(2020, 1, 2), date(2020, 1, 1)) == []
+
+
+def test_missing_ranges(server, tmp_path):
+    path = archive.archive_path(55.75, 37.62, tmp_path)
+    assert archive.missing_ranges(None, date(2020, 1, 1), date(2020, 2, 1)) == [(date(2020, 1, 1), date(2020, 2, 1))]
+    archive.update_archive(55.75, 37.62, date(2020, 3, 1), date(2020, 3, 31), tmp_path)
+    table = archive.read_archive(path)
+    # внутри сохранённого - ничего, снаружи - только края
+    assert archive.missing_ranges(table, date(2020, 3, 5), date(2020, 3, 20)) == []
+    assert archive.missing_ranges(table, date(2020, 2, 1), date(2020, 4, 10)) == [
+        (date(2020, 2, 1), date(2020, 2, 29)),
+        (date(2020, 4, 1), date(2020, 4, 10)),
+    ]
+    # не соприкасается с файлом - догружаем и промежуток, иначе в файле будет дыра
+    assert archive.missing_ranges(table, date(2019, 1, 1), date(2019, 1, 31)) == [(date(2019, 1, 1), date(2020, 2, 29))]
+    assert archive.missing_ranges(table, date(2020, 6, 1), date(2020, 6, 30)) == [(date(2020, 4, 1), date(2020, 6, 30))]
+
+
+def test_history_stays_contiguous(server, tmp_path):
+    archive.update_archive(55.75, 37.62, date(2020, 3, 1), date(2020, 3, 31), tmp_path)
+    archive.update_archive(55.75, 37.62, date(2020, 1, 1), date(2020, 1, 10), tmp_path)
+    table = archive.read_archive(archive.archive_path(55.75, 37.62, tmp_path))
+    assert table.num_rows == (31 + 29 + 31) * 24
+    archive_calls(server)
+    assert archive.load_history(55.75, 37.62, date(2020, 1, 1), date(2020, 3, 31), root=tmp_path).num_rows == 91 * 24
+    assert archive_calls(server) == 0
+
+
+# ---------------------------
+# load_history тесты
+# ---------------------------
+def test_load_history_fetches_only_missing(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "CHUNK_DAYS", 100)
+    start, end = date(2021, 1, 1), date(2021, 12, 31)
+    table = archive.load_history(55.75, 37.62, start, end, root=tmp_path)
+    assert table.num_rows == 365 * 24
+    assert table.column_names == ["time", "temperature_2m", "precipitation"]
+    assert archive_calls(server) == 4  # 365 дней кусками по 100
+
+    # всё уже на диске
+    again = archive.load_history(55.75, 37.62, start, end, root=tmp_path)
+    assert again.equals(table)
+    assert archive_calls(server) == 0
+
+    # год назад - догружается только он
+    longer = archive.load_history(55.75, 37.62, date(2020, 1, 1), end, root=tmp_path)
+    assert longer.num_rows == (366 + 365) * 24
+    assert archive_calls(server) == 4
+    assert longer["time"].to_pylist() == sorted(longer["time"].to_pylist())
+
+    # соседняя точка в пределах сотых градуса - тот же файл
+    assert archive.archive_path(55.751, 37.618, tmp_path) == archive.archive_path(55.75, 37.62, tmp_path)
+
+
+def test_empty_tail_is_trimmed_and_refetched(tmp_path, monkeypatch):
+    class Resp:
+        def __init__(self, data):
+            self._data = data
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self._data
+
+    calls = []
+
+    def fake_get(url, params=None, **kwargs):
+        calls.append(params)
+        first = archive._timestamp(date.fromisoformat(params["start_date"]))
+        hours = ((date.fromisoformat(params["end_date"]) - date.fromisoformat(params["start_date"])).days + 1) * 24
+        times = [first + 3600 * i for i in range(hours)]
+        # последние полтора дня архив ещё не готов
+        temps = [1.0 if t < archive._timestamp(date(2022, 1, 9)) + 12 * 3600 else None for t in times]
+        return Resp({"hourly": {"time": times, "temperature_2m": temps, "precipitation": [0.0] * hours}})
+
+    monkeypatch.setattr("weather_core.archive.http_client.get", fake_get)
+    table = archive.load_history(1, 2, date(2022, 1, 1), date(2022, 1, 10), root=tmp_path)
+    assert table.num_rows == 8 * 24 + 12
+    # неполный последний день запрашивается заново, с него же
+    archive.load_history(1, 2, date(2022, 1, 1), date(2022, 1, 10), root=tmp_path)
+    assert calls[-1]["start_date"] == "2022-01-09"
+    assert len(calls) == 2
+
+
+def test_load_history_defaults_to_archive_lag(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "LAG_DAYS", 3)
+    start = date.today() - timedelta(days=10)
+    table = archive.load_history(10, 20, start, root=tmp_path)
+    assert table.num_rows == 8 * 24
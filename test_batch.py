@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import batch
+from weather_core.forecast import Forecast
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    calls = []
+
+    def fake_batch(points):
+        calls.append(list(points))
+        return [
+            Forecast.from_json(
+                {
+                    "timezone": "UTC",
+                    "current": {"time": 1762941600, "temperature_2m": lat},
+                    "hourly": {"time": [1762905600], "temperature_2m": [lon]},
+                    "daily": {"time": [1762905600], "sunrise": [1762932600], "precipitation_sum": [1.5]},
+                }
+            )
+            for lat, lon in points
+        ]
+
+    def fake_geocode(query, lang):
+        if query == "Atlantis":
+            return []
+        return [{"label": f"{query}, Somewhere", "lat": 10.0, "lon": 20.0, "tz": "UTC"}]
+
+    monkeypatch.setattr(batch, "fetch_weather_batch", fake_batch)
+    monkeypatch.setattr(batch, "geocode", fake_geocode)
+    return calls
+
+
+def test_main_csv_to_jsonl(tmp_path, fake_upstream):
+    src = tmp_path / "places.csv"
+    src.write_text("id,name,lat,lon\na,Paris,,\nb,,1.5,2.5\nc,Atlantis,,\n", encoding="utf-8")
+    out = tmp_path / "out.jsonl"
+
+    code = batch.main([str(src), "-o", str(out), "--chunk-size", "2", "--concurrency", "2"])
+
+    records = sorted((json.loads(x) for x in out.read_text(encoding="utf-8").splitlines()), key=lambda r: r["row"])
+    assert [r["id"] for r in records] == ["a", "b", "c"]
+    assert records[0]["label"] == "Paris, Somewhere"
+    assert records[1]["current"]["temperature_2m"] == 1.5
+    assert "not found" in records[2]["error"]
+    assert code == 1  # были ошибки
+    # пачки по 2 строки: в первой две точки, во второй - ни одной найденной
+    assert sorted(len(c) for c in fake_upstream) == [0, 2]
+
+
+def test_jsonl_input(tmp_path, fake_upstream):
+    src = tmp_path / "places.jsonl"
+    src.write_text('{"name": "Paris"}\n\n{"lat": 1, "lon": 2}\n', encoding="utf-8")
+    rows = list(batch.read_locations(str(src)))
+    assert len(rows) == 2
+    out = tmp_path / "out.jsonl"
+    writer = batch.JSONLWriter(str(out))
+    progress = batch.run(rows, writer, concurrency=1, chunk_size=10)
+    writer.close()
+    assert progress.done == 2
+    assert progress.errors == 0
+
+
+def test_parquet_output(tmp_path, fake_upstream):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = tmp_path / "out.parquet"
+    writer = batch.open_writer(str(out), None)
+    batch.run([{"lat": "1", "lon": "2"}, {"name": "Atlantis"}], writer, concurrency=1, chunk_size=1)
+    writer.close()
+
+    table = pq.read_table(out).to_pydict()
+    assert sorted(table["row"]) == [0, 1]
+    i = table["row"].index(0)
+    assert table["current_temperature_2m"][i] == 1.0
+    assert table["daily_precipitation_sum"][i] == [1.5]
+    assert table["daily_sunrise"][i] == [1762932600]
+    assert table["current_time"][i] == 1762941600
+    assert table["error"][1 - i].startswith("place not found")
+
+
+def test_chunks():
+    assert list(batch.chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from benchmarks import bench
+from weather_core.api import FORECAST_URL, forecast_params
+
+
+@pytest.mark.parametrize("days", bench.FORECAST_DAYS)
+def test_forecast_fixtures_match_request(days):
+    data = json.loads(bench.load_raw(bench.forecast_fixture(days)))
+    params = forecast_params()
+    for section in ("current", "hourly", "daily"):
+        assert set(params[section]) <= set(data[section])
+    assert len(data["hourly"]["time"]) == days * 24
+    assert len(data["daily"]["time"]) == days
+
+
+def test_fixture_session_serves_batches():
+    session = bench.FixtureSession(days=1)
+    single = session.get(FORECAST_URL, params={"latitude": 1.0, "longitude": 2.0})
+    assert isinstance(single.json(), dict)
+    many = session.get(FORECAST_URL, params={"latitude": "1,2,3", "longitude": "4,5,6"})
+    assert len(many.json()) == 3
+    found = session.get("https://geocoding-api.open-meteo.com/v1/search", params={"name": "Paris"})
+    assert found.json()["results"][0]["country"] == "France"
+
+
+def test_run_selected_cases():
+    results = bench.run(select="[1d]", repeat=1)
+    cases = (
+        "json_decode", "forecast_decode", "hourly_frame", "daily_frame", "nice_time", "format_times", "ensemble_stats"
+    )
+    assert set(results) == {f"{case}[1d]" for case in cases}
+    assert all(r["runs"] == 1 and r["median_ms"] >= 0 for r in results.values())
+
+
+def test_history_and_regressions(tmp_path):
+    path = tmp_path / "history.jsonl"
+    bench.append_history({"a": {"median_ms": 1.0}}, path)
+    bench.append_history({"a": {"median_ms": 2.0}}, path)
+    history = bench.load_history(path)
+    assert [h["results"]["a"]["median_ms"] for h in history] == [1.0, 2.0]
+    previous = history[0]["results"]
+    assert bench.regressions(previous, {"a": {"median_ms": 1.2}}, threshold=0.25) == {}
+    assert bench.regressions(previous, {"a": {"median_ms": 1.5}, "new": {"median_ms": 9.0}}, threshold=0.25) == {
+        "a": pytest.approx(0.5)
+    }
@@ -0,0 +1,243 @@
+import pytest
+
+from weather_core import cache
+from weather_core.cache import MISSING, MemoryCache, SQLiteCache, cached
+
+
+# Управляемые часы, чтобы проверять TTL без sleep
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+# ---------------------------
+# MemoryCache тесты
+# ---------------------------
+def test_memory_cache_ttl(clock):
+    c = MemoryCache(max_entries=10)
+    c.set("a", 1, ttl=10)
+    assert c.get("a") == 1
+    clock[0] += 11
+    assert c.get("a") is MISSING
+    assert c.stats()["hits"] == 1
+    assert c.stats()["misses"] == 1
+
+
+def test_memory_cache_lru_eviction():
+    c = MemoryCache(max_entries=2)
+    c.set("a", 1, ttl=60)
+    c.set("b", 2, ttl=60)
+    c.get("a")  # "a" становится самым свежим
+    c.set("c", 3, ttl=60)
+    assert c.get("b") is MISSING
+    assert c.get("a") == 1
+    assert c.stats()["evictions"] == 1
+
+
+# ---------------------------
+# SQLiteCache тесты
+# ---------------------------
+def test_sqlite_cache_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = SQLiteCache(path, max_entries=10)
+    first.set("forecast:(1, 2)", {"temp": 10}, ttl=60)
+    # второй экземпляр - как другой воркер или перезапуск
+    second = SQLiteCache(path, max_entries=10)
+    assert second.get("forecast:(1, 2)") == {"temp": 10}
+    assert second.get("nope") is MISSING
+
+
+def test_sqlite_cache_ttl_and_lru(tmp_path, clock):
+    c = SQLiteCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    c.set("a", 1, ttl=10)
+    clock[0] += 1
+    c.set("b", 2, ttl=100)
+    clock[0] += 1
+    c.set("c", 3, ttl=100)
+    assert c.get("a") is MISSING  # вытеснена как самая старая
+    clock[0] += 200
+    assert c.get("b") is MISSING  # истёк TTL
+    assert c.stats()["evictions"] == 1
+
+
+def test_sqlite_cache_warm(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path).set("a", [1, 2, 3], ttl=60)
+    warm = SQLiteCache(path, warm=True)
+    assert warm._front.get("a") == [1, 2, 3]
+
+
+def test_sqlite_cache_warm_sees_other_workers(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    worker = SQLiteCache(path, warm=True, front_ttl=30)
+    other = SQLiteCache(path)
+    worker.set("a", "old", ttl=3600)
+    other.set("a", "new", ttl=3600)
+    assert worker.get("a") == "old"  # копия в памяти ещё действует
+    clock[0] += 31
+    assert worker.get("a") == "new"
+
+
+# ---------------------------
+# декоратор cached
+# ---------------------------
+def test_cached_decorator(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+
+    @cached("square", ttl=60)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert square(3) == 9
+    assert square(3) == 9
+    assert calls == [3]
+    assert square.cache_key(3) == "square:(3,):[]"
+
+
+def test_cached_does_not_store_errors(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+
+    @cached("boom", ttl=60)
+    def boom():
+        calls.append(1)
+        raise RuntimeError("upstream down")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            boom()
+    assert len(calls) == 2
+
+
+# ---------------------------
+# stale-while-revalidate
+# ---------------------------
+def _wait_background_refresh():
+    for future in list(cache._refreshing.values()):
+        future.result(timeout=5)
+
+
+def test_cached_serves_stale_and_refreshes(monkeypatch, clock):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    version = [1]
+
+    @cached("swr", ttl=10, stale_ttl=20)
+    def forecast(lat):
+        return f"v{version[0]}"
+
+    assert forecast(1) == "v1"
+    version[0] = 2
+    clock[0] += 15  # ttl прошёл, но запись ещё в окне stale_ttl
+    assert forecast(1) == "v1"  # отдаём сразу старое...
+    _wait_background_refresh()
+    assert forecast(1) == "v2"  # ...а в кэше уже новое
+    assert forecast.age(1) == 0
+
+    clock[0] += 31  # вышли за ttl + stale_ttl - обычный промах
+    version[0] = 3
+    assert forecast.lookup(1) is MISSING
+    assert forecast(1) == "v3"
+
+
+def test_cached_store_and_lookup(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+
+    @cached("manual", ttl=60)
+    def forecast(lat, lon):
+        raise AssertionError("не должно вызываться")
+
+    assert forecast.lookup(1.0, 2.0) is MISSING
+    forecast.store({"t": 5}, 1.0, 2.0)
+    assert forecast(1.0, 2.0) == {"t": 5}
+
+
+def test_cached_counts_lookups_not_reads(monkeypatch, clock):
+    backend = MemoryCache()
+    monkeypatch.setattr(cache, "_cache", backend)
+    monkeypatch.setattr(cache, "lookups", cache.LookupStats())
+
+    @cached("counted", ttl=10, stale_ttl=5, fallback_ttl=100)
+    def forecast(lat):
+        return "v"
+
+    forecast(1)  # промах: один, хотя кэш читается и перед записью
+    forecast(1)
+    forecast.age(1), forecast.fresh_for(1), forecast.expired(1)  # служебные чтения не считаются
+    clock[0] += 12
+    forecast(1)  # устаревшее, обновляется в фоне
+    _wait_background_refresh()
+    clock[0] += 50
+    assert forecast.lookup(1) is MISSING  # только на случай отказа API - это промах
+    assert cache.lookups.by_namespace() == {"counted": {"hit": 1, "stale": 1, "miss": 2}}
+    assert cache.cache_stats()["misses"] == 2
+    assert backend.stats()["hits"] == backend.stats()["misses"] == 0
+
+
+# ---------------------------
+# последний удачный ответ при отказе API
+# ---------------------------
+def test_cached_falls_back_to_last_good(monkeypatch, clock):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    state = {"down": False}
+
+    @cached("fallback", ttl=10, stale_ttl=5, fallback_ttl=100)
+    def forecast(lat):
+        if state["down"]:
+            raise RuntimeError("429 Too Many Requests")
+        return "good"
+
+    assert forecast(1) == "good"
+    state["down"] = True
+    clock[0] += 50  # за пределами ttl + stale_ttl: обычный промах, но API лежит
+    assert forecast.lookup(1) is MISSING
+    assert forecast(1) == "good"
+    assert forecast.age(1) == 50  # по возрасту видно, что данные старые
+    clock[0] += 100  # fallback_ttl тоже вышел - отдавать нечего
+    with pytest.raises(RuntimeError):
+        forecast(1)
+
+
+# ---------------------------
+# свежесть по expires и перепроверка через revalidate
+# ---------------------------
+def test_cached_expires_and_revalidate(monkeypatch, clock):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+    checks = []
+
+    def revalidate(value, fetched_at, lat):
+        checks.append((value, fetched_at))
+        return value if lat == 1 else "new"
+
+    def expires(value, fetched_at):
+        return fetched_at + 100
+
+    @cached("runs", ttl=10, stale_ttl=5, fallback_ttl=1000, expires=expires, revalidate=revalidate)
+    def forecast(lat):
+        calls.append(lat)
+        return "v1"
+
+    start = clock[0]
+    assert forecast(1) == "v1"
+    clock[0] += 50  # ttl давно прошёл, но expires держит запись
+    assert forecast(1) == "v1"
+    assert forecast.fresh_for(1) == 50
+    assert calls == [1] and checks == []
+
+    clock[0] += 60  # свежесть и stale_ttl вышли: вместо функции - revalidate
+    assert forecast.lookup(1) is MISSING
+    assert forecast.expired(1)
+    assert forecast(1) == "v1"
+    assert checks == [("v1", start)]
+    assert calls == [1]
+    assert forecast.age(1) == 0  # данные подтверждены - запись продлена
+    assert forecast.fresh_for(1) == 100
+
+    forecast(2)
+    clock[0] += 200
+    assert forecast(2) == "new"
+    assert calls == [1, 2]
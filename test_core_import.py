@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+# Сколько секунд может занимать импорт ядра в свежем интерпретаторе
+IMPORT_BUDGET = float(os.getenv("WEATHER_IMPORT_BUDGET", "1.0"))
+HEAVY = ("pandas", "pydeck", "streamlit", "numpy")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _import_in_fresh_interpreter(statement):
+    code = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - t)\n"
+        f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    seconds, heavy = out.stdout.splitlines()
+    return float(seconds), heavy
+
+
+def test_package_import_loads_nothing_heavy():
+    seconds, heavy = _import_in_fresh_interpreter("import weather_core")
+    assert heavy == ""
+    assert seconds < IMPORT_BUDGET
+
+
+def test_core_functions_import_budget():
+    seconds, heavy = _import_in_fresh_interpreter(
+        "from weather_core import geocode, fetch_weather, deg_to_compass, nice_time, WEATHER_EMOJI"
+    )
+    assert heavy == ""
+    assert seconds < IMPORT_BUDGET
+
+
+def test_lazy_exports_resolve():
+    import weather_core
+    from weather_core import labels
+
+    assert weather_core.WEATHER_EMOJI is labels.WEATHER_EMOJI
+    assert "fetch_weather" in dir(weather_core)
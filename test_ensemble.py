@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.mock_server import MockServer
+from weather_core import api, cache, ensemble
+from weather_core.cache import MemoryCache
+from weather_core.forecast import Forecast
+
+
+def member(start, temps):
+    return Forecast.from_json(
+        {"hourly": {"time": [start + 3600 * i for i in range(len(temps))], "temperature_2m": temps}}
+    )
+
+
+# ---------------------------
+# Выравнивание и статистика
+# ---------------------------
+def test_align_on_common_axis():
+    t0 = 1_762_894_800
+    axis, matrix = ensemble.align([member(t0, [1.0, 2.0, 3.0]), member(t0 + 3600, [5.0, None, 7.0, 8.0])])
+    assert (axis - t0).tolist() == [0, 3600, 7200, 10800, 14400]
+    assert matrix.dtype == np.float32
+    assert np.isnan(matrix[0, 3:]).all() and np.isnan(matrix[1, [0, 2]]).all()
+    assert matrix[1, 1] == 5.0
+
+
+def test_ensemble_stats():
+    t0 = 1_762_894_800
+    members = [member(t0, [1.0, 2.0, None]), member(t0, [3.0, 6.0, None]), member(t0 + 3600, [5.0])]
+    stats = ensemble.ensemble_stats(members)
+    # третий час не дала ни одна модель - его нет
+    assert (stats["time"] - t0).tolist() == [0, 3600]
+    assert stats["count"].tolist() == [2, 3]
+    assert stats["mean"].tolist() == [2.0, pytest.approx(13 / 3)]
+    assert stats["min"].tolist() == [1.0, 2.0]
+    assert stats["max"].tolist() == [3.0, 6.0]
+    assert stats["spread"].tolist() == [2.0, 4.0]
+
+
+def test_ensemble_stats_without_data():
+    stats = ensemble.ensemble_stats([Forecast(), member(0, [])])
+    assert all(len(v) == 0 for v in stats.values())
+
+
+def test_ensemble_frame_for_today():
+    from weather_core.transforms import ensemble_frame
+
+    midnight = 1762894800  # 2025-11-12 00:00 в Москве
+    stats = ensemble.ensemble_stats([member(midnight - 3600, [0.0, 0.0, 10.0]), member(midnight, [10.0, 0.0])])
+    edf = ensemble_frame(stats, "Europe/Moscow", "ru", day=midnight, temp_unit="Fahrenheit")
+    assert list(edf["local_time"]) == ["12.11 00:00", "12.11 01:00"]
+    assert list(edf["min"]) == [32.0, 32.0]
+    assert list(edf["max"]) == [50.0, 50.0]
+    assert list(edf["spread"]) == [18.0, 18.0]
+    assert str(edf["time"].iloc[0]) == "2025-11-12 00:00:00"
+
+
+# ---------------------------
+# Загрузка моделей
+# ---------------------------
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    with MockServer() as server:
+        monkeypatch.setattr(api, "FORECAST_URL", f"{server.url}/v1/forecast")
+        monkeypatch.setattr(ensemble.freshness, "model_meta", lambda model: None)
+        monkeypatch.setattr(ensemble.freshness, "_known", {})
+        yield server
+
+
+def test_fetch_ensemble_in_parallel(server):
+    server.state.latency = 0.2
+    t = time.perf_counter()
+    result = ensemble.fetch_ensemble(55.75, 37.62, ["icon_seamless", "gfs_seamless", "ecmwf_ifs025"])
+    # одновременно, а не 3 x 0.2 с
+    assert time.perf_counter() - t < 0.5
+    assert list(result["members"]) == ["icon_seamless", "gfs_seamless", "ecmwf_ifs025"]
+    assert result["failed"] == []
+    assert server.state.stats(reset=True)["calls"] == {"forecast": 3}
+    # у моделей разные ряды, так что разброс не нулевой
+    stats = ensemble.ensemble_stats(result["members"].values())
+    assert stats["count"].min() == 3 and stats["spread"].max() > 0
+    # второй раз - из кэша
+    again = ensemble.fetch_ensemble(55.7501, 37.6201, ["icon_seamless", "gfs_seamless", "ecmwf_ifs025"])
+    assert again["members"]["icon_seamless"] is result["members"]["icon_seamless"]
+    assert server.state.stats()["calls"] == {}
+
+
+def test_fetch_ensemble_skips_failed_models(monkeypatch):
+    def fake_fetch(lat, lon, model):
+        if model == "bad":
+            raise RuntimeError("boom")
+        return member(0, [1.0])
+
+    monkeypatch.setattr(ensemble, "fetch_model", fake_fetch)
+    result = ensemble.fetch_ensemble(1, 2, ["good", "bad"])
+    assert list(result["members"]) == ["good"] and result["failed"] == ["bad"]
+    with pytest.raises(RuntimeError):
+        ensemble.fetch_ensemble(1, 2, ["bad"])
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from weather_core.fetcher import FetchGroup, submit
+
+
+def test_submit_runs_in_pool():
+    assert submit(lambda x: x * 2, 21).result(timeout=5) == 42
+
+
+def test_group_dedups_by_key():
+    group = FetchGroup()
+    calls = []
+    group.reset("Moscow")
+    assert group.result("k", lambda: calls.append(1) or "ok", timeout=5) == "ok"
+    assert group.result("k", lambda: calls.append(1) or "ok", timeout=5) == "ok"
+    assert calls == [1]
+
+
+def test_group_reset_cancels_pending():
+    group = FetchGroup()
+    group.reset("Moscow")
+    gate = threading.Event()
+    # занимаем все потоки пула, чтобы следующие запросы встали в очередь
+    blockers = [submit(gate.wait, 5) for _ in range(16)]
+    queued = group.submit("forecast", lambda: "stale")
+    group.reset("Paris")
+    assert queued.cancelled()
+    assert group.pending() == 0
+    gate.set()
+    for b in blockers:
+        b.result(timeout=5)
+
+
+def test_group_same_token_keeps_futures():
+    group = FetchGroup()
+    group.reset(("Moscow", "ru"))
+    first = group.submit("k", lambda: 1)
+    group.reset(("Moscow", "ru"))
+    assert group.submit("k", lambda: 2) is first
+
+
+def test_group_retries_failed_request():
+    group = FetchGroup()
+
+    def boom():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        group.result("k", boom, timeout=5)
+    assert group.result("k", lambda: "ok", timeout=5) == "ok"
+
+
+def test_group_new_run_drops_finished():
+    group = FetchGroup()
+    group.reset(("Moscow", "ru"))
+    first = group.submit("done", lambda: 1)
+    first.result(timeout=5)
+    gate = threading.Event()
+    running = group.submit("running", gate.wait, 5)
+    group.new_run()
+    # готовый ответ не отдаётся из сессии: следующий прогон снова идёт через кэш
+    assert group.submit("done", lambda: 2) is not first
+    assert group.submit("running", lambda: "other") is running
+    gate.set()
+    running.result(timeout=5)
@@ -0,0 +1,51 @@
+import json
+import math
+import pickle
+
+from benchmarks import bench
+from weather_core.forecast import MISSING_TIME, Forecast
+
+SAMPLE = {
+    "latitude": 55.75,
+    "longitude": 37.625,
+    "timezone": "Europe/Moscow",
+    "utc_offset_seconds": 10800,
+    "hourly_units": {"time": "unixtime", "temperature_2m": "°C"},
+    "current": {"time": 1762930800, "temperature_2m": 2.5, "weather_code": 3},
+    "hourly": {"time": [1762894800, 1762898400], "temperature_2m": [2.1, None]},
+    "daily": {"time": [1762894800], "weather_code": [None], "sunrise": [None], "precipitation_sum": [0.3]},
+}
+
+
+# ---------------------------
+# Разбор ответа
+# ---------------------------
+def test_from_json_typed_arrays():
+    f = Forecast.from_json(SAMPLE)
+    assert (f.latitude, f.longitude, f.timezone, f.utc_offset) == (55.75, 37.625, "Europe/Moscow", 10800)
+    assert f.current == SAMPLE["current"]
+    assert f.hourly["time"].typecode == "q"
+    assert f.hourly["temperature_2m"].typecode == "f"
+    assert f.daily["weather_code"].typecode == "h"
+    assert math.isnan(f.hourly["temperature_2m"][1])
+    assert f.daily["sunrise"][0] == MISSING_TIME
+    assert f.nbytes() == 2 * 8 + 2 * 4 + 8 + 2 + 8 + 4
+
+
+def test_to_json_round_trip():
+    data = Forecast.from_json(SAMPLE).to_json()
+    # float32 не тащит хвост 2.0999999046325684, пропуски - снова None
+    assert data["hourly"] == {"time": [1762894800, 1762898400], "temperature_2m": [2.1, None]}
+    assert data["daily"]["weather_code"] == [None]
+    assert data["daily"]["sunrise"] == [None]
+    assert Forecast.from_json(data).to_json() == data
+
+
+def test_forecast_is_smaller_than_json_dict():
+    raw = json.loads(bench.load_raw(bench.forecast_fixture(16)))
+    f = Forecast.from_json(raw)
+    assert not hasattr(f, "__dict__")
+    copy = pickle.loads(pickle.dumps(f))
+    assert copy.hourly == f.hourly and copy.timezone == f.timezone
+    # в SQLite-кэше значение лежит pickle-ом
+    assert len(pickle.dumps(f)) < len(pickle.dumps(raw))
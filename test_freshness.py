@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from benchmarks.bench import synthetic_model_meta
+from benchmarks.mock_server import MockServer
+from weather_core import api, cache, freshness
+from weather_core.cache import MemoryCache
+from weather_core.forecast import Forecast
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    with MockServer() as server:
+        monkeypatch.setattr(api, "FORECAST_URL", f"{server.url}/v1/forecast")
+        monkeypatch.setattr(freshness, "META_URL", f"{server.url}/data/{{model}}/static/meta.json")
+        monkeypatch.setattr(freshness, "_known", {})
+        yield server
+
+
+def calls(server):
+    return server.state.stats(reset=True)["calls"]
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Прогоны моделей: {"available": ..., "interval": ...} вместо meta.json"""
+    meta = {"available": 10_000, "interval": 3600}
+    monkeypatch.setattr(freshness, "_known", {model: meta for model in freshness.MODELS})
+    # опрос уже был: в фоне meta.json не запрашивается
+    monkeypatch.setattr(freshness, "_polled_at", float("inf"))
+    return meta
+
+
+# ---------------------------
+# Свежесть по прогонам моделей
+# ---------------------------
+def test_forecast_expires_at_next_run(runs):
+    f = Forecast(downloaded=10_100)
+    runs["interval"] = 1000
+    assert freshness.forecast_expires(f, 10_100) == 11_000
+    # блок current стареет и без нового прогона
+    runs["interval"] = 6 * 3600
+    assert freshness.forecast_expires(f, 10_100) == 10_100 + freshness.CURRENT_MAX_AGE
+    # прогон запаздывает - проверим снова через META_TTL
+    assert freshness.forecast_expires(Forecast(downloaded=40_000), 40_000) == 40_000 + freshness.META_TTL
+
+
+def test_forecast_expires_without_meta(monkeypatch):
+    monkeypatch.setattr(freshness, "_known", {})
+    monkeypatch.setattr(freshness, "_polled_at", float("inf"))
+    assert freshness.forecast_expires(Forecast(), 1_000) is None
+    assert freshness.last_update() is None
+
+
+def test_unchanged_since(runs, monkeypatch):
+    monkeypatch.setattr(freshness.time, "time", lambda: 10_500)
+    assert freshness.unchanged_since(Forecast(downloaded=10_100), 10_100)
+    runs["available"] = 10_200  # вышел новый прогон
+    assert not freshness.unchanged_since(Forecast(downloaded=10_100), 10_100)
+    runs["available"] = 10_000
+    # скачан давно: current устарел, даже если прогонов не было
+    assert not freshness.unchanged_since(Forecast(downloaded=10_500 - freshness.CURRENT_MAX_AGE), 10_100)
+
+
+def test_poll_models_from_mock(server):
+    assert freshness.model_meta("dwd_icon") == {
+        "available": synthetic_model_meta()["last_run_availability_time"],
+        "interval": 3600,
+    }
+    calls(server)
+    freshness.poll()
+    assert calls(server) == {"meta": 3}
+    # дальше - только последние известные значения
+    assert freshness.next_update() == freshness.last_update() + 3600
+    assert calls(server) == {}
+    # недоступная модель забывается, и свежесть снова по ttl
+    server.state.error_rate = 1.0
+    freshness.poll()
+    assert freshness.last_update() is None
+
+
+def test_cold_forecast_does_not_wait_for_meta(server, monkeypatch):
+    monkeypatch.setattr(freshness, "_polled_at", 0.0)
+    server.state.latency = 0.3
+    t = time.perf_counter()
+    api.fetch_weather(55.75, 37.62)
+    # meta.json опрашивается в фоне, а не три запроса подряд после прогноза
+    assert time.perf_counter() - t < 0.55
+    deadline = time.monotonic() + 5
+    while len(freshness._known) < len(freshness.MODELS) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert freshness.last_update() is not None
+    assert calls(server) == {"forecast": 1, "meta": 3}
+
+
+# ---------------------------
+# Перепроверка прогноза
+# ---------------------------
+def test_revalidate_without_new_run_skips_request(server, runs, monkeypatch):
+    runs["available"] = 0
+    first = api.fetch_weather(55.75, 37.62)
+    assert calls(server) == {"forecast": 1}
+    assert api.fetch_weather.refresh(55.75, 37.62) is first
+    assert calls(server) == {}
+
+
+def test_revalidate_uses_etag(server, runs):
+    runs["available"] = 0
+    first = api.fetch_weather(48.85, 2.35)
+    assert first.validators["ETag"]
+    runs["available"] = first.downloaded + 10  # новый прогон, но данные те же
+    downloaded = first.downloaded
+    assert api.fetch_weather.refresh(48.85, 2.35) is first
+    assert calls(server) == {"forecast": 2}
+    assert first.downloaded > downloaded
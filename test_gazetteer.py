@@ -0,0 +1,84 @@
+import pytest
+
+from weather_core import gazetteer
+from weather_core.gazetteer import Gazetteer, normalize
+
+
+def _row(geoname_id, name, ascii_name, alt, lat, lon, cc, admin1, pop, tz):
+    cols = [""] * 19
+    cols[0], cols[1], cols[2], cols[3] = str(geoname_id), name, ascii_name, alt
+    cols[4], cols[5], cols[8], cols[10] = str(lat), str(lon), cc, admin1
+    cols[14], cols[17] = str(pop), tz
+    return "\t".join(cols) + "\n"
+
+
+@pytest.fixture
+def gaz(tmp_path):
+    dump = tmp_path / "cities.txt"
+    dump.write_text(
+        _row(1, "Moscow", "Moscow", "Moskva,Москва", 55.75, 37.62, "RU", "48", 10381222, "Europe/Moscow")
+        + _row(2, "Moscow", "Moscow", "", 46.73, -117.0, "US", "ID", 23800, "America/Boise")
+        + _row(3, "São Paulo", "Sao Paulo", "Сан-Паулу", -23.55, -46.63, "BR", "27", 10021295, "America/Sao_Paulo")
+        + _row(4, "Mossoró", "Mossoro", "", -5.19, -37.34, "BR", "22", 259815, "America/Fortaleza"),
+        encoding="utf-8",
+    )
+    (tmp_path / "countryInfo.txt").write_text(
+        "#ISO\tISO3\tISO-Numeric\tfips\tCountry\n"
+        "RU\tRUS\t643\tRS\tRussia\nUS\tUSA\t840\tUS\tUnited States\nBR\tBRA\t076\tBR\tBrazil\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "admin1CodesASCII.txt").write_text("RU.48\tMoscow\tMoscow\t524894\n", encoding="utf-8")
+    return Gazetteer.from_geonames(str(tmp_path / "cities.txt"))
+
+
+def test_normalize():
+    assert normalize("  São Paulo ") == "sao paulo"
+
+
+def test_prefix_search_ranked_by_population(gaz):
+    places = gaz.search("mos")
+    assert [p["label"] for p in places] == [
+        "Moscow, Moscow, Russia",
+        "Mossoró, Brazil",
+        "Moscow, United States",
+    ]
+    assert set(places[0]) == {"label", "lat", "lon", "tz"}
+    assert places[0]["tz"] == "Europe/Moscow"
+
+
+def test_search_multilingual_and_diacritics(gaz):
+    assert gaz.search("Москва")[0]["label"] == "Москва, Moscow, Russia"
+    assert gaz.search("sao pa")[0]["lat"] == pytest.approx(-23.55)
+    # часть после запятой (страна) в поиске не участвует
+    assert gaz.search("Moscow, Russia", limit=1)[0]["lon"] == pytest.approx(37.62)
+
+
+def test_fuzzy_search(gaz):
+    assert gaz.search("Moskow")[0]["label"] == "Moscow, Moscow, Russia"
+    assert gaz.search("Moskow", fuzzy=False) == []
+    # пропущенная и лишняя буква
+    assert gaz.search("Mosow")[0]["label"] == "Moscow, Moscow, Russia"
+    assert gaz.search("Mosccow")[0]["label"] == "Moscow, Moscow, Russia"
+    # опечатка в первых двух буквах не прощается
+    assert gaz.search("Nuscow") == []
+
+
+def test_fuzzy_candidates_capped(gaz, monkeypatch):
+    assert len(gaz._fuzzy_hits("mosxow", 1)) == 1
+    monkeypatch.setattr(gazetteer, "FUZZY_MAX_CANDIDATES", 1)
+    assert len(gaz.search("Moscxw")) == 1
+
+
+def test_load_gazetteer_at_startup(gaz, tmp_path, monkeypatch):
+    monkeypatch.setattr(gazetteer, "_gazetteer", None)
+    monkeypatch.setattr(gazetteer, "GAZETTEER_PATH", str(tmp_path / "cities.txt"))
+    # сам get_gazetteer файл не читает
+    assert gazetteer.get_gazetteer() is None
+    loaded = gazetteer.load_gazetteer()
+    assert len(loaded) == 4
+    assert gazetteer.get_gazetteer() is loaded
+
+
+def test_search_miss(gaz):
+    assert gaz.search("Paris") == []
+    assert gaz.search("") == []
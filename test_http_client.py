@@ -0,0 +1,69 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from weather_core import http_client
+
+
+# Локальный сервер: первые fail_times ответов - 503, дальше 200
+@pytest.fixture
+def flaky_server():
+    state = {"calls": 0, "fail_times": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["calls"] += 1
+            status = 503 if state["calls"] <= state["fail_times"] else 200
+            body = b'{"ok": true}'
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}/"
+    yield state
+    server.shutdown()
+
+
+def test_retries_5xx_then_succeeds(flaky_server):
+    flaky_server["fail_times"] = 2
+    session = http_client.make_session(retries=2, backoff=0)
+    r = session.get(flaky_server["url"], timeout=5)
+    assert r.status_code == 200
+    assert flaky_server["calls"] == 3
+
+
+def test_gives_up_after_retries(flaky_server):
+    flaky_server["fail_times"] = 10
+    session = http_client.make_session(retries=1, backoff=0)
+    r = session.get(flaky_server["url"], timeout=5)
+    assert flaky_server["calls"] == 2
+    with pytest.raises(requests.HTTPError):
+        r.raise_for_status()
+
+
+def test_get_uses_shared_session(flaky_server, monkeypatch):
+    session = http_client.make_session(backoff=0)
+    monkeypatch.setattr(http_client, "_session", session)
+    assert http_client.get(flaky_server["url"]).json() == {"ok": True}
+    assert http_client.get_session() is session
+
+
+@pytest.mark.parametrize(
+    "url, read_timeout",
+    [
+        ("https://ipapi.co/json/", 5),
+        ("https://api.open-meteo.com/v1/forecast", 20),
+        ("https://example.com/", http_client.DEFAULT_READ_TIMEOUT),
+    ],
+)
+def test_timeout_for_host(url, read_timeout):
+    assert http_client.timeout_for(url) == (http_client.CONNECT_TIMEOUT, read_timeout)
@@ -0,0 +1,44 @@
+import pytest
+
+from weather_core.ipdb import IPRangeDB, ip_to_int
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "ipdb.csv"
+    path.write_text(
+        "start,end,city,country,lat,lon\n"
+        "10.0.0.0,10.0.0.255,Paris,France,48.85,2.35\n"
+        "1.0.0.0,1.0.0.255,Moscow,Russia,55.75,37.6167\n"
+        # диапазон, заданный числами
+        f"{ip_to_int('2.0.0.0')},{ip_to_int('2.0.0.9')},Berlin,Germany,52.52,13.40\n",
+        encoding="utf-8",
+    )
+    return IPRangeDB.from_csv(path)
+
+
+def test_ipdb_loads_and_skips_header(db):
+    assert len(db) == 3
+
+
+@pytest.mark.parametrize(
+    "ip, city",
+    [
+        ("1.0.0.0", "Moscow"),
+        ("1.0.0.255", "Moscow"),
+        ("10.0.0.17", "Paris"),
+        ("2.0.0.5", "Berlin"),
+    ],
+)
+def test_ipdb_lookup(db, ip, city):
+    assert db.lookup(ip)["city"] == city
+
+
+@pytest.mark.parametrize("ip", ["0.0.0.1", "1.0.1.0", "2.0.0.10", "not-an-ip"])
+def test_ipdb_lookup_miss(db, ip):
+    assert db.lookup(ip) is None
+
+
+def test_ipdb_lookup_returns_copy(db):
+    db.lookup("1.0.0.1")["city"] = "changed"
+    assert db.lookup("1.0.0.1")["city"] == "Moscow"
@@ -0,0 +1,64 @@
+from importlib import import_module
+
+import pytest
+import requests
+
+from benchmarks import loadtest
+from benchmarks.mock_server import MockServer, geocode_results
+from weather_core import cache, http_client
+
+
+@pytest.fixture
+def server():
+    with MockServer() as server:
+        yield server
+
+
+def test_mock_serves_endpoints(server):
+    found = requests.get(f"{server.url}/v1/search", params={"name": "Kazan, Russia"}, timeout=5).json()
+    assert found == geocode_results("Kazan")
+    assert found["results"][0]["name"] == "Kazan"
+    single = requests.get(f"{server.url}/v1/forecast", params={"latitude": 1, "longitude": 2}, timeout=5).json()
+    assert len(single["daily"]["time"]) == 7
+    short = requests.get(f"{server.url}/v1/forecast", params={"latitude": 1, "forecast_days": 2}, timeout=5).json()
+    assert len(short["daily"]["time"]) == 3
+    many = requests.get(f"{server.url}/v1/forecast", params={"latitude": "1,2", "longitude": "3,4"}, timeout=5).json()
+    assert len(many) == 2
+    assert requests.get(f"{server.url}/8.8.8.8/json/", timeout=5).json()["city"] == "Moscow"
+    stats = requests.get(f"{server.url}/stats", params={"reset": 1}, timeout=5).json()
+    assert stats["calls"] == {"geocode": 1, "forecast": 3, "ip": 1}
+    assert requests.get(f"{server.url}/stats", timeout=5).json()["calls"] == {}
+
+
+def test_mock_injects_errors_and_latency(server):
+    server.state.error_rate = 1.0
+    server.state.latency = 0.05
+    r = requests.get(f"{server.url}/json/", timeout=5)
+    assert r.status_code == 503
+    assert r.elapsed.total_seconds() >= 0.05
+    assert server.state.stats()["errors"] == {"ip": 1}
+
+
+def test_percentile():
+    values = [0.1 * i for i in range(1, 11)]
+    assert loadtest.percentile(values, 50) == pytest.approx(0.5)
+    assert loadtest.percentile(values, 99) == pytest.approx(1.0)
+    assert loadtest.percentile([], 95) == 0.0
+
+
+def test_load_run_small(monkeypatch):
+    # run() перенастраивает глобальное состояние ядра - monkeypatch вернёт его после теста
+    for module, name in loadtest.URL_SETTINGS.values():
+        module = import_module(f"weather_core.{module}")
+        monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(cache, "_cache", cache._cache)
+    monkeypatch.setattr(http_client, "_session", http_client._session)
+
+    report = loadtest.run(sessions=2, reruns=2, cities=["Paris", "Lima"])
+    assert report["exceptions"] == 0
+    assert report["api_errors"] == 0
+    assert report["first_run"]["count"] == 2
+    assert report["rerun"]["count"] == 4
+    assert report["upstream"]["calls"]["ip"] == 2
+    assert report["client_upstream_requests"] == sum(report["upstream"]["calls"].values())
+    assert "p95 " in loadtest.format_report(report)
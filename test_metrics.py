@@ -0,0 +1,92 @@
+import json
+import logging
+
+import pytest
+
+from weather_core import http_client, metrics
+from weather_core.metrics import Registry, Trace
+
+
+def test_trace_spans_and_totals():
+    registry = Registry()
+    trace = Trace(registry)
+    with trace.span("geocode"):
+        pass
+    for _ in range(2):
+        with trace.span("render"):
+            pass
+    trace.finish()
+    assert list(trace.stages()) == ["geocode", "render"]
+    assert registry.stages["render"][0] == 2
+    assert registry.stages["total"][0] == 1
+    assert trace.total >= sum(trace.stages().values())
+
+
+def test_span_records_on_exception():
+    registry = Registry()
+    trace = Trace(registry)
+    with pytest.raises(ValueError):
+        with trace.span("forecast"):
+            raise ValueError("boom")
+    assert registry.stages["forecast"][0] == 1
+
+
+def test_trace_counts_upstream_delta():
+    registry = Registry()
+    registry.record_upstream("api.open-meteo.com", 100, 0.1)
+    trace = Trace(registry)
+    registry.record_upstream("api.open-meteo.com", 250, 0.2)
+    registry.record_upstream("ipapi.co", 0, 0.5, error=True)
+    trace.finish()
+    assert trace.counters["upstream_requests"] == 2
+    assert trace.counters["upstream_bytes"] == 250
+    assert registry.upstream["ipapi.co"] == [1, 1, 0, 0.5]
+
+
+def test_prometheus_text(tmp_path):
+    registry = Registry()
+    registry.observe("geocode", 0.25)
+    registry.observe_http("forecast", 0.5)
+    registry.record_upstream("ipapi.co", 42, 0.1)
+    path = tmp_path / "weather.prom"
+    registry.write_prometheus(path)
+    text = path.read_text(encoding="utf-8")
+    assert 'weather_stage_seconds_sum{stage="geocode"} 0.250000' in text
+    assert 'weather_stage_seconds_count{stage="geocode"} 1' in text
+    assert 'weather_http_request_seconds_sum{endpoint="forecast"} 0.500000' in text
+    assert 'stage="forecast"' not in text
+    assert 'weather_upstream_bytes_total{host="ipapi.co"} 42' in text
+    assert "weather_cache_hits_total" in text
+    assert "weather_forecast_points_reused_total" in text
+
+
+def test_finish_logs_json(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "METRICS_LOG", True)
+    trace = Trace(Registry())
+    with trace.span("geocode"):
+        pass
+    with caplog.at_level(logging.INFO, logger="weather_core.metrics"):
+        trace.finish(lang="en")
+        trace.finish(lang="en")  # второй раз ничего не пишет
+    events = [json.loads(r.getMessage()) for r in caplog.records]
+    assert len(events) == 1
+    assert events[0]["event"] == "page_run"
+    assert events[0]["lang"] == "en"
+    assert "geocode" in events[0]["stages_ms"]
+
+
+def test_http_get_records_upstream(monkeypatch):
+    class Session:
+        def get(self, url, **kwargs):
+            if "down" in url:
+                raise ConnectionError("down")
+            return type("Response", (), {"content": b"12345", "status_code": 200})()
+
+    registry = Registry()
+    monkeypatch.setattr(http_client, "registry", registry)
+    monkeypatch.setattr(http_client, "_session", Session())
+    http_client.get("https://api.open-meteo.com/v1/forecast")
+    with pytest.raises(ConnectionError):
+        http_client.get("https://down.example.com/")
+    assert registry.upstream["api.open-meteo.com"][:3] == [1, 0, 5]
+    assert registry.upstream["down.example.com"][:3] == [1, 1, 0]
@@ -0,0 +1,131 @@
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from weather_core import http_client, ratelimit
+from weather_core.fetcher import submit
+from weather_core.ratelimit import BACKGROUND, INTERACTIVE, RateLimited, TokenBucket
+
+
+# ---------------------------
+# TokenBucket тесты
+# ---------------------------
+def test_bucket_burst_then_waits():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert time.monotonic() - started >= 0.03
+
+
+def test_bucket_takes_n_tokens():
+    bucket = TokenBucket(rate=20, burst=4)
+    assert bucket.acquire(timeout=0, n=3)
+    assert not bucket.acquire(timeout=0, n=2)
+    assert bucket.acquire(timeout=0)
+    # больше burst: ждёт полное ведро и уходит в долг
+    assert bucket.acquire(timeout=1, n=10)
+    assert bucket.retry_in() > 0.3
+
+
+def test_bucket_serves_interactive_first():
+    bucket = TokenBucket(rate=10, burst=1)
+    assert bucket.acquire()
+    order = []
+
+    def take(name, priority):
+        if bucket.acquire(priority, timeout=2):
+            order.append(name)
+
+    slow = threading.Thread(target=take, args=("prefetch", BACKGROUND))
+    slow.start()
+    time.sleep(0.02)  # фоновый встал в очередь раньше
+    fast = threading.Thread(target=take, args=("user", INTERACTIVE))
+    fast.start()
+    slow.join()
+    fast.join()
+    assert order == ["user", "prefetch"]
+
+
+def test_bucket_pause():
+    bucket = TokenBucket(rate=100, burst=5)
+    bucket.pause(0.2)
+    assert not bucket.acquire(timeout=0.05)
+    assert bucket.retry_in() > 0
+    assert bucket.acquire(timeout=1)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("3", 3), (None, ratelimit.DEFAULT_RETRY_AFTER), ("soon", ratelimit.DEFAULT_RETRY_AFTER), ("-1", 0)],
+)
+def test_parse_retry_after(value, expected):
+    assert ratelimit.parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    value = formatdate(time.time() + 30, usegmt=True)
+    assert 25 < ratelimit.parse_retry_after(value) <= 30
+
+
+def test_priority_reaches_pool_threads():
+    assert submit(ratelimit.current_priority).result(timeout=5) == INTERACTIVE
+    with ratelimit.background():
+        future = submit(ratelimit.current_priority)
+    assert future.result(timeout=5) == BACKGROUND
+
+
+# ---------------------------
+# 429 в http_client
+# ---------------------------
+@pytest.fixture
+def limited_server(monkeypatch):
+    state = {"calls": 0, "limited": 1, "retry_after": "0"}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["calls"] += 1
+            limited = state["calls"] <= state["limited"]
+            body = b'{"ok": true}'
+            self.send_response(429 if limited else 200)
+            if limited:
+                self.send_header("Retry-After", state["retry_after"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setitem(ratelimit.RATE_LIMITS, "127.0.0.1", 50.0)
+    monkeypatch.setattr(ratelimit, "_buckets", {})
+    monkeypatch.setattr(http_client, "_session", http_client.make_session(backoff=0))
+    state["url"] = f"http://127.0.0.1:{server.server_port}/"
+    yield state
+    server.shutdown()
+
+
+def test_429_is_retried_after_pause(limited_server):
+    r = http_client.get(limited_server["url"])
+    assert r.status_code == 200
+    assert limited_server["calls"] == 2
+
+
+def test_429_with_long_retry_after_raises(limited_server):
+    limited_server["retry_after"] = "120"
+    with pytest.raises(RateLimited) as info:
+        http_client.get(limited_server["url"])
+    assert info.value.retry_after == 120
+    assert limited_server["calls"] == 1
+    # хост на паузе: следующий запрос не уходит в сеть, а ждёт жетон и сдаётся
+    with ratelimit.background():
+        with pytest.raises(RateLimited):
+            http_client.get(limited_server["url"])
+    assert limited_server["calls"] == 1
@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from weather_core import cache
+from weather_core.cache import MemoryCache, cached
+from weather_core.refresher import HotLocations, Refresher, parse_locations
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+
+    @cached("forecast-test", ttl=100, stale_ttl=100)
+    def fetch_weather(lat, lon):
+        calls.append((lat, lon))
+        return {"lat": lat, "lon": lon}
+
+    fetch_weather.calls = calls
+    return fetch_weather
+
+
+def test_hot_locations_top_and_decay():
+    hot = HotLocations()
+    for _ in range(3):
+        hot.record(1.0, 1.0)
+    hot.record(2.0, 2.0)
+    assert hot.top(1) == [(1.0, 1.0)]
+    hot.decay()
+    assert hot.top(5) == [(1.0, 1.0)]  # редкое место выпало
+
+
+def test_parse_locations():
+    assert parse_locations("Moscow; 55.75,37.62 ;;Paris") == ["Moscow", (55.75, 37.62), "Paris"]
+
+
+def test_prewarm_resolves_names(fetch):
+    resolve = lambda query, lang: [{"lat": 48.85, "lon": 2.35}] if query == "Paris" else []
+    r = Refresher(fetch, resolve, hot=HotLocations())
+    r.prewarm(["Paris", (1.0, 2.0), "Atlantis"])
+    assert fetch.calls == [(48.85, 2.35), (1.0, 2.0)]
+    assert r.pinned == [(48.85, 2.35), (1.0, 2.0)]
+
+
+def test_refresh_due_only_for_old_entries(fetch, monkeypatch):
+    hot = HotLocations()
+    hot.record(1.0, 1.0)
+    hot.record(2.0, 2.0)
+    fetch(1.0, 1.0)
+    fetch(2.0, 2.0)
+    r = Refresher(fetch, hot=hot, ahead=0.8)
+
+    r.refresh_due()  # обе записи свежие
+    assert len(fetch.calls) == 2
+
+    now = cache.time.time()
+    monkeypatch.setattr(cache.time, "time", lambda: now + 90)
+    fetch.store({"lat": 2.0}, 2.0, 2.0)  # эту обновили только что
+    r.refresh_due()
+    assert fetch.calls[2:] == [(1.0, 1.0)]
+    assert r.refreshed == 1
+
+
+def test_refresh_failure_is_counted(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+
+    @cached("broken", ttl=10)
+    def broken(lat, lon):
+        raise RuntimeError("upstream down")
+
+    r = Refresher(broken, hot=HotLocations())
+    r.prewarm([(1.0, 1.0)])
+    assert r.failed == 1
+
+
+def test_run_polls_every_tick(fetch):
+    polls = []
+
+    def poll():
+        polls.append(1)
+        if len(polls) == 2:
+            raise RuntimeError("meta.json down")  # не останавливает поток
+        if len(polls) == 3:
+            stop.set()
+
+    stop = threading.Event()
+    Refresher(fetch, hot=HotLocations(), poll=poll).run(stop, interval=0.01)
+    assert len(polls) == 3
@@ -0,0 +1,134 @@
+import math
+
+import pytest
+
+from weather_core import cache, regional
+from weather_core.cache import MemoryCache
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Осадки в точке = широта + долгота / 100; запросы копятся в calls"""
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+
+    def fake_get(url, params, timeout=None, cost=1):
+        calls.append(params)
+        assert cost == len(params["latitude"].split(","))
+        lats = [float(x) for x in params["latitude"].split(",")]
+        lons = [float(x) for x in params["longitude"].split(",")]
+        data = [{"daily": {"precipitation_sum": [lat + lon / 100]}} for lat, lon in zip(lats, lons)]
+        return FakeResponse(data[0] if len(data) == 1 else data)
+
+    monkeypatch.setattr("weather_core.regional.http_client.get", fake_get)
+    return calls
+
+
+# ---------------------------
+# Решётка и плитки
+# ---------------------------
+def test_tiles_around_cover_window():
+    window, tiles = regional.tiles_around(55.75, 37.62, radius=3, step=0.5, tile=4)
+    assert window == (108, 115, 72, 79)
+    assert tiles == [(27, 18), (27, 19), (28, 18), (28, 19)]
+
+
+def test_tiles_around_window_is_whole_tiles():
+    # окно 7 x 7 ровно в одну плитку 7 x 7, место в ней, а не на стыке четырёх
+    window, tiles = regional.tiles_around(55.75, 37.62, radius=3, step=0.5, tile=7)
+    assert tiles == [(16, 10)]
+    assert window == (112, 118, 70, 76)
+    # по умолчанию окно 21 x 21 - это 3 x 3 плитки
+    window, tiles = regional.tiles_around(55.75, 37.62)
+    assert len(tiles) == 9
+    assert window[1] - window[0] + 1 == 2 * regional.GRID_RADIUS + 1
+
+
+def test_fetch_precip_tile_one_request(upstream):
+    values = regional.fetch_precip_tile(1, 2, 0.5, 3)
+    assert len(upstream) == 1
+    assert upstream[0]["daily"] == "precipitation_sum"
+    assert upstream[0]["latitude"].split(",")[:4] == ["1.5", "1.5", "1.5", "2.0"]
+    assert upstream[0]["longitude"].split(",")[:4] == ["3.0", "3.5", "4.0", "3.0"]
+    # по строкам решётки: (широта 2.0, долгота 3.5) - пятая точка
+    assert values[4] == pytest.approx(2.035)
+    # плитка кэшируется целиком
+    regional.fetch_precip_tile(1, 2, 0.5, 3)
+    assert len(upstream) == 1
+
+
+def test_fetch_precip_tile_skips_points_past_pole(upstream):
+    values = regional.fetch_precip_tile(-31, 0, 1.0, 3)  # широты -93, -92, -91
+    assert upstream == []
+    assert all(math.isnan(v) for v in values)
+    regional.fetch_precip_tile(-30, 0, 1.0, 3)  # -90, -89, -88
+    assert len(upstream[0]["latitude"].split(",")) == 9
+    values = regional.fetch_precip_tile(15, 0, 2.0, 3)  # 90, 92, 94
+    assert len(upstream[1]["latitude"].split(",")) == 3
+    assert values[1] == pytest.approx(90.02)
+    assert math.isnan(values[3])
+
+
+def test_longitude_wraps_for_request(upstream):
+    regional.fetch_precip_tile(0, 9, 10.0, 2)  # долготы 180 и 190
+    assert upstream[0]["longitude"].split(",")[:2] == ["-180.0", "-170.0"]
+
+
+# ---------------------------
+# precip_grid тесты
+# ---------------------------
+def test_precip_grid_window(upstream):
+    grid = regional.precip_grid(10.1, 20.2, radius=2, step=0.5, tile=4)
+    assert grid["tiles"] == len(upstream) == 4
+    assert grid["failed"] == 0
+    # всё загруженное идёт на карту
+    assert len(grid["mm"]) == 64
+    assert min(grid["lat"]) == 8.0 and max(grid["lat"]) == 11.5
+    assert min(grid["lon"]) == 18.0 and max(grid["lon"]) == 21.5
+    for lat, lon, mm in zip(grid["lat"], grid["lon"], grid["mm"]):
+        assert mm == pytest.approx(lat + lon / 100, abs=1e-4)
+
+    # соседнее место попадает на те же плитки - новых запросов нет
+    regional.precip_grid(10.3, 20.4, radius=2, step=0.5, tile=4)
+    assert len(upstream) == 4
+
+
+def test_precip_grid_skips_failed_tiles(monkeypatch, upstream):
+    real = regional.fetch_precip_tile
+
+    def flaky(row, col, step, tile):
+        if (row, col) == (5, 10):
+            raise ConnectionError("down")
+        return real(row, col, step, tile)
+
+    monkeypatch.setattr(regional, "fetch_precip_tile", flaky)
+    grid = regional.precip_grid(10.1, 20.2, radius=2, step=0.5, tile=4)
+    assert grid["failed"] == 1
+    assert 0 < len(grid["mm"]) < 64
+
+
+def test_precip_grid_raises_when_nothing_loaded(monkeypatch, upstream):
+    def down(*args):
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(regional, "fetch_precip_tile", down)
+    with pytest.raises(ConnectionError):
+        regional.precip_grid(10.1, 20.2, radius=2, step=0.5, tile=4)
+
+
+def test_heatmap_points_drop_dry_cells():
+    from array import array
+
+    grid = {"lat": array("f", [1.0, 1.5]), "lon": array("f", [2.0, 2.123456]), "mm": array("f", [0.0, 3.26])}
+    assert regional.heatmap_points(grid) == [{"lon": 2.123, "lat": 1.5, "mm": 3.3}]
@@ -0,0 +1,233 @@
+import asyncio
+import gzip
+import pickle
+import threading
+import time
+
+import pytest
+import requests
+
+import server
+from benchmarks import serverbench
+from benchmarks.loadtest import point_at
+from benchmarks.mock_server import MockServer
+from weather_core import api, archive, cache, fetcher, freshness
+from weather_core.cache import MemoryCache, SQLiteCache
+from weather_core.forecast import Forecast
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    for module, attr in ((api, "IP_API_URL"), (api, "GEOCODING_URL"), (api, "FORECAST_URL")):
+        monkeypatch.setattr(module, attr, getattr(module, attr))
+    monkeypatch.setattr(archive, "ARCHIVE_URL", archive.ARCHIVE_URL)
+    monkeypatch.setattr(freshness, "META_URL", freshness.META_URL)
+    monkeypatch.setattr(freshness, "_known", {})
+    monkeypatch.setattr(freshness, "_polled_at", float("inf"))
+    with MockServer() as mock:
+        point_at(mock.url)
+        yield mock
+
+
+@pytest.fixture
+def service(request):
+    return server.Service(concurrency=getattr(request, "param", 2), queue_timeout=0.2)
+
+
+@pytest.fixture
+def base_url(upstream, service):
+    """server.make_app() в своём потоке со своим циклом событий"""
+    started = threading.Event()
+    state = {}
+
+    def run():
+        async def main():
+            httpd = server.make_app(service).listen(0, "127.0.0.1")
+            state["port"] = next(iter(httpd._sockets.values())).getsockname()[1]
+            state["loop"] = asyncio.get_running_loop()
+            state["stop"] = asyncio.Event()
+            started.set()
+            await state["stop"].wait()
+            httpd.stop()
+
+        asyncio.run(main())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait(5)
+    yield f"http://127.0.0.1:{state['port']}"
+    state["loop"].call_soon_threadsafe(state["stop"].set)
+    thread.join(5)
+
+
+def calls(upstream):
+    return upstream.state.stats(reset=True)["calls"]
+
+
+# ---------------------------
+# Прогноз
+# ---------------------------
+def test_forecast_payload(base_url, upstream):
+    r = requests.get(f"{base_url}/v1/forecast", params={"lat": 55.75, "lon": 37.62, "lang": "ru", "units": "imperial"})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["units"] == {"temperature": "°F", "wind_speed": "mph", "precipitation": "mm"}
+    assert data["current"]["description"] and data["current"]["wind_compass"]
+    assert len(data["daily"]["description"]) == len(data["daily"]["time"]) == 7
+    assert len(data["hourly"]["temperature"]) == len(data["hourly"]["time"])
+    assert data["stale"] is False
+    # те же единицы, что на странице: °C из кэша переводятся при ответе
+    metric = requests.get(f"{base_url}/v1/forecast", params={"lat": 55.75, "lon": 37.62}).json()
+    assert data["current"]["temperature"] == round(metric["current"]["temperature"] * 9 / 5 + 32, 1)
+    assert calls(upstream).get("forecast") == 1
+
+
+def test_conditional_get_and_gzip(base_url, upstream, service):
+    url = f"{base_url}/v1/forecast?lat=48.85&lon=2.35"
+    first = requests.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["Vary"] == "Accept-Encoding"
+    assert int(first.headers["Cache-Control"].split("max-age=")[1]) > 0
+    plain = requests.get(url, headers={"Accept-Encoding": "identity"}, stream=True)
+    raw = plain.raw.read()
+    assert "Content-Encoding" not in plain.headers
+    assert gzip.decompress(requests.get(url, headers={"Accept-Encoding": "gzip"}, stream=True).raw.read()) == raw
+    # тот же прогноз в кэше - тот же готовый ответ
+    assert service.responses.misses == 1 and service.responses.hits == 2
+    again = requests.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.content == b""
+    assert calls(upstream) == {"forecast": 1}
+
+
+def test_sqlite_backend_reads_off_the_loop(base_url, upstream, service, monkeypatch, tmp_path):
+    monkeypatch.setattr(cache, "_cache", SQLiteCache(str(tmp_path / "cache.sqlite3")))
+    loop_threads = []
+    lookup = server.lookup_forecast
+
+    def recording(lat, lon):
+        loop_threads.append(threading.current_thread().name)
+        return lookup(lat, lon)
+
+    monkeypatch.setattr(server, "lookup_forecast", recording)
+    url = f"{base_url}/v1/forecast?lat=40.71&lon=-74.01"
+    assert requests.get(url).status_code == 200
+    assert requests.get(url).status_code == 200
+    assert calls(upstream) == {"forecast": 1}
+    assert loop_threads and all(name.startswith("weather-") for name in loop_threads)
+    # из SQLite каждый раз новый объект, но готовый ответ тот же
+    assert service.responses.hits == 1
+
+
+@pytest.mark.parametrize(
+    "query, message",
+    [
+        ({"lat": "x", "lon": 1}, "lat must be a number"),
+        ({"lat": 91, "lon": 1}, "lat must be between"),
+        ({"lat": "nan", "lon": 1}, "lat must be between"),
+        ({"lat": 1}, "missing parameter: lon"),
+        ({"lat": 1, "lon": 1, "units": "kelvin"}, "units must be one of"),
+    ],
+)
+def test_bad_parameters(base_url, query, message):
+    r = requests.get(f"{base_url}/v1/forecast", params=query)
+    assert r.status_code == 400
+    assert message in r.json()["error"]
+
+
+def test_upstream_failure(base_url, upstream):
+    upstream.state.error_rate = 1.0
+    r = requests.get(f"{base_url}/v1/forecast", params={"lat": 10, "lon": 10})
+    assert r.status_code == 502
+    assert "upstream failed" in r.json()["error"]
+
+
+def test_concurrency_limit(base_url, upstream, service):
+    upstream.state.latency = 1.0
+    # два места в пуле заняты медленным API, третий запрос не дожидается очереди
+    with requests.Session() as s:
+        threads = [
+            threading.Thread(target=s.get, args=(f"{base_url}/v1/forecast",), kwargs={"params": {"lat": i, "lon": i}})
+            for i in (1, 2)
+        ]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + 5
+        while service.limit._value and time.monotonic() < deadline:
+            time.sleep(0.01)
+        r = requests.get(f"{base_url}/v1/forecast", params={"lat": 3, "lon": 3})
+        for t in threads:
+            t.join()
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    assert service.rejected == 1
+
+
+@pytest.mark.parametrize("service", [fetcher.MAX_WORKERS + 4], indirect=True)
+def test_own_pool_beyond_shared_workers(base_url, upstream, service):
+    upstream.state.latency = 0.5
+    n = fetcher.MAX_WORKERS + 4
+    statuses = []
+
+    def get(i):
+        statuses.append(requests.get(f"{base_url}/v1/forecast", params={"lat": i, "lon": i}).status_code)
+
+    threads = [threading.Thread(target=get, args=(i,)) for i in range(n)]
+    t = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # все разом в пуле сервера, а не по WEATHER_FETCH_WORKERS за раз
+    assert time.monotonic() - t < 0.95
+    assert statuses == [200] * n
+
+
+# ---------------------------
+# Остальные эндпоинты
+# ---------------------------
+def test_geocode_health_metrics(base_url):
+    found = requests.get(f"{base_url}/v1/geocode", params={"q": "Kazan", "lang": "ru"}).json()
+    assert found["results"][0]["label"].startswith("Kazan")
+    assert requests.get(f"{base_url}/v1/geocode").status_code == 400
+    bad_lang = requests.get(f"{base_url}/v1/geocode", params={"q": "Kazan", "lang": "de&count=1000"})
+    assert bad_lang.status_code == 400 and "lang must be one of" in bad_lang.json()["error"]
+    assert requests.get(f"{base_url}/healthz").json()["ok"] is True
+    assert requests.get(f"{base_url}/nope").json() == {"error": "not found"}
+    metrics = requests.get(f"{base_url}/metrics").text
+    assert 'weather_http_request_seconds_count{endpoint="geocode"}' in metrics
+    assert 'stage="http_' not in metrics
+    assert "weather_api_response_misses_total 1" in metrics
+
+
+def test_response_cache_lru():
+    responses = server.ResponseCache(limit=2)
+    a, b = object(), object()
+    first = responses.get("a", a, lambda: {"n": 1})
+    assert responses.get("a", a, lambda: {"n": 2}) is first
+    # новый объект из кэша ядра - новый ответ
+    assert responses.get("a", b, lambda: {"n": 2}).body == b'{"n":2}'
+    responses.get("b", a, lambda: {})
+    responses.get("c", a, lambda: {})
+    assert len(responses) == 2 and responses.get("a", b, lambda: {"n": 3}).body == b'{"n":3}'
+
+
+def test_response_cache_survives_new_objects():
+    responses = server.ResponseCache()
+    forecast = Forecast(downloaded=1.0)
+    first = responses.get("f", forecast, lambda: {"n": 1})
+    # SQLite-кэш ядра: новый объект с теми же данными
+    assert responses.get("f", pickle.loads(pickle.dumps(forecast)), lambda: {"n": 2}) is first
+    # геокодер (справочник) отдаёт новый список с теми же местами
+    places = responses.get("g", [{"name": "Kazan"}], lambda: {"n": 1})
+    assert responses.get("g", [{"name": "Kazan"}], lambda: {"n": 2}) is places
+    assert responses.hits == 2 and responses.misses == 2
+
+
+def test_serverbench_small():
+    report = serverbench.run(duration=0.5, connections=2, points=3, cpu=None)
+    assert report["requests"] > 0
+    assert set(report["status"]) <= {"200", "304"}
+    # после прогрева всё из кэша ядра
+    assert report["upstream"].get("forecast", 0) == 0
+    assert "req/s" in serverbench.format_report(report)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from weather_core import cache
+from weather_core.cache import MemoryCache, cached
+from weather_core.singleflight import SingleFlight
+
+
+def _run_concurrently(n, target):
+    barrier = threading.Barrier(n)
+    results, errors = [], []
+
+    def worker():
+        barrier.wait()
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+def test_concurrent_calls_collapse():
+    sf = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "forecast"
+
+    results, errors = _run_concurrently(10, lambda: sf.do("moscow", slow))
+    assert results == ["forecast"] * 10
+    assert not errors
+    assert len(calls) == 1
+    assert sf.stats() == {"executed": 1, "collapsed": 9, "in_flight": 0}
+
+
+def test_error_is_shared_and_not_remembered():
+    sf = SingleFlight()
+
+    def boom():
+        time.sleep(0.2)
+        raise RuntimeError("upstream down")
+
+    results, errors = _run_concurrently(5, lambda: sf.do("k", boom))
+    assert not results
+    assert len(errors) == 5
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    # следующий вызов выполняется заново
+    assert sf.do("k", lambda: "ok") == "ok"
+
+
+def test_different_keys_do_not_wait():
+    sf = SingleFlight()
+    assert sf.do("a", lambda: 1) == 1
+    assert sf.do("b", lambda: 2) == 2
+    assert sf.executed == 2
+
+
+def test_cached_misses_share_one_upstream_call(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    calls = []
+
+    @cached("sf-forecast", ttl=60, normalize=lambda lat, lon: (round(lat, 2), round(lon, 2)))
+    def fetch(lat, lon):
+        calls.append((lat, lon))
+        time.sleep(0.2)
+        return {"lat": lat}
+
+    # координаты отличаются в 4-м знаке - после округления это один запрос
+    coords = iter([(55.7512, 37.6101), (55.7498, 37.6149)] * 5)
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            lat, lon = next(coords)
+        return fetch(lat, lon)
+
+    results, errors = _run_concurrently(10, call)
+    assert not errors
+    assert calls == [(55.75, 37.61)]
+    assert results == [{"lat": 55.75}] * 10
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from weather_core import api, cache, freshness
+from weather_core.cache import MemoryCache
+from weather_core.forecast import Forecast
+from weather_core.spatial import SpatialIndex, distance_km
+
+
+# ---------------------------
+# distance_km тесты
+# ---------------------------
+def test_distance_km():
+    assert distance_km(55.75, 37.62, 55.75, 37.62) == 0
+    # градус широты - около 111 км
+    assert distance_km(0, 0, 1, 0) == pytest.approx(111.2, abs=0.1)
+    # градус долготы на 60° широты - вдвое короче
+    assert distance_km(60, 0, 60, 1) == pytest.approx(55.6, abs=0.1)
+
+
+# ---------------------------
+# SpatialIndex тесты
+# ---------------------------
+def test_snap_reuses_point_within_radius():
+    index = SpatialIndex(radius_km=1)
+    assert index.snap(55.751, 37.618) == (55.751, 37.618)
+    # ~300 м - тот же прогноз
+    assert index.snap(55.753, 37.621) == (55.751, 37.618)
+    # ~3 км - своя точка
+    assert index.snap(55.78, 37.618) == (55.78, 37.618)
+    assert index.stats() == {"radius_km": 1, "points": 2, "added": 2, "reused": 1, "reuse_rate": 0.333}
+
+
+def test_snap_across_cell_border():
+    index = SpatialIndex(radius_km=1)
+    step = 1 / 111.195  # высота ячейки в градусах
+    # точки по разные стороны границы ряда, в 200 м друг от друга
+    below = (100 * step - 0.001, 10.0)
+    above = (100 * step + 0.001, 10.0)
+    assert index.snap(*below) == below
+    assert index.snap(*above) == below
+
+
+@pytest.mark.parametrize("lat", [0.0, 45.0, 70.0, -80.0])
+def test_snap_radius_in_km_at_any_latitude(lat):
+    index = SpatialIndex(radius_km=2)
+    index.snap(lat, 20.0)
+    # 1.8 км к востоку - в радиусе, 2.5 км - уже нет
+    per_km = 1 / distance_km(lat, 20.0, lat, 21.0)
+    assert index.snap(lat, 20.0 + 1.8 * per_km) == (lat, 20.0)
+    far = (lat, 20.0 + 2.5 * per_km)
+    assert index.snap(*far) == far
+
+
+def test_snap_picks_nearest_point():
+    index = SpatialIndex(radius_km=5)
+    index.snap(50.0, 10.0)
+    index.snap(50.0, 10.1)  # ~7 км - отдельная точка
+    assert index.snap(50.0, 10.08) == (50.0, 10.1)
+
+
+def test_snap_forgets_least_recent():
+    index = SpatialIndex(radius_km=1, max_points=2)
+    index.snap(10.0, 10.0)
+    index.snap(20.0, 20.0)
+    index.snap(10.001, 10.001)  # освежает (10, 10)
+    index.snap(30.0, 30.0)  # вытесняет (20, 20)
+    assert index.stats()["points"] == 2
+    assert index.snap(20.001, 20.0) == (20.001, 20.0)
+
+
+def test_snap_disabled():
+    index = SpatialIndex(radius_km=0)
+    index.snap(1.0, 1.0)
+    assert index.snap(1.0001, 1.0) == (1.0001, 1.0)
+
+
+def test_reuse_counted_once_per_request(monkeypatch):
+    monkeypatch.setattr(cache, "_cache", MemoryCache())
+    index = SpatialIndex(radius_km=1)
+    monkeypatch.setattr(api, "forecast_points", index)
+    monkeypatch.setattr(freshness, "_polled_at", float("inf"))
+    moscow = Forecast(downloaded=time.time())
+    api.fetch_weather.store(moscow, 55.751, 37.618)
+    api.snap_coords(55.751, 37.618)
+    near = (55.753, 37.621)
+    assert api.fetch_weather(*near) is moscow
+    # страница заодно спрашивает возраст и свежесть той же точки
+    api.fetch_weather.age(*near), api.fetch_weather.expired(*near), api.fetch_weather.fresh_for(*near)
+    assert index.stats()["reused"] == 1
+    assert api.fetch_weather_batch([near]) == [moscow]
+    assert index.stats()["reused"] == 2
@@ -0,0 +1,177 @@
+import pytest
+
+from weather_core.labels import get_tz
+from weather_core.transforms import daily_frame, format_times, hourly_frame
+
+
+# ---------------------------
+# format_times тесты
+# ---------------------------
+@pytest.mark.parametrize(
+    "lang, expected",
+    [("en", "2025-11-12 12:00"), ("ru", "12.11 12:00")],
+)
+def test_format_times_utc(lang, expected):
+    # то же, что проверяется для nice_time в test_app.py
+    assert format_times(["2025-11-12T12:00:00Z"], "UTC", lang).tolist() == [expected]
+
+
+def test_format_times_converts_aware_and_keeps_local():
+    out = format_times(["2025-11-12T12:00:00Z", "2025-11-12T07:30"], "Europe/Moscow", "ru")
+    # Z переводится в пояс места, время без смещения уже местное
+    assert out.tolist() == ["12.11 15:00", "12.11 07:30"]
+
+
+def test_format_times_keeps_unparseable():
+    assert format_times(["oops", "2025-11-12T12:00Z"], "UTC", "en").tolist() == ["oops", "2025-11-12 12:00"]
+    assert format_times(["2025-11-12T12:00"], "No/Such_Zone", "en").tolist() == ["2025-11-12T12:00"]
+
+
+def test_get_tz_is_cached():
+    assert get_tz("Europe/Paris") is get_tz("Europe/Paris")
+
+
+# ---------------------------
+# hourly_frame / daily_frame тесты
+# ---------------------------
+def test_hourly_frame_filters_day():
+    hourly = {
+        "time": ["2025-11-12T00:00", "2025-11-12T01:00", "2025-11-13T00:00"],
+        "temperature_2m": [1.0, 2.0, 3.0],
+        "apparent_temperature": [0.5, 1.5, 2.5],
+        "relative_humidity_2m": [50, 60, 70],
+        "precipitation": [0, 0.1, 0],
+    }
+    hdf = hourly_frame(hourly, "UTC", "en", day="2025-11-12")
+    assert list(hdf["temp"]) == [1.0, 2.0]
+    assert list(hdf["local_time"]) == ["2025-11-12 00:00", "2025-11-12 01:00"]
+    assert len(hourly_frame(hourly, "UTC", "en")) == 3
+
+
+def test_daily_frame_labels():
+    daily = {
+        "time": ["2025-11-12", "2025-11-13"],
+        "weather_code": [0, 99],
+        "temperature_2m_max": [5.0, 6.0],
+        "temperature_2m_min": [1.0, 2.0],
+        "precipitation_sum": [0.0, 1.5],
+        "wind_speed_10m_max": [10.0, 12.0],
+        "sunrise": ["2025-11-12T07:30", "2025-11-13T07:32"],
+        "sunset": ["2025-11-12T16:10", "2025-11-13T16:08"],
+    }
+    fdf = daily_frame(daily, "Europe/Moscow", "ru", {0: "Ясно"}, {0: "☀️"})
+    assert list(fdf["desc"]) == ["Ясно", "—"]
+    assert list(fdf["emoji"]) == ["☀️", "🌡️"]
+    assert list(fdf["sunrise_str"]) == ["12.11 07:30", "13.11 07:32"]
+
+
+def test_frames_convert_units():
+    hourly = {
+        "time": ["2025-11-12T00:00"],
+        "temperature_2m": [0.0],
+        "apparent_temperature": [10.0],
+        "relative_humidity_2m": [50],
+        "precipitation": [0.0],
+    }
+    hdf = hourly_frame(hourly, "UTC", "en", temp_unit="Fahrenheit")
+    assert list(hdf["temp"]) == [32.0]
+    assert list(hdf["feels_like"]) == [50.0]
+
+    daily = {
+        "time": ["2025-11-12"],
+        "weather_code": [0],
+        "temperature_2m_max": [100.0],
+        "temperature_2m_min": [0.0],
+        "precipitation_sum": [0.0],
+        "wind_speed_10m_max": [16.09344],
+        "sunrise": ["2025-11-12T07:30"],
+        "sunset": ["2025-11-12T16:10"],
+    }
+    fdf = daily_frame(daily, "UTC", "en", {}, {}, temp_unit="Fahrenheit")
+    assert fdf["tmax"].iloc[0] == pytest.approx(212.0)
+    assert fdf["windmax"].iloc[0] == pytest.approx(10.0)
+
+
+# ---------------------------
+# LTTB тесты
+# ---------------------------
+def test_lttb_keeps_ends_and_peaks():
+    import numpy as np
+
+    from weather_core.transforms import lttb_indices
+
+    x = np.arange(10_000)
+    y = np.sin(x / 300.0)
+    y[4321] = 50  # одиночный выброс шаг через n бы потерял
+    idx = lttb_indices(x, y, 200)
+    assert len(idx) == 200
+    assert idx[0] == 0 and idx[-1] == 9_999
+    assert 4321 in idx
+    assert (np.diff(idx) > 0).all()
+    # короткий ряд не трогаем
+    assert lttb_indices(x[:50], y[:50], 200).tolist() == list(range(50))
+
+
+def test_downsample_history_frame():
+    import pyarrow as pa
+
+    from weather_core.transforms import downsample, history_frame
+
+    hours = 24 * 365
+    table = pa.table(
+        {
+            "time": pa.array([1_600_000_000 + 3600 * i for i in range(hours)], pa.int64()),
+            "temperature_2m": pa.array([float(i % 24) for i in range(hours - 1)] + [None], pa.float32()),
+            "precipitation": pa.array([0.0] * hours, pa.float32()),
+        }
+    )
+    hist = history_frame(table, "Europe/Moscow", temp_unit="Fahrenheit")
+    assert str(hist["time"].dt.tz) == "Europe/Moscow"
+    assert hist["temp"].iloc[0] == 32.0
+    points = downsample(hist, "time", "temp", 500)
+    assert len(points) == 500
+    assert points["temp"].notna().all()
+    assert points["time"].is_monotonic_increasing
+
+
+# ---------------------------
+# Таблицы поверх Forecast
+# ---------------------------
+def test_frames_from_forecast_arrays():
+    from weather_core.forecast import MISSING_TIME, Forecast
+
+    midnight = 1762894800  # 2025-11-12 00:00 в Москве
+    forecast = Forecast.from_json(
+        {
+            "timezone": "Europe/Moscow",
+            "hourly": {
+                "time": [midnight - 3600, midnight, midnight + 23 * 3600, midnight + 24 * 3600],
+                "temperature_2m": [0.0, 1.0, 2.0, 3.0],
+                "apparent_temperature": [0.0, 0.5, 1.5, 2.5],
+                "relative_humidity_2m": [50, 60, 70, 80],
+                "precipitation": [0.0, 0.1, None, 0.0],
+            },
+            "daily": {
+                "time": [midnight],
+                "weather_code": [None],
+                "temperature_2m_max": [5.0],
+                "temperature_2m_min": [1.0],
+                "precipitation_sum": [0.1],
+                "wind_speed_10m_max": [10.0],
+                "sunrise": [midnight + 7 * 3600 + 30 * 60],
+                "sunset": [MISSING_TIME],
+            },
+        }
+    )
+    hdf = hourly_frame(forecast.hourly, "Europe/Moscow", "ru", day=forecast.daily["time"][0], temp_unit="Fahrenheit")
+    # только местные сутки 12.11
+    assert list(hdf["local_time"]) == ["12.11 00:00", "12.11 23:00"]
+    assert list(hdf["temp"]) == [33.8, 35.6]
+    # пересчёт единиц не трогает массивы в кэше
+    assert forecast.hourly["temperature_2m"].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+    fdf = daily_frame(forecast.daily, "Europe/Moscow", "ru", {0: "Ясно"}, {0: "☀️"})
+    assert list(fdf["date"]) == ["2025-11-12"]
+    assert list(fdf["desc"]) == ["—"]
+    assert list(fdf["sunrise_str"]) == ["12.11 07:30"]
+    assert list(fdf["sunset_str"]) == ["—"]
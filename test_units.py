@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from weather_core.units import convert_temp, convert_wind
+
+
+@pytest.mark.parametrize(
+    "celsius, unit, expected",
+    [(0, "Fahrenheit", 32), (100, "Fahrenheit", 212), (-40, "Fahrenheit", -40), (21.5, "Celsius", 21.5)],
+)
+def test_convert_temp(celsius, unit, expected):
+    assert convert_temp(celsius, unit) == pytest.approx(expected)
+
+
+def test_convert_wind():
+    assert convert_wind(1.609344, "Fahrenheit") == pytest.approx(1.0)
+    assert convert_wind(10, "Celsius") == 10
+
+
+def test_convert_vectorized_and_none():
+    out = convert_temp(np.array([0.0, 10.0]), "Fahrenheit")
+    assert out.tolist() == pytest.approx([32.0, 50.0])
+    assert convert_temp(None, "Fahrenheit") is None
+    assert convert_wind(None, "Fahrenheit") is None
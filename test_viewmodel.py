@@ -0,0 +1,59 @@
+import pickle
+
+import pytest
+
+from weather_core.forecast import Forecast
+from weather_core.viewmodel import memo
+
+
+# ---------------------------
+# memo тесты
+# ---------------------------
+def test_memo_reuses_model_for_same_source_and_params():
+    state = {}
+    source = object()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert memo(state, "hourly", source, ("UTC", "en"), build) == 1
+    assert memo(state, "hourly", source, ("UTC", "en"), build) == 1
+    # другой язык - модель строится заново и заменяет прежнюю
+    assert memo(state, "hourly", source, ("UTC", "ru"), build) == 2
+    assert memo(state, "hourly", source, ("UTC", "en"), build) == 3
+    # у другой секции своя модель
+    assert memo(state, "daily", source, ("UTC", "en"), build) == 4
+    assert memo(state, "hourly", source, ("UTC", "en"), build) == 3
+
+
+def test_memo_rebuilds_for_new_source():
+    state = {}
+    first, second = {"t": 1}, {"t": 1}
+    assert memo(state, "m", first, (), lambda: "a") == "a"
+    # равный, но другой объект (свежий ответ из кэша) - строим заново
+    assert memo(state, "m", second, (), lambda: "b") == "b"
+
+
+def test_memo_does_not_store_failures():
+    state = {}
+
+    def broken():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        memo(state, "history", None, (1,), broken)
+    assert memo(state, "history", None, (1,), lambda: "ok") == "ok"
+
+
+def test_memo_keeps_model_for_unpickled_forecast():
+    state = {}
+    forecast = Forecast(downloaded=1.0)
+    assert memo(state, "hourly", forecast, (), lambda: "a") == "a"
+    # SQLite-кэш отдаёт новый объект на каждое чтение - данные те же
+    copy = pickle.loads(pickle.dumps(forecast))
+    assert copy is not forecast
+    assert memo(state, "hourly", copy, (), lambda: "b") == "a"
+    # новый ответ API - новая метка
+    assert memo(state, "hourly", Forecast(downloaded=1.0), (), lambda: "c") == "c"
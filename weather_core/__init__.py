@@ -0,0 +1,39 @@
+"""Ядро погодного приложения без интерфейса: получение, разбор и форматирование данных.
+
+Импорт пакета ничего тяжёлого не тянет: имена ниже подгружаются из своих
+модулей при первом обращении, а pandas нужен только weather_core.transforms.
+Streamlit, pandas и pydeck ядро не импортирует вовсе.
+"""
+from importlib import import_module
+
+_EXPORTS = {
+    "get_location_from_ip": "api",
+    "geocode": "api",
+    "geocode_remote": "api",
+    "fetch_weather": "api",
+    "fetch_weather_batch": "api",
+    "forecast_params": "api",
+    "Forecast": "forecast",
+    "WEATHER_DESCRIPTIONS_RU": "labels",
+    "WEATHER_DESCRIPTIONS_EN": "labels",
+    "WEATHER_EMOJI": "labels",
+    "deg_to_compass": "labels",
+    "nice_time": "labels",
+    "convert_temp": "units",
+    "convert_wind": "units",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,242 @@
+"""Предупреждения о погоде для подписанных мест: заморозки, сильные осадки, ветер.
+
+Правило - порог для одного ряда прогноза, который и так запрашивает
+fetch_weather (почасовая температура и осадки, суточные осадки и ветер).
+Места проверяются циклами: прогнозы берутся пачками через
+fetch_weather_batch (из кэша, если свежие), и для каждого места новый
+прогноз сравнивается с прошлым:
+
+    та же метка Forecast.version (кэш, ответ 304) - ничего не считается;
+    иначе часы выравниваются по времени, и правила проверяются только на
+    часах, где значение изменилось или которых раньше не было.
+
+Для каждого правила место помнит часы, для которых предупреждение уже
+выдано. Событие "raised" - новые часы сверх порога, "cleared" - часы, где
+новый прогноз порог больше не превышает. Прошедшие часы просто забываются.
+События уходят в приёмник: JSONL-файл (FileSink) или очередь (QueueSink).
+
+Настройка через переменные окружения:
+    WEATHER_ALERT_FROST       заморозки: температура не выше, °C
+    WEATHER_ALERT_RAIN_HOUR   сильные осадки за час не меньше, мм
+    WEATHER_ALERT_RAIN_DAY    сильные осадки за сутки не меньше, мм
+    WEATHER_ALERT_WIND        сильный ветер (максимум за сутки) не меньше, км/ч
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from .api import BATCH_SIZE, fetch_weather_batch
+from .fetcher import submit
+from .forecast import MISSING_TIME
+
+FROST_C = float(os.getenv("WEATHER_ALERT_FROST", "0"))
+RAIN_HOUR_MM = float(os.getenv("WEATHER_ALERT_RAIN_HOUR", "7.5"))
+RAIN_DAY_MM = float(os.getenv("WEATHER_ALERT_RAIN_DAY", "30"))
+WIND_KMH = float(os.getenv("WEATHER_ALERT_WIND", "50"))
+
+log = logging.getLogger(__name__)
+
+# above - срабатывает при значении >= threshold, иначе при <= threshold.
+# period - сколько секунд покрывает одна точка ряда (час или сутки)
+Rule = namedtuple("Rule", "name section field threshold above period")
+
+RULES = (
+    Rule("frost", "hourly", "temperature_2m", FROST_C, False, 3600),
+    Rule("heavy_rain", "hourly", "precipitation", RAIN_HOUR_MM, True, 3600),
+    Rule("heavy_rain_day", "daily", "precipitation_sum", RAIN_DAY_MM, True, 86400),
+    Rule("high_wind", "daily", "wind_speed_10m_max", WIND_KMH, True, 86400),
+)
+
+
+def _times(forecast, section):
+    times = getattr(forecast, section).get("time") if forecast is not None else None
+    return np.empty(0, dtype=np.int64) if times is None else np.frombuffer(times, dtype=np.int64)
+
+
+def _values(forecast, section, field, size):
+    """Ряд как float64; нет ряда - все NaN (правило не срабатывает)"""
+    values = getattr(forecast, section).get(field) if forecast is not None else None
+    if values is None or len(values) != size:
+        return np.full(size, np.nan)
+    return np.frombuffer(values, dtype=np.float32).astype(np.float64)
+
+
+def match_times(old_times, new_times):
+    """Где каждая новая точка была в прошлом ряду: (позиции, маска найденных)"""
+    if not len(old_times):
+        return np.zeros(len(new_times), dtype=np.intp), np.zeros(len(new_times), dtype=bool)
+    pos = np.searchsorted(old_times, new_times).clip(max=len(old_times) - 1)
+    return pos, old_times[pos] == new_times
+
+
+def changed_hours(old_values, new_values, pos, known):
+    """Маска новых точек, где значение отличается от прошлого прогноза или
+    которых в нём не было (пропуск, оставшийся пропуском, изменением не считается)"""
+    if not len(old_values):
+        return np.ones(len(new_values), dtype=bool)
+    old = old_values[pos]
+    same = known & ((old == new_values) | (np.isnan(old) & np.isnan(new_values)))
+    return ~same
+
+
+def _triggered(rule, values):
+    with np.errstate(invalid="ignore"):
+        return values >= rule.threshold if rule.above else values <= rule.threshold
+
+
+def _event(location, rule, state, times, values):
+    event = {
+        "location": location,
+        "rule": rule.name,
+        "state": state,
+        "times": times.tolist(),
+        "threshold": rule.threshold,
+    }
+    peak = values.max() if rule.above else values.min()
+    event["peak"] = None if np.isnan(peak) else round(float(peak), 1)
+    return event
+
+
+class AlertEngine:
+    """Состояние предупреждений по местам и их пересчёт по новым прогнозам.
+
+    Место - любой хешируемый ключ (id подписки, название). Для каждого
+    правила хранится маска "предупреждение выдано" вдоль оси времени
+    прошлого прогноза, так что пересчёт - несколько операций numpy на
+    ряд, без циклов по часам. update() не потокобезопасен: обновления
+    одного движка идут из одного потока (check() сам собирает прогнозы из
+    пула и обновляет места по очереди).
+    """
+
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self._sections = {}
+        for rule in rules:
+            self._sections.setdefault(rule.section, []).append(rule)
+        self._forecasts = {}
+        self._alerted = {}
+        self.stats = {"updates": 0, "unchanged": 0, "hours_checked": 0, "events": 0, "failed": 0}
+
+    def __len__(self):
+        return len(self._forecasts)
+
+    def active(self, location):
+        """Правило -> времена по возрастанию, для которых предупреждение действует"""
+        forecast, alerted = self._forecasts.get(location), self._alerted.get(location, {})
+        out = {}
+        for rule in self.rules:
+            mask = alerted.get(rule.name)
+            if mask is not None and mask.any():
+                out[rule.name] = _times(forecast, rule.section)[mask].tolist()
+        return out
+
+    def forget(self, location):
+        """Отписка: состояние места удаляется без событий"""
+        self._forecasts.pop(location, None)
+        self._alerted.pop(location, None)
+
+    def update(self, location, forecast, now=None):
+        """Новый прогноз для места -> список событий"""
+        self.stats["updates"] += 1
+        previous = self._forecasts.get(location)
+        # Из SQLite-кэша приходит новая копия объекта, поэтому сравниваем метку содержимого
+        if previous is not None and previous.version == forecast.version:
+            self.stats["unchanged"] += 1
+            return []
+        now = time.time() if now is None else now
+        old_alerted = self._alerted.get(location, {})
+        alerted = {}
+        events = []
+        for section, rules in self._sections.items():
+            old_times, times = _times(previous, section), _times(forecast, section)
+            pos, known = match_times(old_times, times)
+            # Прошедшие часы и часы, пропавшие из прогноза, забываются без событий
+            upcoming = (times != MISSING_TIME) & (times + rules[0].period > now)
+            for rule in rules:
+                values = _values(forecast, section, rule.field, len(times))
+                old_values = _values(previous, section, rule.field, len(old_times))
+                was = np.zeros(len(times), dtype=bool)
+                old_mask = old_alerted.get(rule.name)
+                if old_mask is not None and len(old_mask):
+                    was[known] = old_mask[pos[known]]
+                was &= upcoming
+                idx = np.flatnonzero(changed_hours(old_values, values, pos, known) & upcoming)
+                alerted[rule.name] = was
+                if not len(idx):
+                    continue
+                self.stats["hours_checked"] += len(idx)
+                hit = _triggered(rule, values[idx])
+                before = was[idx]
+                was[idx] = hit
+                raised, cleared = idx[hit & ~before], idx[~hit & before]
+                if len(raised):
+                    events.append(_event(location, rule, "raised", times[raised], values[raised]))
+                if len(cleared):
+                    events.append(_event(location, rule, "cleared", times[cleared], values[cleared]))
+        self._forecasts[location] = forecast
+        self._alerted[location] = alerted
+        self.stats["events"] += len(events)
+        return events
+
+    def check(self, locations, sink=None, chunk_size=BATCH_SIZE, now=None):
+        """Один цикл: прогнозы для всех мест и события по ним.
+
+        locations - пары (ключ, (lat, lon)). Пачки по chunk_size точек
+        запрашиваются параллельно в общем пуле (fetcher.py); если пачка не
+        пришла, её места пропускают цикл и сохраняют прошлое состояние.
+        События отдаются в sink.emit() (если задан) и возвращаются списком.
+        """
+        locations = list(locations)
+        parts = [locations[i:i + chunk_size] for i in range(0, len(locations), chunk_size)]
+        futures = [submit(fetch_weather_batch, [point for _, point in part]) for part in parts]
+        events = []
+        for part, future in zip(parts, futures):
+            try:
+                forecasts = future.result()
+            except Exception as e:
+                self.stats["failed"] += len(part)
+                log.warning("alerts: %d locations skipped: %s", len(part), e)
+                continue
+            for (location, _), forecast in zip(part, forecasts):
+                events.extend(self.update(location, forecast, now))
+        if sink is not None and events:
+            sink.emit(events)
+        return events
+
+
+class FileSink:
+    """События строками JSON в файл (дописываются) или в stdout ("-")"""
+
+    def __init__(self, path):
+        self._f = sys.stdout if path == "-" else open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, events):
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events)
+        with self._lock:
+            self._f.write(lines)
+            self._f.flush()
+
+    def close(self):
+        if self._f is not sys.stdout:
+            self._f.close()
+
+
+class QueueSink:
+    """События по одному в очередь (queue.Queue и подобные с put) - для потребителя в том же процессе"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def emit(self, events):
+        for e in events:
+            self.queue.put(e)
+
+    def close(self):
+        pass
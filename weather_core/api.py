@@ -0,0 +1,275 @@
+"""Получение данных о погоде без интерфейса: IP-локация, геокодинг, прогноз.
+
+Модуль не зависит от Streamlit, поэтому его используют и страница (app.py),
+и пакетная выгрузка из командной строки (batch.py).
+"""
+import os
+import time
+from functools import partial
+
+from . import freshness, http_client
+from .cache import MISSING, cached
+from .forecast import Forecast
+from .gazetteer import LANG as GAZETTEER_LANG
+from .gazetteer import get_gazetteer
+from .ipdb import get_ipdb
+from .spatial import forecast_points
+
+# Адреса внешних API; переопределяются, например, чтобы гонять нагрузку на
+# локальной заглушке (benchmarks/mock_server.py)
+IP_API_URL = os.getenv("WEATHER_IP_API_URL", "https://ipapi.co")
+GEOCODING_URL = os.getenv("WEATHER_GEOCODING_URL", "https://geocoding-api.open-meteo.com/v1/search")
+FORECAST_URL = os.getenv("WEATHER_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+
+
+# ----------------------- Определение локации по IP -----------------------
+def _fetch_ip_location(ip=None):
+    url = f"{IP_API_URL}/{ip}/json/" if ip else f"{IP_API_URL}/json/"
+    resp = http_client.get(url)
+    resp.raise_for_status()
+    data = resp.json()
+    return {
+        "city": data.get("city"),
+        "country": data.get("country_name"),
+        "lat": data.get("latitude"),
+        "lon": data.get("longitude"),
+    }
+
+
+# Локация по конкретному IP меняется редко - держим сутки
+_fetch_ip_location_cached = cached("ip_location", ttl=24 * 3600)(_fetch_ip_location)
+
+
+def get_location_from_ip(ip=None):
+    """Определяем локацию пользователя по IP. Неточно, но работает как разумный дефолт.
+
+    Если известен IP клиента и настроена офлайн-база (ipdb.py), сеть не нужна вовсе.
+    """
+    if ip:
+        db = get_ipdb()
+        if db is not None:
+            loc = db.lookup(ip)
+            if loc:
+                return loc
+    try:
+        # Без IP клиента ответ зависит от того, кто спрашивает, - такое не кэшируем
+        return _fetch_ip_location_cached(ip) if ip else _fetch_ip_location()
+    except Exception:
+        return None
+
+
+# ----------------------- Геокодинг -----------------------
+# Функция нужна для корректной работы всплывающего списка
+def geocode(query: str, lang_code: str):
+    """Возвращает список совпадений с координатами по названию места.
+
+    Сначала ищем в локальном справочнике городов (gazetteer.py), если он
+    настроен и подписи нужны на его языке; в API идём только при промахе.
+    """
+    if not query:
+        return []
+    gazetteer = get_gazetteer() if lang_code == GAZETTEER_LANG else None
+    if gazetteer is not None:
+        found = gazetteer.search(query)
+        if found:
+            return found
+    return geocode_remote(query, lang_code)
+
+
+# Сколько ещё хранить последний удачный ответ, чтобы показать его, если API
+# недоступен или квота исчерпана (см. cached(fallback_ttl=...))
+FALLBACK_TTL = int(os.getenv("WEATHER_FALLBACK_TTL", str(6 * 3600)))
+
+
+# Кэш общий для всех воркеров (см. cache.py), а не только для текущего процесса
+@cached("geocode", ttl=3600, fallback_ttl=FALLBACK_TTL)
+def geocode_remote(query: str, lang_code: str):
+    """Поиск места через Open-Meteo Geocoding API"""
+    r = http_client.get(
+        GEOCODING_URL,
+        params={"name": query, "count": 5, "language": lang_code, "format": "json"},
+    )
+    r.raise_for_status()
+    data = r.json().get("results", []) or []
+    places = []
+    for p in data:
+        label_parts = [p.get("name")]
+        if p.get("admin1"):
+            label_parts.append(p["admin1"])
+        if p.get("country"):
+            label_parts.append(p["country"])
+        label = ", ".join([x for x in label_parts if x])
+        places.append(
+            {
+                "label": label,
+                "lat": p.get("latitude"),
+                "lon": p.get("longitude"),
+                "tz": p.get("timezone", "UTC"),
+            }
+        )
+    return places
+
+
+# ----------------------- Прогноз -----------------------
+# Сколько ещё секунд после ttl отдавать прогноз сразу, обновляя его в фоне
+STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "600"))
+# До скольких знаков округлять координаты: одинаковые запросы с соседних
+# точек попадают в один ключ кэша и склеиваются в один вызов API
+COORD_DECIMALS = int(os.getenv("WEATHER_COORD_DECIMALS", "3"))
+# Сколько точек отправлять в одном запросе (Open-Meteo принимает координаты через запятую)
+BATCH_SIZE = int(os.getenv("WEATHER_BATCH_SIZE", "50"))
+
+
+def forecast_params():
+    """Параметры запроса прогноза без координат.
+
+    Единицы всегда метрические: кэш не зависит от выбранных единиц, а °F и mph
+    считаются при отрисовке (см. units.py). Время - секунды Unix: ответ сразу
+    ложится в целочисленные массивы (см. forecast.py).
+    """
+    return {
+        "current": [
+            "temperature_2m",
+            "apparent_temperature",
+            "wind_speed_10m",
+            "wind_direction_10m",
+            "relative_humidity_2m",
+            "weather_code",
+        ],
+        "hourly": [
+            "temperature_2m",
+            "apparent_temperature",
+            "precipitation",
+            "relative_humidity_2m",
+        ],
+        "daily": [
+            "weather_code",
+            "temperature_2m_max",
+            "temperature_2m_min",
+            "sunrise",
+            "sunset",
+            "precipitation_sum",
+            "wind_speed_10m_max",
+        ],
+        "temperature_unit": "celsius",
+        "wind_speed_unit": "kmh",
+        "timezone": "auto",
+        "timeformat": "unixtime",
+    }
+
+
+def round_coords(lat, lon):
+    return round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS)
+
+
+def snap_coords(lat, lon, record=False):
+    """Точка, чей прогноз подойдёт для (lat, lon): уже запрошенная соседняя
+    в радиусе WEATHER_REUSE_KM (см. spatial.py) или сама точка, округлённая.
+
+    record=True - обращение за прогнозом, подстановка идёт в статистику
+    forecast_points; age/expired/refresh той же точки её не повторяют.
+    """
+    return forecast_points.snap(*round_coords(lat, lon), record=record)
+
+
+# cached() зовёт normalize.lookup из lookup, а normalize - из остальных методов
+snap_coords.lookup = partial(snap_coords, record=True)
+
+
+def download_forecast(lat, lon, previous=None):
+    """Запрос прогноза -> Forecast.
+
+    С previous запрос условный (If-None-Match / If-Modified-Since по его
+    ETag и Last-Modified): на 304 возвращается сам previous с новым временем
+    получения.
+    """
+    params = {"latitude": lat, "longitude": lon, **forecast_params()}
+    headers = {}
+    if previous is not None:
+        if previous.validators.get("ETag"):
+            headers["If-None-Match"] = previous.validators["ETag"]
+        if previous.validators.get("Last-Modified"):
+            headers["If-Modified-Since"] = previous.validators["Last-Modified"]
+    r = http_client.get(FORECAST_URL, params=params, **({"headers": headers} if headers else {}))
+    if previous is not None and r.status_code == 304:
+        previous.downloaded = time.time()
+        return previous
+    r.raise_for_status()
+    validators = {k: r.headers[k] for k in ("ETag", "Last-Modified") if r.headers.get(k)}
+    return Forecast.from_json(r.json(), time.time(), validators)
+
+
+def revalidate_forecast(previous, fetched_at, lat, lon):
+    """Истёкший прогноз: без нового прогона моделей - он же без запроса к API
+    (см. freshness.py), иначе условный запрос"""
+    if freshness.unchanged_since(previous, fetched_at):
+        return previous
+    return download_forecast(lat, lon, previous)
+
+
+# Пространство имён сменилось вместе с форматом значения (Forecast вместо
+# словаря): старые записи в SQLite-кэше просто не находятся.
+# Свежесть - до выхода следующего прогона модели, а не фиксированный ttl
+# (ttl остаётся на случай, когда время прогонов неизвестно)
+@cached(
+    "forecast.v2",
+    ttl=900,
+    stale_ttl=STALE_TTL,
+    fallback_ttl=FALLBACK_TTL,
+    normalize=snap_coords,
+    expires=freshness.forecast_expires,
+    revalidate=revalidate_forecast,
+)
+def fetch_weather(lat: float, lon: float):
+    """Получает текущую погоду, почасовой и недельный прогноз (°C, км/ч) -> Forecast."""
+    return download_forecast(lat, lon)
+
+
+def fetch_weather_batch(points):
+    """Прогнозы для многих точек за минимум запросов.
+
+    points - список пар (lat, lon). Точки, которые уже есть в кэше (ключ тот же,
+    что у fetch_weather, вместе с подстановкой соседней точки), берутся оттуда,
+    остальные запрашиваются пачками по BATCH_SIZE координат, повторы - один раз.
+    Ответы возвращаются в порядке points. Если пачка не пришла, её точки
+    берутся из последних удачных ответов; исключение - только когда для
+    какой-то точки нет и их.
+    -> список Forecast
+    """
+    points = [snap_coords(lat, lon, record=True) for lat, lon in points]
+    results = []
+    missing = {}  # точка -> её места в points: одинаковые точки запрашиваем один раз
+    for i, point in enumerate(points):
+        results.append(fetch_weather.lookup(*point))
+        if results[i] is MISSING:
+            missing.setdefault(point, []).append(i)
+
+    unique = list(missing)
+    for start in range(0, len(unique), BATCH_SIZE):
+        chunk = unique[start:start + BATCH_SIZE]
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in chunk),
+            "longitude": ",".join(str(lon) for _, lon in chunk),
+            **forecast_params(),
+        }
+        try:
+            r = http_client.get(FORECAST_URL, params=params, cost=len(chunk))
+            r.raise_for_status()
+            data = r.json()
+        except Exception:
+            fallbacks = [fetch_weather.fallback(*point) for point in chunk]
+            if any(item is MISSING for item in fallbacks):
+                raise
+            for point, item in zip(chunk, fallbacks):
+                for i in missing[point]:
+                    results[i] = item
+            continue
+        # На одну точку API отвечает объектом, на несколько - списком в том же порядке
+        if isinstance(data, dict):
+            data = [data]
+        for point, item in zip(chunk, data):
+            item = Forecast.from_json(item, time.time())
+            fetch_weather.store(item, *point)
+            for i in missing[point]:
+                results[i] = item
+    return results
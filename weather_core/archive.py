@@ -0,0 +1,207 @@
+"""Многолетняя история погоды для места: архив Open-Meteo, сохранённый на диск.
+
+Архивный API отдаёт почасовые данные за любые годы, но несколько лет - это
+мегабайты JSON на каждый показ. Здесь история места хранится в Parquet-файле
+(колонки time, temperature_2m, precipitation), читается через memory_map, а
+из API догружаются только недостающие даты - кусками по
+WEATHER_ARCHIVE_CHUNK_DAYS дней, параллельно. Место - координаты,
+округлённые до сотых (сетка архива крупнее).
+
+Время хранится как секунды Unix (UTC): без часовых поясов и переводов часов.
+Последние дни появляются в архиве с задержкой и приходят пустыми - такой
+хвост при сохранении обрезается и догружается в следующий раз.
+
+Нужен pyarrow (ставится вместе со Streamlit).
+
+Настройка через переменные окружения:
+    WEATHER_ARCHIVE_URL         адрес архивного API
+    WEATHER_ARCHIVE_DIR         каталог с Parquet-файлами
+    WEATHER_ARCHIVE_CHUNK_DAYS  дней в одном запросе к API
+    WEATHER_ARCHIVE_LAG_DAYS    за сколько последних дней архива ещё нет
+"""
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+
+from . import http_client
+from .fetcher import submit
+from .singleflight import flight
+
+ARCHIVE_URL = os.getenv("WEATHER_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+ARCHIVE_DIR = os.getenv("WEATHER_ARCHIVE_DIR", ".weather_archive")
+CHUNK_DAYS = int(os.getenv("WEATHER_ARCHIVE_CHUNK_DAYS", "366"))
+LAG_DAYS = int(os.getenv("WEATHER_ARCHIVE_LAG_DAYS", "5"))
+
+VARIABLES = ("temperature_2m", "precipitation")
+DAY = timedelta(days=1)
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Weather history needs pyarrow: pip install pyarrow") from None
+    return pa, pc, pq
+
+
+def _schema(pa):
+    return pa.schema([("time", pa.int64())] + [(v, pa.float32()) for v in VARIABLES])
+
+
+def archive_path(lat, lon, root=None):
+    """Файл истории для места: координаты до сотых в имени"""
+    return os.path.join(root or ARCHIVE_DIR, f"{float(lat):+.2f}_{float(lon):+.2f}.parquet")
+
+
+def _timestamp(day):
+    return int(datetime.combine(day, time(), tzinfo=timezone.utc).timestamp())
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+def read_archive(path, start=None, end=None):
+    """Сохранённая история (pyarrow.Table) за дни start..end включительно или None, если файла нет"""
+    pa, pc, pq = _arrow()
+    try:
+        table = pq.read_table(path, memory_map=True)
+    except FileNotFoundError:
+        return None
+    if start is not None:
+        table = table.filter(pc.greater_equal(table["time"], _timestamp(start)))
+    if end is not None:
+        table = table.filter(pc.less(table["time"], _timestamp(end + DAY)))
+    return table
+
+
+def missing_ranges(table, start, end):
+    """Диапазоны дней из start..end, которых нет в сохранённой истории.
+
+    История в файле всегда сплошная, поэтому не хватать может только начала
+    и конца. Чтобы она такой и оставалась, диапазон до начала файла
+    догружается до самого начала, а после конца - от самого конца, даже если
+    запрошенные дни с файлом не соприкасаются. Неполный последний день
+    (обрезанный пустой хвост) берём заново.
+    """
+    if start > end:
+        return []
+    if table is None or table.num_rows == 0:
+        return [(start, end)]
+    pa, pc, pq = _arrow()
+    first = _day(pc.min(table["time"]).as_py())
+    last_time = pc.max(table["time"]).as_py()
+    last = _day(last_time)
+    if last_time >= _timestamp(last) + 23 * 3600:
+        last += DAY  # последний день полный
+    ranges = []
+    if start < first:
+        ranges.append((start, first - DAY))
+    if end >= last:
+        ranges.append((last, end))
+    return ranges
+
+
+def split_range(start, end, days=None):
+    """start..end -> куски не длиннее days (по умолчанию CHUNK_DAYS) дней"""
+    days = days or CHUNK_DAYS
+    chunks = []
+    while start <= end:
+        stop = min(end, start + (days - 1) * DAY)
+        chunks.append((start, stop))
+        start = stop + DAY
+    return chunks
+
+
+def fetch_chunk(lat, lon, start, end):
+    """Почасовая история за дни start..end из архивного API -> pyarrow.Table"""
+    pa, pc, pq = _arrow()
+    r = http_client.get(
+        ARCHIVE_URL,
+        params={
+            "latitude": lat,
+            "longitude": lon,
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "hourly": ",".join(VARIABLES),
+            "timeformat": "unixtime",
+            "timezone": "GMT",
+        },
+    )
+    r.raise_for_status()
+    hourly = r.json().get("hourly") or {}
+    columns = {"time": hourly.get("time", [])}
+    for v in VARIABLES:
+        columns[v] = hourly.get(v) or [None] * len(columns["time"])
+    return pa.table(columns, schema=_schema(pa))
+
+
+def _merge(table, chunks):
+    """Старая история + новые куски: по времени, новые значения вместо старых, без пустого хвоста"""
+    pa, pc, pq = _arrow()
+    parts = []
+    if table is not None:
+        # Строки, которые перекрыты новыми кусками, выбрасываем
+        keep = None
+        for chunk in chunks:
+            if chunk.num_rows:
+                lo, hi = pc.min(chunk["time"]), pc.max(chunk["time"])
+                outside = pc.or_(pc.less(table["time"], lo), pc.greater(table["time"], hi))
+                keep = outside if keep is None else pc.and_(keep, outside)
+        parts.append(table if keep is None else table.filter(keep))
+    parts += chunks
+    merged = pa.concat_tables(parts).cast(_schema(pa))
+    merged = merged.take(pc.sort_indices(merged, sort_keys=[("time", "ascending")]))
+    # Дни, которых в архиве ещё нет, приходят пустыми: обрезаем их, чтобы догрузить потом
+    valid = pc.is_valid(merged["temperature_2m"]).to_numpy(zero_copy_only=False).nonzero()[0]
+    return merged.slice(0, int(valid[-1]) + 1 if len(valid) else 0)
+
+
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(path):
+    with _file_locks_lock:
+        return _file_locks.setdefault(path, threading.Lock())
+
+
+def update_archive(lat, lon, start, end, root=None):
+    """Догружает в файл недостающие дни start..end. Возвращает число запросов к API"""
+    pa, pc, pq = _arrow()
+    path = archive_path(lat, lon, root)
+    # Догрузки одного файла по очереди: следующая увидит то, что записала предыдущая
+    with _file_lock(path):
+        table = read_archive(path)
+        chunks = [c for r in missing_ranges(table, start, end) for c in split_range(*r)]
+        if not chunks:
+            return 0
+        lat, lon = round(float(lat), 2), round(float(lon), 2)
+        futures = [submit(fetch_chunk, lat, lon, a, b) for a, b in chunks]
+        merged = _merge(table, [f.result() for f in futures])
+        _write(merged, path)
+    return len(chunks)
+
+
+def _write(table, path):
+    pa, pc, pq = _arrow()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Через временный файл: читатели из других сессий не увидят недописанное
+    tmp = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def load_history(lat, lon, start, end=None, root=None):
+    """Почасовая история места за дни start..end -> pyarrow.Table.
+
+    По умолчанию end - последний день, который уже есть в архиве (LAG_DAYS
+    назад). Чего нет в файле, догружается из API; одинаковые одновременные
+    запросы из разных сессий склеиваются в одну догрузку.
+    """
+    end = end or date.today() - LAG_DAYS * DAY
+    path = archive_path(lat, lon, root)
+    flight.do(f"archive:{path}:{start}:{end}", update_archive, lat, lon, start, end, root)
+    return read_archive(path, start, end)
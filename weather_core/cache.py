@@ -0,0 +1,432 @@
+"""Общий кэш для ответов внешних API.
+
+st.cache_data живёт в памяти одного процесса, поэтому каждый воркер и каждый
+перезапуск начинают с пустого кэша и заново ходят в Open-Meteo. Здесь кэш
+подключаемый: в памяти процесса (по умолчанию) или в SQLite-файле, общем для
+всех процессов на хосте и переживающем перезапуски.
+
+Настройка через переменные окружения:
+    WEATHER_CACHE_BACKEND      memory | sqlite
+    WEATHER_CACHE_PATH         путь к SQLite-файлу
+    WEATHER_CACHE_MAX_ENTRIES  предел записей, сверх него вытесняем по LRU
+    WEATHER_CACHE_WARM         1 - при старте поднять свежие записи из файла в память
+    WEATHER_CACHE_FRONT_TTL    сколько секунд верить копии в памяти, не заглядывая в файл
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from .fetcher import submit
+from .ratelimit import background
+from .singleflight import flight
+
+CACHE_BACKEND = os.getenv("WEATHER_CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("WEATHER_CACHE_PATH", ".weather_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "5000"))
+CACHE_WARM = os.getenv("WEATHER_CACHE_WARM", "0") == "1"
+CACHE_FRONT_TTL = float(os.getenv("WEATHER_CACHE_FRONT_TTL", "30"))
+
+log = logging.getLogger(__name__)
+
+# Метка "в кэше нет", чтобы None тоже можно было хранить
+MISSING = object()
+
+
+class MemoryCache:
+    """LRU-кэш с TTL в памяти процесса"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.peek(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def peek(self, key):
+        """Как get, но не трогает счётчики попаданий"""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl, expires_at=None):
+        with self._lock:
+            self._data[key] = (expires_at or time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """Кэш в SQLite-файле: один на все процессы хоста, переживает перезапуски.
+
+    При warm=True перед файлом стоит MemoryCache: при старте в него поднимаются
+    последние использованные живые записи, дальше он работает как read-through.
+    Копия в памяти живёт не дольше front_ttl секунд: файл пишут и другие
+    процессы, и без этого воркер часами отдавал бы свою старую запись.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, warm=False, front_ttl=CACHE_FRONT_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.front_ttl = front_ttl
+        self._local = threading.local()  # у каждого потока своё соединение
+        self._front = MemoryCache(max_entries) if warm else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._conn().execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+        )
+        if warm:
+            self.warm()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # WAL: читатели из других процессов не блокируются писателем
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def warm(self):
+        """Поднимает в память последние использованные живые записи. Возвращает их число"""
+        if self._front is None:
+            self._front = MemoryCache(self.max_entries)
+        rows = self._conn().execute(
+            "SELECT key, value, expires_at FROM entries WHERE expires_at > ?"
+            " ORDER BY accessed_at DESC LIMIT ?",
+            (time.time(), self.max_entries),
+        ).fetchall()
+        # Заливаем от старых к новым, чтобы порядок LRU совпал с файлом
+        now = time.time()
+        for key, blob, expires_at in reversed(rows):
+            self._front.set(key, pickle.loads(blob), 0, expires_at=min(expires_at, now + self.front_ttl))
+        return len(rows)
+
+    def get(self, key):
+        value = self.peek(key)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def peek(self, key):
+        """Как get, но не трогает счётчики попаданий"""
+        if self._front is not None:
+            value = self._front.peek(key)
+            if value is not MISSING:
+                return value
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return MISSING
+        blob, expires_at, accessed_at = row
+        # Не пишем в файл на каждое чтение: для LRU хватает точности в минуту
+        if now - accessed_at > 60:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        value = pickle.loads(blob)
+        if self._front is not None:
+            self._front.set(key, value, 0, expires_at=min(expires_at, now + self.front_ttl))
+        return value
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl, now),
+        )
+        if self._front is not None:
+            self._front.set(key, value, min(ttl, self.front_ttl))
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        extra = count - self.max_entries
+        if extra > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN"
+                " (SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (extra,),
+            )
+            self.evictions += extra
+
+    def clear(self):
+        self._conn().execute("DELETE FROM entries")
+        if self._front is not None:
+            self._front.clear()
+
+    def stats(self):
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {
+            "backend": "sqlite",
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Общий на процесс экземпляр кэша, собранный по переменным окружения"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if CACHE_BACKEND == "sqlite":
+                    _cache = SQLiteCache(CACHE_PATH, CACHE_MAX_ENTRIES, warm=CACHE_WARM)
+                else:
+                    _cache = MemoryCache(CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def set_cache(cache):
+    """Подменяет бэкенд (нужно тестам и нестандартным развёртываниям)"""
+    global _cache
+    _cache = cache
+
+
+class LookupStats:
+    """Исходы обращений к кэшу по пространствам имён: hit, stale (отдано
+    устаревшее, обновляется в фоне) и miss. Считаются обращения вызывающих
+    (cached-обёртка и её lookup), а не чтения бэкенда: служебные чтения
+    (age, fresh_for, перепроверка) сюда не попадают"""
+
+    OUTCOMES = ("hit", "stale", "miss")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}  # namespace -> [hit, stale, miss]
+
+    def record(self, namespace, outcome):
+        with self._lock:
+            self._counts.setdefault(namespace, [0, 0, 0])[self.OUTCOMES.index(outcome)] += 1
+
+    def by_namespace(self):
+        with self._lock:
+            return {ns: dict(zip(self.OUTCOMES, c)) for ns, c in self._counts.items()}
+
+    def totals(self):
+        with self._lock:
+            return {k: sum(c[i] for c in self._counts.values()) for i, k in enumerate(self.OUTCOMES)}
+
+
+lookups = LookupStats()
+
+
+def cache_stats():
+    """Статистика бэкенда (записи, вытеснения) с исходами обращений из lookups"""
+    totals = lookups.totals()
+    return {**get_cache().stats(), "hits": totals["hit"], "stale": totals["stale"], "misses": totals["miss"]}
+
+
+def make_key(namespace, args, kwargs):
+    return f"{namespace}:{args!r}:{sorted(kwargs.items())!r}"
+
+
+# Запись кэша: когда получено (или подтверждено) и что. Свежесть - до fresh_until,
+# а если его нет (записи без cached(expires=...)), ttl от fetched_at
+Entry = namedtuple("Entry", "fetched_at value fresh_until", defaults=(None,))
+
+_refreshing = {}  # key -> Future фонового обновления
+_refreshing_lock = threading.Lock()
+
+
+def refresh_in_background(key, refresh, args, kwargs):
+    """Запускает обновление записи в фоне, не больше одного на ключ"""
+    with _refreshing_lock:
+        future = _refreshing.get(key)
+        if future is not None and not future.done():
+            return future
+        with background():
+            future = submit(refresh, *args, **kwargs)
+        _refreshing[key] = future
+    future.add_done_callback(lambda f: _refreshing.pop(key, None))
+    return future
+
+
+def cached(namespace, ttl, stale_ttl=0, fallback_ttl=0, normalize=None, expires=None, revalidate=None):
+    """Декоратор вместо st.cache_data: кэширует результат функции в общем кэше.
+
+    Исключения не кэшируются - следующий вызов снова пойдёт в API.
+    Одновременные промахи по одному ключу склеиваются в один вызов (singleflight.py).
+    При stale_ttl > 0 работает stale-while-revalidate: ещё stale_ttl секунд
+    после истечения ttl запись отдаётся сразу, а обновляется в фоновом потоке.
+    При fallback_ttl > 0 запись хранится ещё fallback_ttl секунд как последний
+    удачный ответ: если API упал (ошибка, квота), вызов вернёт её вместо
+    исключения. Понять, что данные такие, можно по age() > ttl + stale_ttl.
+    normalize(*args) -> args приводит аргументы к каноничному виду до
+    построения ключа и вызова (например, округляет координаты). Если у неё
+    есть normalize.lookup, lookup() зовёт его: так нормализация может вести
+    статистику по обращениям, а не по каждому служебному вызову.
+    expires(value, fetched_at) -> unix-время, до которого запись свежа, вместо
+    ttl (None - обычный ttl). revalidate(value, fetched_at, *args) вызывается
+    вместо функции, когда старая запись ещё есть: вернуть можно её же (данные
+    не менялись - запись просто продлевается) или новое значение.
+
+    Кроме самого вызова у обёртки есть:
+        lookup(*args)        - значение из кэша или MISSING, без похода в API
+        load(*args)          - вторая половина вызова после промаха lookup: запрос
+                               и запись, при отказе API - последний удачный ответ
+        store(value, *args)  - положить значение (например, полученное пачкой)
+        refresh(*args)       - запросить (или перепроверить через revalidate) и обновить запись
+        fallback(*args)      - последний удачный ответ любой давности или MISSING
+        age(*args)           - сколько секунд записи или None
+        fresh_for(*args)     - сколько секунд запись ещё свежа (< 0 - истекла) или None
+        expired(*args)       - запись есть, но держится только как последний удачный ответ
+    """
+
+    def decorator(func):
+        def key_of(args, kwargs):
+            return make_key(namespace, args, kwargs)
+
+        def canonical(args, lookup=False):
+            if not normalize:
+                return args
+            return tuple((getattr(normalize, "lookup", normalize) if lookup else normalize)(*args))
+
+        def fresh_until(entry):
+            return entry.fresh_until or entry.fetched_at + ttl
+
+        def read(args, kwargs):
+            # Служебное чтение: в lookups не считается
+            entry = get_cache().peek(key_of(canonical(args), kwargs))
+            return entry if isinstance(entry, Entry) else None
+
+        def lookup(*args, **kwargs):
+            args = canonical(args, lookup=True)
+            key = key_of(args, kwargs)
+            entry = get_cache().peek(key)
+            late = time.time() - fresh_until(entry) if isinstance(entry, Entry) else None
+            if late is None or late > stale_ttl:
+                # Нет записи или она хранится только на случай отказа API (fallback_ttl)
+                lookups.record(namespace, "miss")
+                return MISSING
+            if late > 0:
+                lookups.record(namespace, "stale")
+                refresh_in_background(key, refresh, args, kwargs)
+            else:
+                lookups.record(namespace, "hit")
+            return entry.value
+
+        def fallback(*args, **kwargs):
+            entry = read(args, kwargs)
+            return entry.value if entry is not None else MISSING
+
+        def store(value, *args, **kwargs):
+            args = canonical(args)
+            now = time.time()
+            until = expires(value, now) if expires else None
+            keep = (until or now + ttl) - now + stale_ttl + fallback_ttl
+            get_cache().set(key_of(args, kwargs), Entry(now, value, until), max(keep, 1))
+
+        def fetch_and_store(args, kwargs):
+            entry = read(args, kwargs) if revalidate else None
+            if entry is not None:
+                value = revalidate(entry.value, entry.fetched_at, *args, **kwargs)
+            else:
+                value = func(*args, **kwargs)
+            store(value, *args, **kwargs)
+            return value
+
+        def refresh(*args, **kwargs):
+            args = canonical(args)
+            return flight.do(key_of(args, kwargs), fetch_and_store, args, kwargs)
+
+        def age(*args, **kwargs):
+            entry = read(args, kwargs)
+            return time.time() - entry.fetched_at if entry is not None else None
+
+        def fresh_for(*args, **kwargs):
+            entry = read(args, kwargs)
+            return fresh_until(entry) - time.time() if entry is not None else None
+
+        def expired(*args, **kwargs):
+            left = fresh_for(*args, **kwargs)
+            return left is not None and left < -stale_ttl
+
+        def load(*args, **kwargs):
+            try:
+                return refresh(*args, **kwargs)
+            except Exception as e:
+                value = fallback(*args, **kwargs)
+                if value is MISSING:
+                    raise
+                log.warning("%s: upstream failed (%s), serving last good value", namespace, e)
+                return value
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            value = lookup(*args, **kwargs)
+            if value is not MISSING:
+                return value
+            return load(*args, **kwargs)
+
+        wrapper.cache_key = lambda *args, **kwargs: key_of(canonical(args), kwargs)
+        wrapper.lookup = lookup
+        wrapper.load = load
+        wrapper.store = store
+        wrapper.refresh = refresh
+        wrapper.fallback = fallback
+        wrapper.age = age
+        wrapper.fresh_for = fresh_for
+        wrapper.expired = expired
+        wrapper.ttl = ttl
+        wrapper.stale_ttl = stale_ttl
+        wrapper.fallback_ttl = fallback_ttl
+        return wrapper
+
+    return decorator
@@ -0,0 +1,137 @@
+"""Прогноз нескольких моделей Open-Meteo для одного места и их разброс.
+
+Основной прогноз (api.fetch_weather) - это одна модель, которую Open-Meteo
+выбирает сам. Чтобы показать, насколько модели расходятся, каждая модель из
+WEATHER_ENSEMBLE_MODELS запрашивается отдельно (параметр models, только
+почасовые ряды) - своей записью в кэше и параллельно в общем пуле
+(fetcher.py): страница ждёт самую медленную модель, а не сумму.
+
+Ряды моделей различаются длиной и шагом (у одних 7 дней, у других 16), поэтому
+перед подсчётом они выравниваются на общую ось времени: матрица модели x час,
+NaN там, где у модели часа нет. Среднее, минимум, максимум и разброс
+считаются по столбцам целиком в numpy, без циклов по часам.
+
+Настройка через переменные окружения:
+    WEATHER_ENSEMBLE_MODELS   модели для сравнения (через запятую)
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+from . import api, freshness, http_client
+from .cache import cached
+from .fetcher import submit
+from .forecast import MISSING_TIME, Forecast
+
+MODELS = [
+    m.strip() for m in os.getenv("WEATHER_ENSEMBLE_MODELS", "icon_seamless,gfs_seamless,ecmwf_ifs025").split(",")
+    if m.strip()
+]
+VARIABLES = ("temperature_2m", "precipitation")
+
+log = logging.getLogger(__name__)
+
+
+def _normalize(lat, lon, model):
+    return (*api.round_coords(lat, lon), model)
+
+
+@cached(
+    "ensemble_member",
+    ttl=900,
+    stale_ttl=api.STALE_TTL,
+    fallback_ttl=api.FALLBACK_TTL,
+    normalize=_normalize,
+    expires=freshness.forecast_expires,
+)
+def fetch_model(lat, lon, model):
+    """Почасовой прогноз одной модели (только VARIABLES, °C и мм) -> Forecast"""
+    r = http_client.get(
+        api.FORECAST_URL,
+        params={
+            "latitude": lat,
+            "longitude": lon,
+            "models": model,
+            "hourly": list(VARIABLES),
+            "temperature_unit": "celsius",
+            "timezone": "auto",
+            "timeformat": "unixtime",
+        },
+    )
+    r.raise_for_status()
+    return Forecast.from_json(r.json(), time.time())
+
+
+def fetch_ensemble(lat, lon, models=None):
+    """Прогнозы моделей для (lat, lon), запрошенные параллельно.
+
+    Упавшие модели пропускаются (их имена - в "failed"); если не пришла ни
+    одна, исключение первой пробрасывается.
+    -> {"members": {модель: Forecast}, "failed": [модель, ...]}
+    """
+    models = MODELS if models is None else models
+    futures = [(model, submit(fetch_model, lat, lon, model)) for model in models]
+    result = {"members": {}, "failed": []}
+    error = None
+    for model, future in futures:
+        try:
+            result["members"][model] = future.result()
+        except Exception as e:
+            log.debug("ensemble member %s failed: %s", model, e)
+            result["failed"].append(model)
+            error = error or e
+    if error is not None and not result["members"]:
+        raise error
+    return result
+
+
+def align(members, variable="temperature_2m"):
+    """Ряды моделей на общей оси времени.
+
+    -> (time int64 по возрастанию, матрица float32 модель x час с NaN там,
+    где у модели нет часа или значения)
+    """
+    series = []
+    for forecast in members:
+        times, values = forecast.hourly.get("time"), forecast.hourly.get(variable)
+        if times is None or values is None:
+            continue
+        times = np.frombuffer(times, dtype=np.int64)
+        values = np.frombuffer(values, dtype=np.float32)
+        known = times != MISSING_TIME
+        series.append((times[known], values[known]))
+    if not series:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+    axis = np.unique(np.concatenate([t for t, _ in series]))
+    matrix = np.full((len(series), len(axis)), np.nan, dtype=np.float32)
+    for row, (times, values) in zip(matrix, series):
+        row[np.searchsorted(axis, times)] = values
+    return axis, matrix
+
+
+def ensemble_stats(members, variable="temperature_2m"):
+    """Среднее, минимум, максимум и разброс (max - min) по моделям для каждого часа.
+
+    members - Forecast'ы моделей. Часы, где нет значения ни у одной модели,
+    отбрасываются; count - сколько моделей дали значение.
+    -> {"time", "mean", "min", "max", "spread", "count"}: numpy-массивы одной длины
+    """
+    axis, matrix = align(members, variable)
+    known = ~np.isnan(matrix)
+    count = known.sum(axis=0)
+    keep = count > 0
+    matrix, known, count = matrix[:, keep], known[:, keep], count[keep]
+    # fmin/fmax пропускают NaN, сумма - по известным значениям: без предупреждений nanmean
+    low = np.fmin.reduce(matrix, axis=0) if len(matrix) else np.empty(0, dtype=np.float32)
+    high = np.fmax.reduce(matrix, axis=0) if len(matrix) else np.empty(0, dtype=np.float32)
+    mean = np.where(known, matrix, 0).sum(axis=0, dtype=np.float64) / np.maximum(count, 1)
+    return {
+        "time": axis[keep],
+        "mean": mean,
+        "min": low.astype(np.float64),
+        "max": high.astype(np.float64),
+        "spread": (high - low).astype(np.float64),
+        "count": count,
+    }
@@ -0,0 +1,67 @@
+"""Параллельная загрузка данных для одной отрисовки страницы.
+
+Раньше IP-локация, геокодинг и прогноз шли строго друг за другом, и первая
+отрисовка ждала сумму трёх сетевых задержек. Здесь общий на процесс пул
+потоков: независимые запросы запускаются сразу и перекрываются, а прогнозы для
+мест из выпадающего списка подгружаются, пока пользователь выбирает.
+
+Пул живёт в модуле, а не в app.py: скрипт Streamlit перезапускается на каждое
+действие, а импортированные модули - нет.
+"""
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = int(os.getenv("WEATHER_FETCH_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="weather-fetch")
+
+
+def submit(fn, *args, **kwargs):
+    """Запускает fn в общем пуле и возвращает Future.
+
+    fn выполняется в копии контекста вызывающего, так что contextvars
+    (например, приоритет из ratelimit.background()) доходят до потока пула.
+    """
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class FetchGroup:
+    """Фоновые запросы одной сессии, привязанные к текущему вводу.
+
+    Запросы дедуплицируются по ключу. Когда ввод меняется (другой город или
+    язык), ещё не начавшиеся запросы для старого ввода отменяются; уже
+    начатые доработают и просто положат ответ в кэш. Готовые ответы живут
+    один прогон: new_run() в начале прогона их забывает, чтобы данные снова
+    шли через кэш (ttl, фоновое обновление, метрики), а не из сессии.
+    """
+
+    def __init__(self):
+        self.token = None
+        self._futures = {}
+
+    def new_run(self):
+        """Оставляет только незавершённые запросы"""
+        self._futures = {k: f for k, f in self._futures.items() if not f.done()}
+
+    def reset(self, token):
+        if token == self.token:
+            return
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+        self.token = token
+
+    def submit(self, key, fn, *args):
+        future = self._futures.get(key)
+        # Упавший или отменённый запрос не держим - следующий вызов повторит его
+        if future is None or future.cancelled() or (future.done() and future.exception()):
+            future = submit(fn, *args)
+            self._futures[key] = future
+        return future
+
+    def result(self, key, fn, *args, timeout=None):
+        return self.submit(key, fn, *args).result(timeout)
+
+    def pending(self):
+        return sum(1 for f in self._futures.values() if not f.done())
@@ -0,0 +1,128 @@
+"""Прогноз Open-Meteo в компактном виде: типизированные массивы вместо списков.
+
+Ответ на 16 дней - это тысячи Python-чисел и строк времени в списках; в кэше
+каждое из них - отдельный объект. Здесь ряды сразу после разбора JSON
+перекладываются в array из стандартной библиотеки:
+
+    время (time, sunrise, sunset)  "q"  секунды Unix (запрос с timeformat=unixtime)
+    weather_code                   "h"  -1 - нет значения
+    остальное                      "f"  float32, NaN - нет значения
+
+Отсутствующее время - MISSING_TIME (минимальный int64): numpy читает его как
+NaT, поэтому transforms.py строит таблицы прямо поверх буферов, без
+преобразования списков. numpy и pandas здесь не нужны - ядро остаётся лёгким.
+"""
+import math
+import os
+from array import array
+
+# Как NaT в datetime64: отсутствующее время без отдельной маски
+MISSING_TIME = -(2**63)
+MISSING_CODE = -1
+
+TIME_FIELDS = frozenset({"time", "sunrise", "sunset"})
+CODE_FIELDS = frozenset({"weather_code"})
+
+
+def _series(name, values):
+    if name in TIME_FIELDS:
+        return array("q", [MISSING_TIME if v is None else int(v) for v in values])
+    if name in CODE_FIELDS:
+        return array("h", [MISSING_CODE if v is None else int(v) for v in values])
+    return array("f", [math.nan if v is None else v for v in values])
+
+
+def _plain(name, values):
+    """Массив -> список для JSON: пропуски становятся None"""
+    if name in TIME_FIELDS:
+        return [None if v == MISSING_TIME else v for v in values]
+    if name in CODE_FIELDS:
+        return [None if v == MISSING_CODE else v for v in values]
+    # float32 -> кратчайшая запись с той же точностью: 2.1, а не 2.0999999046325684
+    return [None if math.isnan(v) else float(format(v, ".7g")) for v in values]
+
+
+class Forecast:
+    """Разобранный ответ прогноза для одной точки.
+
+    current - словарь скаляров как в ответе, hourly и daily - словари
+    "переменная -> array". Единицы те же, что в запросе (°C, км/ч, мм).
+    downloaded - unix-время получения ответа, validators - ETag и
+    Last-Modified из его заголовков для условного запроса (см. api.py).
+    version - метка содержимого: случайная при создании, переживает pickle
+    (SQLite-кэш отдаёт каждый раз новый объект) и ответ 304, так что по ней
+    видно, что данные те же (см. viewmodel.py).
+    """
+
+    __slots__ = (
+        "latitude",
+        "longitude",
+        "timezone",
+        "utc_offset",
+        "current",
+        "hourly",
+        "daily",
+        "downloaded",
+        "validators",
+        "version",
+    )
+
+    def __init__(
+        self,
+        latitude=None,
+        longitude=None,
+        timezone=None,
+        utc_offset=0,
+        current=None,
+        hourly=None,
+        daily=None,
+        downloaded=None,
+        validators=None,
+        version=None,
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timezone = timezone
+        self.utc_offset = utc_offset
+        self.current = current or {}
+        self.hourly = hourly or {}
+        self.daily = daily or {}
+        self.downloaded = downloaded
+        self.validators = validators or {}
+        self.version = os.urandom(8) if version is None else version
+
+    @classmethod
+    def from_json(cls, data, downloaded=None, validators=None):
+        """Словарь из r.json() -> Forecast; *_units и служебные поля отбрасываются"""
+        lat, lon = data.get("latitude"), data.get("longitude")
+        return cls(
+            downloaded=downloaded,
+            validators=validators,
+            latitude=None if lat is None else float(lat),
+            longitude=None if lon is None else float(lon),
+            timezone=data.get("timezone"),
+            utc_offset=data.get("utc_offset_seconds") or 0,
+            current=dict(data.get("current") or {}),
+            hourly={k: _series(k, v) for k, v in (data.get("hourly") or {}).items()},
+            daily={k: _series(k, v) for k, v in (data.get("daily") or {}).items()},
+        )
+
+    def to_json(self):
+        """Обратно в словарь со списками - для выгрузки (batch.py)"""
+        return {
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "timezone": self.timezone,
+            "utc_offset_seconds": self.utc_offset,
+            "current": dict(self.current),
+            "hourly": {k: _plain(k, v) for k, v in self.hourly.items()},
+            "daily": {k: _plain(k, v) for k, v in self.daily.items()},
+        }
+
+    def nbytes(self):
+        """Сколько байт занимают ряды"""
+        return sum(len(v) * v.itemsize for section in (self.hourly, self.daily) for v in section.values())
+
+    def __repr__(self):
+        hours, days = len(self.hourly.get("time", ())), len(self.daily.get("time", ()))
+        return f"Forecast({self.latitude}, {self.longitude}, {self.timezone!r}, {hours}h, {days}d)"
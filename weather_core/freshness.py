@@ -0,0 +1,130 @@
+"""Когда прогноз устаревает: по выходу новых прогонов моделей, а не по таймеру.
+
+Прогноз меняется, только когда выходит новый прогон модели (раз в 1-6 часов),
+а фиксированный ttl то перезапрашивает неизменившийся прогноз, то держит
+устаревший, когда новый прогон уже вышел. Open-Meteo публикует для каждой
+модели meta.json: когда стал доступен последний прогон и как часто выходят
+новые. По нему запись прогноза живёт до ожидаемого выхода следующего прогона
+из WEATHER_FORECAST_MODELS, а по истечении сначала сверяется с meta.json:
+если прогона так и не было, прогноз остаётся прежним без запроса к API.
+
+meta.json запрашивается не на пути запроса, а в фоне: poll() раз в
+WEATHER_MODEL_META_TTL опрашивает модели параллельно (его зовёт refresher.py,
+а если фонового потока нет - первое обращение после срока), и расчёт
+свежести берёт только последние известные значения.
+
+Блок current в ответе - значения на текущие 15 минут, и он стареет и без
+нового прогона, поэтому скачанный прогноз в любом случае свеж не дольше
+WEATHER_CURRENT_MAX_AGE. Пока о прогонах ничего не известно (meta.json
+ещё не пришёл или недоступен), работает обычный ttl.
+
+Настройка через переменные окружения:
+    WEATHER_FORECAST_MODELS   модели, за прогонами которых следим (через запятую)
+    WEATHER_MODEL_META_URL    адрес meta.json, {model} - имя модели
+    WEATHER_MODEL_META_TTL    как часто опрашивать meta.json, с
+    WEATHER_CURRENT_MAX_AGE   дольше этого скачанный прогноз не свеж, с
+"""
+import logging
+import os
+import threading
+import time
+
+from . import http_client
+from .fetcher import submit
+from .ratelimit import background
+
+MODELS = [
+    m.strip() for m in os.getenv("WEATHER_FORECAST_MODELS", "dwd_icon,ncep_gfs025,ecmwf_ifs025").split(",") if m.strip()
+]
+META_URL = os.getenv("WEATHER_MODEL_META_URL", "https://api.open-meteo.com/data/{model}/static/meta.json")
+META_TTL = int(os.getenv("WEATHER_MODEL_META_TTL", "60"))
+CURRENT_MAX_AGE = int(os.getenv("WEATHER_CURRENT_MAX_AGE", "1800"))
+
+log = logging.getLogger(__name__)
+
+_known = {}  # модель -> последний удачный ответ model_meta
+_polled_at = 0.0
+_poll_lock = threading.Lock()
+
+
+def model_meta(model):
+    """Последний прогон модели: {"available": unix-время выхода, "interval": с между прогонами}.
+
+    None - meta.json недоступен.
+    """
+    try:
+        r = http_client.get(META_URL.format(model=model))
+        r.raise_for_status()
+        data = r.json()
+        return {"available": data["last_run_availability_time"], "interval": data["update_interval_seconds"]}
+    except Exception as e:
+        log.debug("model meta for %s unavailable: %s", model, e)
+        return None
+
+
+def _poll_model(model):
+    meta = model_meta(model)
+    if meta is None:
+        # Недоступная модель не держит свежесть по старому ответу
+        _known.pop(model, None)
+    else:
+        _known[model] = meta
+
+
+def poll(models=None, wait=True):
+    """Опрашивает meta.json моделей параллельно в общем пуле и запоминает ответы.
+
+    wait=False - только запустить опрос (из пула ждать его нельзя).
+    """
+    global _polled_at
+    _polled_at = time.time()
+    with background():
+        futures = [submit(_poll_model, m) for m in (MODELS if models is None else models)]
+    if wait:
+        for f in futures:
+            f.result()
+
+
+def _metas(models):
+    """Последние известные прогоны; устаревшие данные - повод опросить модели в фоне"""
+    if time.time() - _polled_at > META_TTL and _poll_lock.acquire(blocking=False):
+        try:
+            if time.time() - _polled_at > META_TTL:
+                poll(wait=False)
+        finally:
+            _poll_lock.release()
+    return [_known[m] for m in models if m in _known]
+
+
+def last_update(models=None):
+    """Когда вышел самый свежий прогон из моделей; None - неизвестно"""
+    metas = _metas(MODELS if models is None else models)
+    return max((m["available"] for m in metas), default=None)
+
+
+def next_update(models=None):
+    """Когда ожидается следующий прогон какой-либо из моделей; None - неизвестно"""
+    metas = _metas(MODELS if models is None else models)
+    return min((m["available"] + m["interval"] for m in metas), default=None)
+
+
+def forecast_expires(forecast, fetched_at):
+    """Для cached(expires=...): до выхода следующего прогона, но не дольше CURRENT_MAX_AGE.
+
+    Если ожидаемый прогон запаздывает, запись проверяется снова через META_TTL.
+    """
+    expected = next_update()
+    if expected is None:
+        return None
+    if expected <= fetched_at:
+        expected = fetched_at + META_TTL
+    return min(expected, (forecast.downloaded or fetched_at) + CURRENT_MAX_AGE)
+
+
+def unchanged_since(forecast, fetched_at):
+    """Прогноз, подтверждённый в fetched_at, всё ещё годится: прогонов с тех пор
+    не выходило, и блок current не старше CURRENT_MAX_AGE"""
+    if (forecast.downloaded or fetched_at) + CURRENT_MAX_AGE <= time.time():
+        return False
+    last = last_update()
+    return last is not None and last <= fetched_at
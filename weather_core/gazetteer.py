@@ -0,0 +1,196 @@
+"""Локальный справочник городов для мгновенного поиска мест без сети.
+
+Источник - дамп GeoNames (cities500.txt, cities15000.txt и т.п., TSV без
+заголовка). Все названия города, включая альтернативные на других языках,
+нормализуются и кладутся в один отсортированный список; префиксный поиск -
+бинарный поиск по нему, результаты ранжируются по населению. Для опечаток
+есть нечёткий режим: ищутся названия, чей префикс отличается от запроса не
+больше чем на одну правку (кроме первых двух букв). Каждый вариант правки -
+тоже префиксный диапазон, так что весь диапазон двух букв не перебирается, а
+кандидатов берётся не больше FUZZY_MAX_CANDIDATES.
+
+Подписи - на языке LANG: основные названия, страны и регионы в GeoNames
+английские, а язык альтернативных названий в дампе не указан. Запросы на
+других языках идут в API (см. api.geocode).
+
+Файл задаётся переменной окружения WEATHER_GAZETTEER_PATH и читается при
+старте процесса (load_gazetteer), а не в первом запросе. Опционально рядом
+можно положить countryInfo.txt и admin1CodesASCII.txt - тогда в подписях будут
+названия стран и регионов, а не коды.
+"""
+import heapq
+import os
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+GAZETTEER_PATH = os.getenv("WEATHER_GAZETTEER_PATH", "")
+LANG = "en"
+# Сколько позиций индекса нечёткий поиск отдаёт на ранжирование, не больше
+FUZZY_MAX_CANDIDATES = 2000
+
+# Колонки дампа GeoNames
+_NAME, _ASCII, _ALT, _LAT, _LON, _CC, _ADMIN1, _POP, _TZ = 1, 2, 3, 4, 5, 8, 10, 14, 17
+
+
+def normalize(text):
+    """Нижний регистр без диакритики: «São Paulo» -> «sao paulo»"""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).strip()
+
+
+def _read_names(path, key_col, value_col):
+    names = {}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) > max(key_col, value_col):
+                    names[cols[key_col]] = cols[value_col]
+    return names
+
+
+class Gazetteer:
+    """Города в компактных массивах + отсортированный индекс названий"""
+
+    def __init__(self, cities, countries=None, admin1=None):
+        # cities: (name, names, lat, lon, country_code, admin1_code, population, tz)
+        self._names = []
+        self._lat = array("d")
+        self._lon = array("d")
+        self._pop = array("q")
+        self._country = []
+        self._admin1 = []
+        self._tz = []
+        keys = []
+        for idx, (name, names, lat, lon, cc, adm, pop, tz) in enumerate(cities):
+            self._names.append(name)
+            self._lat.append(lat)
+            self._lon.append(lon)
+            self._pop.append(pop)
+            self._country.append((countries or {}).get(cc, cc))
+            self._admin1.append((admin1 or {}).get(f"{cc}.{adm}", ""))
+            self._tz.append(tz or "UTC")
+            seen = set()
+            # Основное название первым: при совпадении ключей подписываем им
+            for alias in [name, *names]:
+                key = normalize(alias)
+                if key and key not in seen:
+                    seen.add(key)
+                    keys.append((key, idx, alias))
+        keys.sort()
+        self._keys = [k for k, _, _ in keys]
+        self._key_city = array("l", [i for _, i, _ in keys])
+        self._key_alias = [a for _, _, a in keys]
+
+    def __len__(self):
+        return len(self._names)
+
+    @classmethod
+    def from_geonames(cls, path):
+        base = os.path.dirname(path)
+        countries = _read_names(os.path.join(base, "countryInfo.txt"), 0, 4)
+        admin1 = _read_names(os.path.join(base, "admin1CodesASCII.txt"), 0, 1)
+        cities = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                if len(cols) <= _TZ:
+                    continue
+                try:
+                    lat, lon = float(cols[_LAT]), float(cols[_LON])
+                except ValueError:
+                    continue
+                aliases = [cols[_ASCII]] + [a for a in cols[_ALT].split(",") if a]
+                pop = int(cols[_POP]) if cols[_POP].isdigit() else 0
+                cities.append((cols[_NAME], aliases, lat, lon, cols[_CC], cols[_ADMIN1], pop, cols[_TZ]))
+        return cls(cities, countries, admin1)
+
+    def _prefix_range(self, key):
+        lo = bisect_left(self._keys, key)
+        hi = bisect_left(self._keys, key + "\uffff", lo)
+        return lo, hi
+
+    def _place(self, idx, alias):
+        # Если нашли по альтернативному названию (например, по-русски), им и подписываем
+        label_parts = [alias, self._admin1[idx], self._country[idx]]
+        return {
+            "label": ", ".join(x for x in label_parts if x),
+            "lat": self._lat[idx],
+            "lon": self._lon[idx],
+            "tz": self._tz[idx],
+        }
+
+    def _ranked(self, hits, limit):
+        best = {}
+        for pos in hits:
+            idx = self._key_city[pos]
+            best.setdefault(idx, self._key_alias[pos])
+        order = heapq.nlargest(limit, best, key=self._pop.__getitem__)
+        return [self._place(i, best[i]) for i in order]
+
+    def search(self, query, limit=5, fuzzy=True):
+        """Места, чьё название начинается с query, по убыванию населения.
+
+        Если точных префиксов нет, а fuzzy=True, допускаем одну опечатку
+        (кроме первых двух букв).
+        """
+        key = normalize(query.split(",")[0])
+        if not key:
+            return []
+        lo, hi = self._prefix_range(key)
+        if hi > lo:
+            return self._ranked(range(lo, hi), limit)
+        if not fuzzy or len(key) < 3:
+            return []
+        return self._ranked(self._fuzzy_hits(key, FUZZY_MAX_CANDIDATES), limit)
+
+    def _fuzzy_hits(self, key, cap):
+        """Позиции названий, чей префикс на одну правку от key (правка не в первых двух буквах).
+
+        Для правки в позиции p подходящие названия начинаются с key[:p] + key[p + 1:]
+        (удаление), key[:p] + x + key[p + 1:] (замена) или key[:p] + x + key[p:]
+        (вставка), где x - буквы, которые встречаются в индексе после key[:p].
+        Правки ближе к концу проверяются первыми: они ближе к запросу.
+        """
+        hits = []
+        for p in range(len(key) - 1, 1, -1):
+            head, tail = key[:p], key[p + 1:]
+            prefixes = [head + tail]
+            lo, hi = self._prefix_range(head)
+            while lo < hi:
+                name = self._keys[lo]
+                if len(name) <= p:
+                    lo += 1
+                    continue
+                x = name[p]
+                prefixes += [head + x + tail, head + x + key[p:]]
+                lo = bisect_left(self._keys, head + x + "\uffff", lo, hi)
+            for prefix in prefixes:
+                start, stop = self._prefix_range(prefix)
+                hits.extend(range(start, min(stop, start + cap - len(hits))))
+                if len(hits) >= cap:
+                    return hits
+        return hits
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def load_gazetteer():
+    """Читает справочник, если он настроен (один раз на процесс). Вызывать при старте"""
+    global _gazetteer
+    if _gazetteer is None and GAZETTEER_PATH and os.path.exists(GAZETTEER_PATH):
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer.from_geonames(GAZETTEER_PATH)
+    return _gazetteer
+
+
+def get_gazetteer():
+    """Загруженный справочник или None: сам файл не читает, см. load_gazetteer"""
+    return _gazetteer
@@ -0,0 +1,124 @@
+"""Общий HTTP-клиент для всех запросов к внешним API.
+
+Голый requests.get каждый раз открывает новое TCP+TLS-соединение. Здесь одна
+requests.Session на процесс: пул keep-alive соединений, ограниченное число
+повторов с экспоненциальной задержкой и джиттером на 5xx и таймаутах,
+таймауты по хостам. Запросы к хостам с квотой проходят через ограничитель
+частоты (ratelimit.py), а ответ 429 ставит хост на паузу по Retry-After.
+
+Настройка через переменные окружения:
+    WEATHER_HTTP_POOL_SIZE  соединений в пуле на хост
+    WEATHER_HTTP_RETRIES    сколько раз повторять запрос
+    WEATHER_HTTP_BACKOFF    базовая задержка между повторами, с
+    WEATHER_HTTP_TIMEOUTS   таймауты по хостам: "api.open-meteo.com=20,ipapi.co=5"
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .metrics import registry
+from .ratelimit import MAX_WAIT, RateLimited, bucket_for, current_priority, parse_retry_after
+
+POOL_SIZE = int(os.getenv("WEATHER_HTTP_POOL_SIZE", "20"))
+MAX_RETRIES = int(os.getenv("WEATHER_HTTP_RETRIES", "2"))
+BACKOFF = float(os.getenv("WEATHER_HTTP_BACKOFF", "0.3"))
+
+CONNECT_TIMEOUT = 3
+# Таймаут чтения по хостам, для остальных - DEFAULT_READ_TIMEOUT
+HOST_TIMEOUTS = {
+    "ipapi.co": 5,
+    "geocoding-api.open-meteo.com": 15,
+    "api.open-meteo.com": 20,
+}
+DEFAULT_READ_TIMEOUT = 20
+
+for _item in filter(None, os.getenv("WEATHER_HTTP_TIMEOUTS", "").split(",")):
+    _host, _, _seconds = _item.partition("=")
+    HOST_TIMEOUTS[_host.strip()] = float(_seconds)
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def make_session(pool_size=POOL_SIZE, retries=MAX_RETRIES, backoff=BACKOFF):
+    """Сессия с пулом соединений и повторами на 5xx/таймаутах"""
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        backoff_factor=backoff,
+        backoff_jitter=backoff,
+        # После последнего повтора отдаём сам ответ: raise_for_status() у
+        # вызывающего превратит его в обычный requests.HTTPError
+        raise_on_status=False,
+        # Сам urllib3 на 429 с Retry-After молча спит весь Retry-After; паузу
+        # по 429 держит ratelimit, общую для всех запросов к хосту
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def set_session(session):
+    """Подменяет сессию (тесты, свой транспорт)"""
+    global _session
+    _session = session
+
+
+def timeout_for(url):
+    host = urlsplit(url).hostname or ""
+    return (CONNECT_TIMEOUT, HOST_TIMEOUTS.get(host, DEFAULT_READ_TIMEOUT))
+
+
+def get(url, params=None, timeout=None, cost=1, **kwargs):
+    """GET через общую сессию; таймаут по умолчанию берётся по хосту.
+
+    Для хостов с квотой сначала ждём cost жетонов (пакетный запрос стоит по
+    жетону на точку; RateLimited, если не дождались), а на 429 ставим хост на
+    паузу и повторяем один раз, если пауза укладывается в время ожидания. Число запросов, байт ответа и время ожидания по хосту
+    попадают в metrics.registry.
+    """
+    host = urlsplit(url).hostname
+    bucket = bucket_for(host)
+    max_wait = MAX_WAIT[current_priority()]
+    for attempt in range(2):
+        if bucket is not None and not bucket.acquire(current_priority(), timeout=max_wait, n=cost):
+            registry.record_throttled(host)
+            raise RateLimited(host, bucket.retry_in())
+        started = time.perf_counter()
+        try:
+            resp = get_session().get(url, params=params, timeout=timeout or timeout_for(url), **kwargs)
+        except Exception:
+            registry.record_upstream(host, 0, time.perf_counter() - started, error=True)
+            raise
+        registry.record_upstream(host, len(resp.content), time.perf_counter() - started)
+        if resp.status_code != 429 or bucket is None:
+            return resp
+        registry.record_throttled(host)
+        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+        bucket.pause(retry_after)
+        if attempt or retry_after > max_wait:
+            raise RateLimited(host, retry_after)
@@ -0,0 +1,77 @@
+"""Офлайн-определение локации по IP из локальной базы диапазонов.
+
+База - CSV-файл со строками вида
+    start,end,city,country,lat,lon
+где start и end - границы диапазона (IPv4/IPv6 адрес или целое число).
+Строка заголовка допускается. Диапазоны не должны пересекаться.
+Путь к файлу задаётся переменной окружения WEATHER_IPDB_PATH.
+"""
+import csv
+import ipaddress
+import os
+import threading
+from bisect import bisect_right
+
+IPDB_PATH = os.getenv("WEATHER_IPDB_PATH", "")
+
+
+def ip_to_int(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return int(ipaddress.ip_address(value))
+
+
+class IPRangeDB:
+    """Отсортированные диапазоны адресов + бинарный поиск"""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda r: r[0])
+        self._starts = [r[0] for r in rows]
+        self._ends = [r[1] for r in rows]
+        self._locations = [r[2] for r in rows]
+
+    def __len__(self):
+        return len(self._starts)
+
+    @classmethod
+    def from_csv(cls, path):
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for rec in csv.reader(f):
+                if len(rec) < 6:
+                    continue
+                try:
+                    start, end = ip_to_int(rec[0]), ip_to_int(rec[1])
+                    lat, lon = float(rec[4]), float(rec[5])
+                except ValueError:
+                    continue  # заголовок или битая строка
+                rows.append(
+                    (start, end, {"city": rec[2] or None, "country": rec[3] or None, "lat": lat, "lon": lon})
+                )
+        return cls(rows)
+
+    def lookup(self, ip):
+        """Возвращает {city, country, lat, lon} или None, если адрес не попал ни в один диапазон"""
+        try:
+            n = ip_to_int(ip)
+        except ValueError:
+            return None
+        i = bisect_right(self._starts, n) - 1
+        if i < 0 or n > self._ends[i]:
+            return None
+        return dict(self._locations[i])
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_ipdb():
+    """Загруженная база или None, если она не настроена"""
+    global _db
+    if _db is None and IPDB_PATH and os.path.exists(IPDB_PATH):
+        with _db_lock:
+            if _db is None:
+                _db = IPRangeDB.from_csv(IPDB_PATH)
+    return _db
@@ -0,0 +1,119 @@
+"""Подписи и форматирование: описания погодных кодов, эмодзи, компас, время.
+
+Без тяжёлых зависимостей - только pytz, который импортируется за миллисекунды.
+"""
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+
+TIME_FORMATS = {"ru": "%d.%m %H:%M", "en": "%Y-%m-%d %H:%M"}
+
+
+@lru_cache(maxsize=None)
+def get_tz(tz_str):
+    return pytz.timezone(tz_str)
+
+
+def time_format(lang_code):
+    return TIME_FORMATS.get(lang_code, TIME_FORMATS["en"])
+
+
+# Описания погодных кодов на двух языках, взято на основе данных API
+WEATHER_DESCRIPTIONS_RU = {
+    0: "Ясно",
+    1: "Преимущественно ясно",
+    2: "Переменная облачность",
+    3: "Пасмурно",
+    45: "Туман",
+    48: "Туман с изморозью",
+    51: "Слабая морось",
+    53: "Умеренная морось",
+    55: "Сильная морось",
+    61: "Слабый дождь",
+    63: "Умеренный дождь",
+    65: "Сильный дождь",
+    71: "Слабый снег",
+    73: "Умеренный снег",
+    75: "Сильный снег",
+    80: "Кратковременные дожди",
+    81: "Ливень",
+    82: "Сильный ливень",
+    95: "Гроза",
+    96: "Гроза с небольшим градом",
+    97: "Гроза с сильным градом",
+}
+
+WEATHER_DESCRIPTIONS_EN = {
+    0: "Clear sky",
+    1: "Mainly clear",
+    2: "Partly cloudy",
+    3: "Overcast",
+    45: "Fog",
+    48: "Depositing rime fog",
+    51: "Light drizzle",
+    53: "Moderate drizzle",
+    55: "Dense drizzle",
+    61: "Slight rain",
+    63: "Moderate rain",
+    65: "Heavy rain",
+    71: "Slight snow",
+    73: "Moderate snow",
+    75: "Heavy snow",
+    80: "Rain showers (slight)",
+    81: "Rain showers (moderate)",
+    82: "Rain showers (violent)",
+    95: "Thunderstorm",
+    96: "Thunderstorm with slight hail",
+    97: "Thunderstorm with heavy hail",
+}
+
+WEATHER_EMOJI = {
+    0: "☀️",
+    1: "🌤️",
+    2: "⛅",
+    3: "☁️",
+    45: "🌫️",
+    48: "🌫️",
+    51: "🌦️",
+    53: "🌦️",
+    55: "🌧️",
+    61: "🌧️",
+    63: "🌧️",
+    65: "🌧️",
+    71: "🌨️",
+    73: "🌨️",
+    75: "❄️",
+    80: "🌧️",
+    81: "🌧️",
+    82: "⛈️",
+    95: "⛈️",
+    96: "⛈️",
+    97: "⛈️",
+}
+
+
+def deg_to_compass(deg):
+    # Для компаса
+    dirs = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+    ix = int((deg / 45) + 0.5) % 8
+    return dirs[ix]
+
+
+def nice_time(ts, tz_str, lang_code: str):
+    """Функция, цель которой привести время в нормальный и понятный для человека формат.
+
+    Для одного значения (ISO-строка или секунды Unix); таблицы форматируются
+    векторно через transforms.format_times.
+    """
+    try:
+        tz = get_tz(tz_str)
+        if isinstance(ts, (int, float)):
+            dt = datetime.fromtimestamp(ts, tz)
+        else:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+            # Время без смещения API отдаёт уже в местном поясе места
+            dt = tz.localize(dt) if dt.tzinfo is None else dt.astimezone(tz)
+        return dt.strftime(time_format(lang_code))
+    except Exception:
+        return ts
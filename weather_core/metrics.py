@@ -0,0 +1,223 @@
+"""Замеры этапов страницы и счётчики запросов к внешним API.
+
+Trace собирает длительности этапов одного прогона скрипта (span), а общий
+реестр registry копит их по процессу вместе с числом запросов и байт по
+хостам. В конце прогона Trace.finish() пишет строку JSON в лог и, если
+задан файл, выгружает всё в текстовом формате Prometheus (для textfile
+collector у node_exporter или любого скрейпера).
+
+Настройка через переменные окружения:
+    WEATHER_METRICS_LOG   1 - писать по строке JSON на прогон в stderr
+    WEATHER_METRICS_FILE  путь к файлу с метриками в формате Prometheus
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .cache import get_cache, lookups
+from .singleflight import flight
+from .spatial import forecast_points
+
+METRICS_LOG = os.getenv("WEATHER_METRICS_LOG", "0") == "1"
+METRICS_FILE = os.getenv("WEATHER_METRICS_FILE", "")
+
+log = logging.getLogger(__name__)
+if METRICS_LOG and not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+class Registry:
+    """Накопительные счётчики по процессу: этапы, запросы к внешним хостам и к нашему HTTP API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # этап -> [вызовов, секунд]
+        self.upstream = {}  # хост -> [запросов, ошибок, байт, секунд]
+        self.throttled = {}  # хост -> запросов, упёршихся в квоту (свою или 429)
+        self.http = {}  # эндпоинт server.py -> [запросов, секунд]
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            s = self.stages.setdefault(stage, [0, 0.0])
+            s[0] += 1
+            s[1] += seconds
+
+    def observe_http(self, endpoint, seconds):
+        with self._lock:
+            h = self.http.setdefault(endpoint, [0, 0.0])
+            h[0] += 1
+            h[1] += seconds
+
+    def record_upstream(self, host, nbytes, seconds, error=False):
+        with self._lock:
+            u = self.upstream.setdefault(host or "unknown", [0, 0, 0, 0.0])
+            u[0] += 1
+            u[1] += int(error)
+            u[2] += nbytes
+            u[3] += seconds
+
+    def record_throttled(self, host):
+        with self._lock:
+            self.throttled[host or "unknown"] = self.throttled.get(host or "unknown", 0) + 1
+
+    def counters(self):
+        """Снимок счётчиков, по разнице которых Trace считает свой прогон"""
+        cache = lookups.totals()
+        with self._lock:
+            return {
+                "cache_hits": cache["hit"],
+                "cache_stale": cache["stale"],
+                "cache_misses": cache["miss"],
+                "upstream_requests": sum(u[0] for u in self.upstream.values()),
+                "upstream_bytes": sum(u[2] for u in self.upstream.values()),
+            }
+
+    def prometheus(self):
+        with self._lock:
+            stages = {k: list(v) for k, v in self.stages.items()}
+            upstream = {k: list(v) for k, v in self.upstream.items()}
+            throttled = dict(self.throttled)
+            http = {k: list(v) for k, v in self.http.items()}
+        cache = get_cache().stats()
+        outcomes = lookups.by_namespace()
+        sf = flight.stats()
+        spatial = forecast_points.stats()
+        lines = [
+            "# HELP weather_stage_seconds Time spent in each page stage.",
+            "# TYPE weather_stage_seconds summary",
+        ]
+        for stage, (count, seconds) in sorted(stages.items()):
+            lines.append(f'weather_stage_seconds_sum{{stage="{stage}"}} {seconds:.6f}')
+            lines.append(f'weather_stage_seconds_count{{stage="{stage}"}} {count}')
+        if http:
+            lines += [
+                "# HELP weather_http_request_seconds Time spent serving HTTP API requests.",
+                "# TYPE weather_http_request_seconds summary",
+            ]
+        for endpoint, (count, seconds) in sorted(http.items()):
+            lines.append(f'weather_http_request_seconds_sum{{endpoint="{endpoint}"}} {seconds:.6f}')
+            lines.append(f'weather_http_request_seconds_count{{endpoint="{endpoint}"}} {count}')
+        lines += [
+            "# HELP weather_upstream_requests_total Requests to external APIs.",
+            "# TYPE weather_upstream_requests_total counter",
+        ]
+        lines += [f'weather_upstream_requests_total{{host="{h}"}} {u[0]}' for h, u in sorted(upstream.items())]
+        lines += [
+            "# HELP weather_upstream_errors_total Requests to external APIs that raised.",
+            "# TYPE weather_upstream_errors_total counter",
+        ]
+        lines += [f'weather_upstream_errors_total{{host="{h}"}} {u[1]}' for h, u in sorted(upstream.items())]
+        lines += [
+            "# HELP weather_upstream_bytes_total Response bytes received from external APIs.",
+            "# TYPE weather_upstream_bytes_total counter",
+        ]
+        lines += [f'weather_upstream_bytes_total{{host="{h}"}} {u[2]}' for h, u in sorted(upstream.items())]
+        lines += [
+            "# HELP weather_upstream_seconds_total Time spent waiting for external APIs.",
+            "# TYPE weather_upstream_seconds_total counter",
+        ]
+        lines += [f'weather_upstream_seconds_total{{host="{h}"}} {u[3]:.6f}' for h, u in sorted(upstream.items())]
+        lines += [
+            "# HELP weather_upstream_throttled_total Requests held back by the rate limiter or answered 429.",
+            "# TYPE weather_upstream_throttled_total counter",
+        ]
+        lines += [f'weather_upstream_throttled_total{{host="{h}"}} {n}' for h, n in sorted(throttled.items())]
+        for outcome, name in (("hit", "hits"), ("stale", "stale"), ("miss", "misses")):
+            lines.append(f"# TYPE weather_cache_{name}_total counter")
+            lines += [
+                f'weather_cache_{name}_total{{namespace="{ns}"}} {counts[outcome]}'
+                for ns, counts in sorted(outcomes.items())
+            ]
+        lines += [
+            "# TYPE weather_cache_evictions_total counter",
+            f"weather_cache_evictions_total {cache['evictions']}",
+            "# TYPE weather_cache_entries gauge",
+            f"weather_cache_entries {cache['entries']}",
+            "# TYPE weather_singleflight_executed_total counter",
+            f"weather_singleflight_executed_total {sf['executed']}",
+            "# TYPE weather_singleflight_collapsed_total counter",
+            f"weather_singleflight_collapsed_total {sf['collapsed']}",
+            "# HELP weather_forecast_points_reused_total Forecast requests served by a cached point within WEATHER_REUSE_KM.",
+            "# TYPE weather_forecast_points_reused_total counter",
+            f"weather_forecast_points_reused_total {spatial['reused']}",
+            "# TYPE weather_forecast_points_added_total counter",
+            f"weather_forecast_points_added_total {spatial['added']}",
+            "# TYPE weather_forecast_points gauge",
+            f"weather_forecast_points {spatial['points']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Через временный файл, чтобы скрейпер не прочитал недописанное
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+
+registry = Registry()
+
+
+class Trace:
+    """Замеры одного прогона: этапы по порядку и прирост счётчиков за прогон.
+
+    Счётчики общие для процесса, поэтому при одновременных сессиях прирост
+    включает и чужие запросы.
+    """
+
+    def __init__(self, registry=registry):
+        self.registry = registry
+        self.spans = []  # (этап, секунд)
+        self.started = time.perf_counter()
+        self._start_counters = registry.counters()
+        self.counters = {}
+        self.total = None
+
+    @contextmanager
+    def span(self, stage):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t
+            self.spans.append((stage, seconds))
+            self.registry.observe(stage, seconds)
+
+    def finish(self, **fields):
+        """Закрывает прогон: итоговое время, лог и выгрузка. Повторный вызов ничего не делает"""
+        if self.total is not None:
+            return
+        self.total = time.perf_counter() - self.started
+        self.registry.observe("total", self.total)
+        end = self.registry.counters()
+        self.counters = {k: end[k] - self._start_counters[k] for k in end}
+        if METRICS_LOG:
+            log.info(json.dumps(self.as_dict(**fields), ensure_ascii=False))
+        if METRICS_FILE:
+            try:
+                self.registry.write_prometheus(METRICS_FILE)
+            except OSError as e:
+                log.warning("cannot write metrics to %s: %s", METRICS_FILE, e)
+
+    def stages(self):
+        """Этап -> секунд; повторы одного этапа складываются"""
+        totals = {}
+        for stage, seconds in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def as_dict(self, **fields):
+        return {
+            "event": "page_run",
+            **fields,
+            "total_ms": round((self.total or 0) * 1000, 2),
+            "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages().items()},
+            **self.counters,
+        }
@@ -0,0 +1,183 @@
+"""Ограничение частоты запросов к внешним API (token bucket) с приоритетами.
+
+У Open-Meteo есть квота на число запросов; при всплеске трафика без
+ограничителя мы упираемся в 429 и страница падает с ошибкой API. Здесь на
+каждый хост из WEATHER_RATE_LIMITS свой TokenBucket: запрос уходит, только
+получив жетон. Запросы пользователя (INTERACTIVE) обслуживаются раньше
+фоновых (BACKGROUND: подгрузка кандидатов, обновление популярных мест), а
+фоновые ждут жетон недолго, чтобы не держать потоки пула. Ответ 429 ставит
+хост на паузу на Retry-After секунд для всех запросов процесса.
+
+Open-Meteo считает пакетный запрос за столько вызовов, сколько в нём точек,
+поэтому такой запрос берёт по жетону на точку (http_client.get(..., cost=n)).
+
+Приоритет передаётся через contextvars: with background(): ... помечает все
+запросы внутри блока, включая запущенные через fetcher.submit.
+
+Настройка через переменные окружения:
+    WEATHER_RATE_LIMITS           жетонов в секунду по хостам: "api.open-meteo.com=10"
+    WEATHER_RATE_BURST            сколько жетонов можно потратить разом
+    WEATHER_RATE_WAIT             сколько секунд запрос пользователя ждёт жетон
+    WEATHER_RATE_BACKGROUND_WAIT  сколько секунд ждёт фоновый запрос
+    WEATHER_RATE_RETRY_AFTER      пауза после 429 без заголовка Retry-After, с
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Open-Meteo для некоммерческого использования: 600 запросов в минуту
+RATE_LIMITS = {
+    "api.open-meteo.com": 10.0,
+    "geocoding-api.open-meteo.com": 10.0,
+    "archive-api.open-meteo.com": 10.0,
+}
+for _item in filter(None, os.getenv("WEATHER_RATE_LIMITS", "").split(",")):
+    _host, _, _rate = _item.partition("=")
+    RATE_LIMITS[_host.strip()] = float(_rate)
+
+BURST = int(os.getenv("WEATHER_RATE_BURST", "20"))
+MAX_WAIT = {
+    INTERACTIVE: float(os.getenv("WEATHER_RATE_WAIT", "5")),
+    BACKGROUND: float(os.getenv("WEATHER_RATE_BACKGROUND_WAIT", "1")),
+}
+DEFAULT_RETRY_AFTER = float(os.getenv("WEATHER_RATE_RETRY_AFTER", "5"))
+
+_priority = ContextVar("weather_priority", default=INTERACTIVE)
+
+
+class RateLimited(Exception):
+    """Квота исчерпана: жетон не получен за отведённое время или API ответил 429"""
+
+    def __init__(self, host, retry_after=None):
+        self.host = host
+        self.retry_after = retry_after
+        hint = f", retry in {retry_after:.0f}s" if retry_after else ""
+        super().__init__(f"rate limit for {host}{hint}")
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def background():
+    """Помечает запросы внутри блока как фоновые"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """rate жетонов в секунду, не больше burst про запас.
+
+    Жетон получает первый в очереди по (приоритет, порядок прихода), так что
+    запросы пользователя обгоняют фоновые, а внутри приоритета - честная очередь.
+    """
+
+    def __init__(self, rate, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._queue = []  # (приоритет, номер) ждущих
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _wait_time(self, now, need=1):
+        """Через сколько секунд может появиться need жетонов"""
+        if now < self._paused_until:
+            return self._paused_until - now
+        return max(0.0, (need - self._tokens) / self.rate)
+
+    def acquire(self, priority=INTERACTIVE, timeout=None, n=1):
+        """Ждёт n жетонов не дольше timeout секунд; True, если получены.
+
+        Больше burst сразу не накопить, поэтому такой запрос ждёт полное ведро
+        и уводит его в минус: следующие ждут, пока долг не отработается.
+        """
+        need = min(n, self.burst)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(now, need)
+                    if self._queue[0] == ticket and wait == 0 and self._tokens >= need:
+                        self._tokens -= n
+                        return True
+                    if deadline is not None:
+                        if now >= deadline:
+                            return False
+                        wait = min(wait or deadline - now, deadline - now)
+                    # wait == 0: жетон есть, но очередь не наша - ждём, пока разбудят
+                    self._cond.wait(wait or None)
+            finally:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Никому не выдавать жетоны seconds секунд (ответ 429), потом начать с пустого ведра"""
+        with self._cond:
+            until = time.monotonic() + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self._tokens = 0.0
+                self._updated = until
+            self._cond.notify_all()
+
+    def retry_in(self):
+        """Сколько секунд до следующего жетона (для сообщения пользователю)"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait_time(now)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(host):
+    """Ведро для хоста или None, если для него нет ограничения"""
+    rate = RATE_LIMITS.get(host)
+    if not rate:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(rate)
+        return bucket
+
+
+def parse_retry_after(value, default=DEFAULT_RETRY_AFTER):
+    """Retry-After в секундах: число или HTTP-дата"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
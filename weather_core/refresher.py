@@ -0,0 +1,157 @@
+"""Фоновое обновление прогнозов для популярных мест.
+
+Истёкший прогноз при stale-while-revalidate (см. cached(stale_ttl=...))
+отдаётся сразу и обновляется в фоне. Этот модуль идёт дальше: считает, какие
+места запрашивают чаще всего, и обновляет их заранее, пока запись ещё не
+устарела, а при старте прогревает кэш для заданного списка мест. Заодно
+на каждом шаге зовёт poll (например, опрос прогонов моделей, freshness.poll),
+чтобы это не делал путь запроса.
+
+Настройка через переменные окружения:
+    WEATHER_HOT_LOCATIONS     сколько самых популярных мест держать свежими
+    WEATHER_REFRESH_INTERVAL  как часто проверять их, с
+    WEATHER_REFRESH_AHEAD     доля ttl: запись обновляется заранее, когда свежей
+                              ей осталось меньше (1 - доля) * ttl
+    WEATHER_PREWARM           места для прогрева: "Moscow;Paris;55.75,37.62"
+"""
+import logging
+import os
+import threading
+from collections import Counter
+
+from .ratelimit import background
+
+HOT_LIMIT = int(os.getenv("WEATHER_HOT_LOCATIONS", "50"))
+REFRESH_INTERVAL = float(os.getenv("WEATHER_REFRESH_INTERVAL", "60"))
+REFRESH_AHEAD = float(os.getenv("WEATHER_REFRESH_AHEAD", "0.8"))
+PREWARM = os.getenv("WEATHER_PREWARM", "")
+
+log = logging.getLogger(__name__)
+
+
+class HotLocations:
+    """Счётчик запросов по местам. decay() делит счётчики пополам, чтобы
+    места, которые перестали смотреть, со временем выпадали из топа"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, lat, lon):
+        with self._lock:
+            self._counts[(lat, lon)] += 1
+
+    def top(self, n):
+        with self._lock:
+            return [loc for loc, _ in self._counts.most_common(n)]
+
+    def decay(self):
+        with self._lock:
+            self._counts = Counter({loc: c // 2 for loc, c in self._counts.items() if c > 1})
+
+
+hot_locations = HotLocations()
+
+
+def parse_locations(text):
+    """"Moscow;55.75,37.62" -> ["Moscow", (55.75, 37.62)]"""
+    locations = []
+    for item in filter(None, (x.strip() for x in text.split(";"))):
+        parts = item.split(",")
+        try:
+            locations.append((float(parts[0]), float(parts[1])))
+        except (ValueError, IndexError):
+            locations.append(item)
+    return locations
+
+
+class Refresher:
+    """Держит свежими прогнозы для популярных и закреплённых мест.
+
+    fetch - функция, обёрнутая cached() (нужны её refresh/fresh_for/ttl),
+    resolve - геокодер для названий из списка прогрева, poll - что ещё
+    вызывать перед каждой проверкой.
+    """
+
+    def __init__(self, fetch, resolve=None, hot=hot_locations, limit=HOT_LIMIT, ahead=REFRESH_AHEAD, poll=None):
+        self.fetch = fetch
+        self.resolve = resolve
+        self.poll = poll
+        self.hot = hot
+        self.limit = limit
+        self.ahead = ahead
+        self.pinned = []
+        self.refreshed = 0
+        self.failed = 0
+
+    def _refresh(self, lat, lon):
+        try:
+            self.fetch.refresh(lat, lon)
+            self.refreshed += 1
+        except Exception:
+            self.failed += 1
+            log.warning("background refresh failed for %s,%s", lat, lon, exc_info=True)
+
+    def prewarm(self, locations):
+        """Запрашивает прогнозы для списка мест и закрепляет их как всегда популярные"""
+        for loc in locations:
+            if isinstance(loc, str):
+                try:
+                    places = self.resolve(loc, "en") if self.resolve else []
+                except Exception:
+                    places = []
+                if not places:
+                    log.warning("prewarm: place not found: %s", loc)
+                    continue
+                loc = (places[0]["lat"], places[0]["lon"])
+            self.pinned.append(loc)
+            self._refresh(*loc)
+
+    def _poll(self):
+        if self.poll is None:
+            return
+        try:
+            self.poll()
+        except Exception:
+            log.warning("background poll failed", exc_info=True)
+
+    def refresh_due(self):
+        """Обновляет записи, которым осталось жить меньше (1 - ahead) * ttl"""
+        # Свежесть записи может быть и не ttl (cached(expires=...)), поэтому
+        # смотрим, сколько ей осталось, а не на возраст
+        due_left = self.fetch.ttl * (1 - self.ahead)
+        for lat, lon in dict.fromkeys(self.pinned + self.hot.top(self.limit)):
+            left = self.fetch.fresh_for(lat, lon)
+            if left is None or left <= due_left:
+                self._refresh(lat, lon)
+
+    def run(self, stop, interval=REFRESH_INTERVAL, prewarm=()):
+        # Запросы этого потока уступают квоту запросам пользователей
+        with background():
+            self._poll()
+            self.prewarm(prewarm)
+            while not stop.wait(interval):
+                self._poll()
+                self.refresh_due()
+                self.hot.decay()
+
+
+_refresher = None
+_stop = threading.Event()
+_start_lock = threading.Lock()
+
+
+def start(fetch, resolve=None, poll=None):
+    """Запускает фоновый поток один раз на процесс; повторные вызовы ничего не делают"""
+    global _refresher
+    with _start_lock:
+        if _refresher is None:
+            _refresher = Refresher(fetch, resolve, poll=poll)
+            threading.Thread(
+                target=_refresher.run,
+                args=(_stop,),
+                kwargs={"prewarm": parse_locations(PREWARM)},
+                name="weather-refresher",
+                daemon=True,
+            ).start()
+    return _refresher
@@ -0,0 +1,137 @@
+"""Осадки за сегодня по сетке точек вокруг места - для тепловой карты.
+
+Точки берутся из глобальной решётки с шагом WEATHER_PRECIP_GRID_STEP
+градусов, а не отсчитываются от самого места: у соседних мест сетки
+совпадают. Решётка режется на плитки TILE x TILE точек; плитка - один
+пакетный запрос к Open-Meteo (только daily=precipitation_sum на один день) и
+одна запись в кэше, так что карта для соседнего города почти целиком
+берётся из кэша, а плитки одной карты загружаются параллельно.
+
+Окно карты складывается из целых плиток, ближайших к месту: всё, что
+загружено, попадает на карту. По умолчанию плитка 7 x 7, и окно радиуса 10
+(21 x 21 точка) - ровно 3 x 3 плитки; место при этом бывает смещено от
+центра окна не больше чем на полплитки.
+
+Плитка хранится как array("f") по строкам решётки, сетка отдаётся колонками
+array("f") (lat, lon, mm): тысячи точек - это десятки килобайт, а не
+тысячи словарей.
+
+Настройка через переменные окружения:
+    WEATHER_PRECIP_GRID_STEP    шаг решётки, градусы
+    WEATHER_PRECIP_GRID_RADIUS  точек решётки в каждую сторону от места
+    WEATHER_PRECIP_TILE         сторона плитки в точках (плитка - один запрос)
+"""
+import math
+import os
+from array import array
+
+from . import api, http_client
+from .cache import cached
+from .fetcher import submit
+
+GRID_STEP = float(os.getenv("WEATHER_PRECIP_GRID_STEP", "0.25"))
+GRID_RADIUS = int(os.getenv("WEATHER_PRECIP_GRID_RADIUS", "10"))
+TILE = int(os.getenv("WEATHER_PRECIP_TILE", "7"))
+
+
+def tile_points(row, col, step=GRID_STEP, tile=TILE):
+    """Координаты точек плитки по строкам решётки: (широты, долготы)"""
+    lats = [round((row * tile + i) * step, 4) for i in range(tile)]
+    lons = [round((col * tile + j) * step, 4) for j in range(tile)]
+    return lats, lons
+
+
+def _wrap_lon(lon):
+    return (lon + 180) % 360 - 180
+
+
+@cached("precip_tile", ttl=900, stale_ttl=api.STALE_TTL, fallback_ttl=api.FALLBACK_TTL)
+def fetch_precip_tile(row, col, step=GRID_STEP, tile=TILE):
+    """Осадки за сегодня (мм) в точках плитки: array("f") по строкам, NaN - нет данных"""
+    lats, lons = tile_points(row, col, step, tile)
+    values = array("f", [math.nan]) * (tile * tile)
+    # Точки за полюсом не запрашиваем: index - их места в плитке
+    index = [k for k in range(tile * tile) if abs(lats[k // tile]) <= 90]
+    if not index:
+        return values
+    r = http_client.get(
+        api.FORECAST_URL,
+        cost=len(index),
+        params={
+            "latitude": ",".join(str(lats[k // tile]) for k in index),
+            "longitude": ",".join(str(_wrap_lon(lons[k % tile])) for k in index),
+            "daily": "precipitation_sum",
+            "forecast_days": 1,
+            "timezone": "auto",
+        },
+    )
+    r.raise_for_status()
+    data = r.json()
+    # На одну точку API отвечает объектом, на несколько - списком в том же порядке
+    if isinstance(data, dict):
+        data = [data]
+    for k, item in zip(index, data):
+        mm = ((item.get("daily") or {}).get("precipitation_sum") or [None])[0]
+        if mm is not None:
+            values[k] = mm
+    return values
+
+
+def _first_tile(center, count, tile):
+    """Номер первой из count плиток подряд, середина которых ближе всего к center"""
+    return math.floor((center - (count * tile - 1) / 2) / tile + 0.5)
+
+
+def tiles_around(lat, lon, radius=GRID_RADIUS, step=GRID_STEP, tile=TILE):
+    """Окно решётки вокруг места из целых плиток: не меньше 2 * radius + 1 точек на сторону.
+
+    -> ((строка0, строка1, столбец0, столбец1) включительно, [(row, col), ...])
+    """
+    count = -(-(2 * radius + 1) // tile)
+    row0 = _first_tile(round(lat / step), count, tile)
+    col0 = _first_tile(round(lon / step), count, tile)
+    window = (row0 * tile, (row0 + count) * tile - 1, col0 * tile, (col0 + count) * tile - 1)
+    tiles = [(row, col) for row in range(row0, row0 + count) for col in range(col0, col0 + count)]
+    return window, tiles
+
+
+def precip_grid(lat, lon, radius=GRID_RADIUS, step=GRID_STEP, tile=TILE):
+    """Осадки за сегодня по сетке из целых плиток вокруг (lat, lon), см. tiles_around.
+
+    Плитки запрашиваются параллельно. Упавшие плитки пропускаются (их число -
+    в "failed"); если не пришла ни одна, исключение первой пробрасывается.
+    -> {"lat": array("f"), "lon": array("f"), "mm": array("f"), "tiles": n, "failed": n}
+    """
+    _, tiles = tiles_around(lat, lon, radius, step, tile)
+    futures = [submit(fetch_precip_tile, row, col, step, tile) for row, col in tiles]
+    grid = {"lat": array("f"), "lon": array("f"), "mm": array("f"), "tiles": len(tiles), "failed": 0}
+    error = None
+    for (row, col), future in zip(tiles, futures):
+        try:
+            values = future.result()
+        except Exception as e:
+            grid["failed"] += 1
+            error = error or e
+            continue
+        for k, mm in enumerate(values):
+            if not math.isnan(mm):
+                grid["lat"].append((row * tile + k // tile) * step)
+                grid["lon"].append((col * tile + k % tile) * step)
+                grid["mm"].append(mm)
+    if error is not None and grid["failed"] == len(tiles):
+        raise error
+    return grid
+
+
+def heatmap_points(grid, min_mm=0.05):
+    """Точки для pydeck: только с осадками и с округлёнными числами.
+
+    Streamlit передаёт данные слоя в браузер как JSON-список записей, поэтому
+    сухие точки (нулевой вес в тепловой карте) отбрасываются, а координаты и
+    значения округляются - так ответ остаётся маленьким.
+    """
+    return [
+        {"lon": round(lon, 3), "lat": round(lat, 3), "mm": round(mm, 1)}
+        for lat, lon, mm in zip(grid["lat"], grid["lon"], grid["mm"])
+        if mm >= min_mm
+    ]
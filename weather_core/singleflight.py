@@ -0,0 +1,51 @@
+"""Склейка одинаковых одновременных запросов (single-flight).
+
+Когда сотни сессий одновременно спрашивают один и тот же город, кэш у всех
+промахивается разом, и каждая шла бы в API сама. Здесь первый вызов с данным
+ключом выполняется, а остальные, пришедшие пока он в полёте, ждут и получают
+тот же результат (или то же исключение).
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}  # key -> Future выполняющегося вызова
+        self._lock = threading.Lock()
+        self.executed = 0  # сколько раз функция реально вызывалась
+        self.collapsed = 0  # сколько вызовов дождались чужого результата
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.collapsed += 1
+        if not leader:
+            return call.result()
+        try:
+            value = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {"executed": self.executed, "collapsed": self.collapsed, "in_flight": self.in_flight()}
+
+
+# Общий на процесс экземпляр для кэша (см. cache.cached)
+flight = SingleFlight()
@@ -0,0 +1,120 @@
+"""Повторное использование прогнозов для близких точек.
+
+Прогноз кэшируется по координатам, а сетка моделей Open-Meteo - километры.
+Две IP-локации или два результата геокодера в паре сотен метров друг от
+друга давали бы два запроса к API за практически одинаковым прогнозом.
+SpatialIndex помнит точки, для которых уже запрашивали прогноз, и
+подставляет вместо новой точки ближайшую известную, если она ближе
+WEATHER_REUSE_KM. Поиск - по квадратной сетке с ячейкой не меньше радиуса:
+соседи ищутся только в своей и восьми соседних ячейках.
+
+Индекс живёт в памяти процесса; при общем SQLite-кэше другой процесс может
+выбрать для того же места другую опорную точку - это лишний запрос, не ошибка.
+
+Настройка через переменные окружения:
+    WEATHER_REUSE_KM         радиус повторного использования, км (0 - выключено)
+    WEATHER_REUSE_MAX_POINTS сколько опорных точек помнить, дальше вытеснение по LRU
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+REUSE_KM = float(os.getenv("WEATHER_REUSE_KM", "1"))
+REUSE_MAX_POINTS = int(os.getenv("WEATHER_REUSE_MAX_POINTS", "10000"))
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу (гаверсинус)"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Опорные точки прогнозов на сетке с ячейкой radius_km.
+
+    snap(lat, lon) возвращает ближайшую опорную точку в радиусе или, если
+    такой нет, делает опорной саму точку. record=False - служебный вызов
+    (возраст записи, перепроверка): подстановка в reused не считается.
+    """
+
+    def __init__(self, radius_km=REUSE_KM, max_points=REUSE_MAX_POINTS):
+        self.radius_km = radius_km
+        self.max_points = max_points
+        self._step = radius_km / KM_PER_DEGREE  # высота ячейки в градусах широты
+        self._cells = {}  # (ряд, столбец) -> [опорные точки]
+        self._points = OrderedDict()  # точка -> ячейка, в порядке использования
+        self._lock = threading.Lock()
+        # Статистика по точкам, которые сами не опорные (повторный snap опорной
+        # точки - обычное дело в cached(), его не считаем)
+        self.added = 0  # стали новыми опорными
+        self.reused = 0  # получили соседнюю опорную вместо себя
+
+    def _row_step(self, row):
+        # Ширина ячейки в градусах долготы; по краю ряда, ближнему к полюсу,
+        # чтобы ячейка была не уже радиуса по всей высоте ряда
+        edge = max(abs(row), abs(row + 1)) * self._step
+        return self._step / max(math.cos(math.radians(min(edge, 89.9))), 1e-3)
+
+    def _cell(self, lat, lon, row=None):
+        if row is None:
+            row = math.floor(lat / self._step)
+        return row, math.floor(lon / self._row_step(row))
+
+    def _nearest(self, lat, lon):
+        row = math.floor(lat / self._step)
+        best, best_km = None, self.radius_km
+        for r in (row - 1, row, row + 1):
+            _, col = self._cell(lat, lon, r)
+            for c in (col - 1, col, col + 1):
+                for point in self._cells.get((r, c), ()):
+                    km = distance_km(lat, lon, *point)
+                    if km <= best_km:
+                        best, best_km = point, km
+        return best
+
+    def snap(self, lat, lon, record=True):
+        point = (lat, lon)
+        if self.radius_km <= 0:
+            return point
+        with self._lock:
+            if point in self._points:
+                self._points.move_to_end(point)
+                return point
+            anchor = self._nearest(lat, lon)
+            if anchor is not None:
+                if record:
+                    self.reused += 1
+                self._points.move_to_end(anchor)
+                return anchor
+            self.added += 1
+            cell = self._cell(lat, lon)
+            self._cells.setdefault(cell, []).append(point)
+            self._points[point] = cell
+            while len(self._points) > self.max_points:
+                old, old_cell = self._points.popitem(last=False)
+                self._cells[old_cell].remove(old)
+                if not self._cells[old_cell]:
+                    del self._cells[old_cell]
+            return point
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._points.clear()
+
+    def stats(self):
+        return {
+            "radius_km": self.radius_km,
+            "points": len(self._points),
+            "added": self.added,
+            "reused": self.reused,
+            "reuse_rate": round(self.reused / (self.added + self.reused), 3) if self.reused else 0.0,
+        }
+
+
+forecast_points = SpatialIndex()
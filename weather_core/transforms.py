@@ -0,0 +1,215 @@
+"""Ряды прогноза (Forecast из forecast.py) -> таблицы для показа.
+
+Раньше время форматировалось построчно через nice_time: на каждую строку
+заново создавался pytz.timezone и разбиралась ISO-строка. Здесь всё
+векторно: один pd.to_datetime на колонку, одна смена пояса, массовый
+strftime и закэшированные объекты часовых поясов. Колонки таблиц - виды
+numpy на массивы Forecast, без перекладывания списков. Так 16 дней
+почасовых данных и много мест остаются дешёвыми.
+
+Длинные ряды (история за годы) перед графиком прореживаются алгоритмом
+LTTB: st.line_chart отправляет в браузер каждую строку, а на графике шириной
+в тысячу пикселей больше тысячи точек не видно.
+"""
+from array import array
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from .labels import get_tz, time_format
+from .units import convert_temp, convert_wind
+
+
+def _column(values):
+    """Ряд прогноза -> numpy без копирования.
+
+    array из Forecast отдаётся как вид на тот же буфер (float32, int64...),
+    списки (старый формат ответа, тесты) - как раньше, через np.asarray.
+    """
+    if isinstance(values, array):
+        return np.frombuffer(values, dtype=values.typecode)
+    return np.asarray(values)
+
+
+def _is_epoch(s):
+    return pd.api.types.is_integer_dtype(s) or pd.api.types.is_float_dtype(s)
+
+
+def to_local(times, tz_str):
+    """Время -> Series datetime64 в поясе tz_str.
+
+    Числа - секунды Unix (timeformat=unixtime), MISSING_TIME - NaT.
+    ISO-строки без смещения (так отвечает API при timezone=auto) уже местные
+    и только получают пояс; с Z или смещением переводятся в tz_str.
+    Неразборчивые значения становятся NaT.
+    """
+    s = times if isinstance(times, pd.Series) else pd.Series(_column(times))
+    tz = get_tz(tz_str)
+    if _is_epoch(s):
+        # int64 -> datetime64[s] тем же буфером; минимальный int64 и есть NaT
+        seconds = s.to_numpy().astype("int64", copy=False).view("M8[s]")
+        return pd.Series(seconds, index=s.index).dt.tz_localize("UTC").dt.tz_convert(tz)
+    s = s.astype("object")
+    aware = s.str.contains(r"(?:Z|[+-]\d\d:?\d\d)$", regex=True, na=False)
+    out = pd.Series(pd.NaT, index=s.index, dtype=f"datetime64[ns, {tz_str}]")
+    if aware.any():
+        parsed = pd.to_datetime(s[aware], utc=True, errors="coerce", format="ISO8601")
+        out[aware] = parsed.dt.tz_convert(tz)
+    if (~aware).any():
+        parsed = pd.to_datetime(s[~aware], errors="coerce", format="ISO8601")
+        out[~aware] = parsed.dt.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward")
+    return out
+
+
+def format_times(times, tz_str, lang_code):
+    """Векторный аналог nice_time.
+
+    Неразборчивые строки остаются как есть, отсутствующее время - "—".
+    Для секунд Unix в неизвестном поясе показывается UTC.
+    """
+    raw = times if isinstance(times, pd.Series) else pd.Series(_column(times))
+    epoch = _is_epoch(raw)
+    try:
+        local = to_local(raw, tz_str)
+    except pytz.UnknownTimeZoneError:
+        if not epoch:
+            return raw
+        local = to_local(raw, "UTC")
+    return local.dt.strftime(time_format(lang_code)).fillna("—" if epoch else raw)
+
+
+def _day_mask(times, day, tz_str):
+    """Строки почасовой таблицы, попадающие в сутки day"""
+    if isinstance(day, str):
+        # ISO-даты старого формата: местное время начинается с даты
+        return times.astype(str).str.startswith(day)
+    # Секунды Unix: начало суток (daily.time) и часы сравниваются по местной дате
+    local = to_local(times, tz_str)
+    start = to_local([day], tz_str).iloc[0]
+    return (local.dt.date == start.date()).to_numpy()
+
+
+def hourly_frame(hourly, tz_str, lang_code, day=None, temp_unit="Celsius"):
+    """Почасовая таблица; day (начало суток из daily.time) оставляет только этот день.
+
+    Колонки строятся прямо поверх массивов Forecast. Температуры переводятся
+    из °C в temp_unit целыми колонками - новыми массивами, кэш не меняется.
+    """
+    hdf = pd.DataFrame(
+        {
+            "time": _column(hourly.get("time", [])),
+            "temp": _column(hourly.get("temperature_2m", [])),
+            "feels_like": _column(hourly.get("apparent_temperature", [])),
+            "humidity": _column(hourly.get("relative_humidity_2m", [])),
+            "precip": _column(hourly.get("precipitation", [])),
+        },
+        copy=False,
+    )
+    if day is not None:
+        hdf = hdf[_day_mask(hdf["time"], day, tz_str)]
+    return hdf.assign(
+        temp=convert_temp(hdf["temp"].astype(float), temp_unit).round(1),
+        feels_like=convert_temp(hdf["feels_like"].astype(float), temp_unit).round(1),
+        local_time=format_times(hdf["time"], tz_str, lang_code).values,
+    )
+
+
+def daily_frame(daily, tz_str, lang_code, descriptions, emoji, temp_unit="Celsius"):
+    """Таблица по дням с готовыми подписями погоды и временем восхода/заката"""
+    fdf = pd.DataFrame(
+        {
+            "date": _column(daily.get("time", [])),
+            "code": _column(daily.get("weather_code", [])),
+            "tmax": _column(daily.get("temperature_2m_max", [])),
+            "tmin": _column(daily.get("temperature_2m_min", [])),
+            "precip": _column(daily.get("precipitation_sum", [])),
+            "windmax": _column(daily.get("wind_speed_10m_max", [])),
+            "sunrise": _column(daily.get("sunrise", [])),
+            "sunset": _column(daily.get("sunset", [])),
+        },
+        copy=False,
+    )
+    dates = fdf["date"]
+    if _is_epoch(dates):
+        # Начало местных суток -> "YYYY-MM-DD", как в ответе с ISO-временем
+        dates = to_local(dates, tz_str).dt.strftime("%Y-%m-%d").values
+    return fdf.assign(
+        date=dates,
+        tmax=convert_temp(fdf["tmax"].astype(float), temp_unit),
+        tmin=convert_temp(fdf["tmin"].astype(float), temp_unit),
+        windmax=convert_wind(fdf["windmax"].astype(float), temp_unit),
+        desc=fdf["code"].map(descriptions).fillna("—"),
+        emoji=fdf["code"].map(emoji).fillna("🌡️"),
+        sunrise_str=format_times(fdf["sunrise"], tz_str, lang_code).values,
+        sunset_str=format_times(fdf["sunset"], tz_str, lang_code).values,
+    )
+
+
+def lttb_indices(x, y, threshold):
+    """Индексы точек, которые оставляет Largest-Triangle-Three-Buckets.
+
+    Первая и последняя точки остаются всегда; остальные делятся на
+    threshold - 2 корзины, и из каждой берётся точка, образующая самый
+    большой треугольник с выбранной точкой прошлой корзины и средней точкой
+    следующей. Пики и провалы сохраняются, в отличие от шага через n.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(df, x, y, threshold):
+    """Строки df, прореженные LTTB по колонке y (пропуски отбрасываются)"""
+    df = df[df[y].notna()]
+    xs = df[x]
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        xs = xs.astype("int64")
+    return df.iloc[lttb_indices(xs.to_numpy(), df[y].to_numpy(), threshold)]
+
+
+def history_frame(table, tz_str, temp_unit="Celsius"):
+    """Почасовая история из архива (pyarrow.Table) -> DataFrame с местным временем"""
+    hist = table.to_pandas()
+    hist["time"] = pd.to_datetime(hist["time"], unit="s", utc=True).dt.tz_convert(get_tz(tz_str))
+    hist["temp"] = convert_temp(hist.pop("temperature_2m").astype(float), temp_unit).round(1)
+    return hist.rename(columns={"precipitation": "precip"})
+
+
+def ensemble_frame(stats, tz_str, lang_code, day=None, temp_unit="Celsius"):
+    """Разброс моделей (ensemble.ensemble_stats) -> таблица для графика-полосы.
+
+    time - местное время без пояса (так его показывает график), local_time -
+    подпись. Разброс после перевода единиц - разность max и min, а не перевод
+    самого разброса (°F - это ещё и сдвиг на 32).
+    """
+    edf = pd.DataFrame(
+        {"time": stats["time"], "mean": stats["mean"], "min": stats["min"], "max": stats["max"]},
+        copy=False,
+    )
+    if day is not None:
+        edf = edf[_day_mask(edf["time"], day, tz_str)]
+    low = convert_temp(edf["min"], temp_unit).round(1)
+    high = convert_temp(edf["max"], temp_unit).round(1)
+    return edf.assign(
+        mean=convert_temp(edf["mean"], temp_unit).round(1),
+        min=low,
+        max=high,
+        spread=(high - low).round(1),
+        local_time=format_times(edf["time"], tz_str, lang_code).values,
+        time=to_local(edf["time"], tz_str).dt.tz_localize(None).values,
+    )
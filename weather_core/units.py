@@ -0,0 +1,25 @@
+"""Перевод единиц на стороне приложения.
+
+Прогноз запрашивается и кэшируется один раз в метрических единицах (°C, км/ч),
+а в °F и mph переводится при отрисовке. Переключение единиц не ходит в сеть и
+не удваивает кэш. Функции работают и с числами, и с массивами numpy/pandas.
+"""
+KMH_PER_MPH = 1.609344
+
+
+def is_fahrenheit(temp_unit):
+    return temp_unit == "Fahrenheit"
+
+
+def convert_temp(celsius, temp_unit):
+    """°C -> выбранная единица температуры"""
+    if celsius is None or not is_fahrenheit(temp_unit):
+        return celsius
+    return celsius * 9 / 5 + 32
+
+
+def convert_wind(kmh, temp_unit):
+    """км/ч -> mph, если выбраны имперские единицы (как раньше делал API)"""
+    if kmh is None or not is_fahrenheit(temp_unit):
+        return kmh
+    return kmh / KMH_PER_MPH
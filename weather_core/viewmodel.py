@@ -0,0 +1,41 @@
+"""Модели представления, запомненные между перезапусками страницы.
+
+Streamlit перезапускает скрипт на каждый клик. Данные при этом берутся из
+кэша, но таблицы и подписи для показа (hourly_frame, daily_frame, строки
+прогноза по дням) строились бы заново. Здесь они хранятся в состоянии
+сессии вместе с тем, из чего построены: пока прогноз тот же, а параметры
+показа (язык, единицы, пояс) не менялись, берётся готовое.
+
+Модуль не зависит от Streamlit: state - любой словарь, на странице это
+st.session_state.
+"""
+
+
+def _key(source):
+    """Чем сравнивать источник: у Forecast - метка содержимого version (при
+    SQLite-кэше каждое чтение даёт новый объект с теми же данными), у
+    остального - сам объект, по тождеству"""
+    version = getattr(source, "version", None)
+    return ("version", version) if version is not None else ("object", source)
+
+
+def _same(a, b):
+    return a[0] == b[0] and (a[1] == b[1] if a[0] == "version" else a[1] is b[1])
+
+
+def memo(state, name, source, params, build):
+    """Модель name для прогноза source и параметров params.
+
+    Прогноз сравнивается по метке содержимого (Forecast.version): новый
+    ответ API - новая метка, и модель строится заново; остальные источники -
+    по тождеству (is). params должны сравниваться через ==.
+    Хранится одна модель на имя - последняя показанная.
+    """
+    models = state.setdefault("view_models", {})
+    entry = models.get(name)
+    key = _key(source)
+    if entry is not None and _same(entry[0], key) and entry[1] == params:
+        return entry[2]
+    value = build()
+    models[name] = (key, params, value)
+    return value